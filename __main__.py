@@ -19,8 +19,6 @@ import os
 import sys
 import ConfigParser
 import argparse
-import shutil
-import json
 
 import bmrbmb
 
@@ -34,8 +32,11 @@ if __name__ == '__main__':
     ap = argparse.ArgumentParser( description = "Generate a BMRB metabolomics entry directory" )
     ap.add_argument( "-v", "--verbose", default = False, action = "store_true",
         help = "print lots of messages to stdout", dest = "verbose" )
-    ap.add_argument( "-t", "--time", help = "time the operatons", dest = "time",
-        action = "store_false", default = True )
+    ap.add_argument( "-t", "--time", help = "time the operatons, print the times to stderr", dest = "time",
+        action = "store_true", default = False )
+    ap.add_argument( "--time-json", help = "write the times to this JSON file", dest = "timejson" )
+    ap.add_argument( "--profile-sql", help = "print top N entry DB statements to stderr", dest = "sqltop",
+        type = int, metavar = "N" )
 
     ap.add_argument( "-c", "--config", help = "config file", dest = "conffile", required = True )
     ap.add_argument( "-b", "--bmrbid", help = "BMRB ID", dest = "bmrbid", required = True )
@@ -44,58 +45,37 @@ if __name__ == '__main__':
 
     ap.add_argument( "--keep-json", help = "make JSON data file", dest = "json",
         action = "store_true", default = False )
+    ap.add_argument( "-p", "--parallel", help = "run independent steps at the same time",
+        dest = "parallel", action = "store_true", default = False )
+    ap.add_argument( "--incremental", help = "only redo the steps whose input files changed since last run",
+        dest = "incremental", action = "store_true", default = False )
 #    ap.add_argument( "--no-incoming", help = "don't copy original files to 'incoming'",
 #        dest = "incoming", action = "store_false", default = True )
 
     args = ap.parse_args()
 
+    sw = None
+    if args.time or (args.timejson is not None) : sw = bmrbmb.Stopwatch()
+    prof = None
+    if args.sqltop is not None : prof = bmrbmb.nmrstar.SQLProfiler()
+
     cp = ConfigParser.SafeConfigParser()
     f = os.path.realpath( args.conffile )
     cp.read( f )
 
-    indexfile = os.path.realpath( args.idx )
-    if not os.path.exists( indexfile ) : raise IOError( "ERR: index file not found: %s" % (indexfile,) )
-    idx = None
-    with open( indexfile, "rU" ) as f :
-        idx = json.load( f )
-    assert( idx is not None )
-
-    incoming = os.path.split( indexfile )[0]
-
-    out = os.path.realpath( args.outdir )
-    if not os.path.isdir( out ) : raise IOError( "ERR: not a directory: %s" % (out,) )
-
-    tgtdir = os.path.join( out, args.bmrbid )
-    if os.path.exists( tgtdir ) : shutil.rmtree( tgtdir )
-    os.umask( 0o002 )
-    os.makedirs( tgtdir )
-
-    inc = bmrbmb.Precheck.make_incoming( indexfile = indexfile, outdir = tgtdir, verbose = args.verbose )
-    dat = bmrbmb.FAMtoJSN.make_entry( indexfile = inc._indexfile, verbose = args.verbose )
-
-    if args.json :
-        outfile = os.path.join( tgtdir, ("%s.json" % (args.bmrbid,) ) )
-        with open( outfile, "wb" ) as f :
-            f.write( json.dumps( dat.data, indent = 4, sort_keys = True ) )
-
-    star = bmrbmb.nmrstar.StarMaker.from_nmrfam( config = cp, data = dat.data, id = args.bmrbid,
+    bmrbmb.pipeline.make_entry_dir( config = cp, bmrbid = args.bmrbid, indexfile = args.idx,
+            outdir = args.outdir, keep_json = args.json, stopwatch = sw, profiler = prof,
+            incremental = args.incremental, parallel = args.parallel,
             verbose = args.verbose )
 
-    outfile = os.path.join( tgtdir, ("%s.str" % (args.bmrbid,) ) )
-    with open( outfile, "wb" ) as f :
-        star.to_star( out = f )
-
-# other files
-#
-    d = bmrbmb.nmrstar.EntryDir( srcdir = incoming, outdir = tgtdir, bmrbid = args.bmrbid,
-            index = idx, verbose = args.verbose )
-    d.makedirs()
-    d.copymeta()
-    d.copypeaks()
-    d.copyspectra()
-    d.untartimedomain()
-
-    bmrbmb.nmrstar.EntryExtras.makefiles( sdf = d._sdf, verbose = args.verbose )
+    if prof is not None :
+        prof.report( sys.stderr, top = args.sqltop )
+    if args.time :
+        sw.report( sys.stderr )
+    if args.timejson is not None :
+        with open( args.timejson, "wb" ) as f :
+            f.write( sw.__json__ )
+            f.write( "\n" )
 
 #
 #
@@ -16,9 +16,10 @@ from __future__ import absolute_import
 import os
 import sys
 import json
-import re
-import sqlite3
+import glob
 import argparse
+import ConfigParser
+import multiprocessing
 
 _HERE = os.path.split( os.path.realpath( __file__ ) )[0]
 sys.path.append( _HERE )
@@ -26,18 +27,9 @@ import bmrbmb
 
 DBFILE = "bmrbids.sqlt3"
 
+# in batch mode, index file in an entry directory
 #
-#
-#
-if __name__ == '__main__':
-
-    ap = argparse.ArgumentParser( description = "Assign a new BMSE ID or return the existing one" )
-    ap.add_argument( "-v", "--verbose", default = False, action = "store_true",
-        help = "print lots of messages to stdout", dest = "verbose" )
-    ap.add_argument( "-i", "--index", help = "index file", dest = "index", required = True )
-    ap.add_argument( "-d", "--directory", help = "incoming directory", dest = "directory", default = None )
-
-    args = ap.parse_args()
+INDEX_PATTERN = "*.jsn"
 
 # DB has 
 #  id 
@@ -48,8 +40,11 @@ if __name__ == '__main__':
 # index file is normally in the entry directory coming from NRFAM
 # so we get inchi and the last directory component out of the index
 #
+# returns (inchi, dirname)
+#
+def read_index( indexfile, directory = None, verbose = False ) :
 
-    indexfile = os.path.realpath( args.index )
+    indexfile = os.path.realpath( indexfile )
     with open( indexfile, "rU" ) as f :
         dat = json.load( f )
     if dat is None : raise Exception( "no entry data: %s" % (indexfile,) )
@@ -64,8 +59,7 @@ if __name__ == '__main__':
         sdf = os.path.realpath( os.path.join( indir, dat["sdf"] ) )
         if not os.path.exists( sdf ) :
             raise IOError( "File not found: %s" % (sdf,) )
-        mol = bmrbmb.chemcomp.Molecule.from_file( filename = sdf, verbose = args.verbose )
-        chem_comp = mol.chem_comp
+        chem_comp = bmrbmb.chemcomp.cache.chem_comp( filename = sdf, verbose = verbose )
  
 # inchi string is needed for web queries
 # 
@@ -76,59 +70,156 @@ if __name__ == '__main__':
 
     if inchi is None : raise Exception( "no inchi_code in %s or SDF" % (indexfile,) )
 
-    if args.directory is None :
-        path = os.path.split( os.path.split( indexfile )[0] )[1]
+    if directory is None :
+        path = os.path.split( indir )[1]
         if path == "" : raise Exception( "can't figure dirname from %s" % (indexfile,) )
     else :
-        path = os.path.split( args.directory )[1]
+        path = os.path.split( directory )[1]
+
+    return (inchi, path)
+
+# index files: as is, or the one in the directory
+#
+def find_index_files( paths, pattern = INDEX_PATTERN ) :
+    rc = []
+    for path in paths :
+        if os.path.isdir( path ) :
+            files = [i for i in glob.glob( os.path.join( path, pattern ) ) \
+                    if os.path.split( i )[1] != "__index__.jsn"]
+            if len( files ) != 1 :
+                raise Exception( "expected 1 index file (%s) in %s, found %d" % (pattern, path, len( files ),) )
+            path = files[0]
+        rc.append( os.path.realpath( path ) )
+    return rc
+
+#
+#
+def init_worker( cachedir ) :
+    if cachedir is not None :
+        bmrbmb.chemcomp.cache.set_cache_dir( cachedir )
+
+# for Pool.imap: (indexfile, inchi, dirname, error)
+#
+def resolve( args ) :
+    (indexfile, verbose) = args
+    try :
+        (inchi, path) = read_index( indexfile, verbose = verbose )
+        return (indexfile, inchi, path, None)
+    except Exception, e :
+        return (indexfile, None, None, str( e ))
+
+# look up InChIs (parsing SDFs as needed) in parallel, then get all the IDs in one transaction.
+# Returns number of index files that failed.
+#
+def assign_many( indexfiles, jobs = None, cachedir = None, verbose = False ) :
+
+    if jobs is None : jobs = multiprocessing.cpu_count()
+    jobs = max( 1, min( jobs, len( indexfiles ) ) )
+
+    resolved = []
+    failed = 0
+    pool = multiprocessing.Pool( processes = jobs, initializer = init_worker, initargs = (cachedir,) )
+    try :
+        for (indexfile, inchi, path, err) in pool.imap( resolve, [(i, verbose) for i in indexfiles] ) :
+            if err is not None :
+                sys.stderr.write( "ERR: %s: %s\n" % (indexfile, err,) )
+                failed += 1
+                continue
+            resolved.append( (indexfile, inchi, path) )
+        pool.close()
+    except :
+        pool.terminate()
+        raise
+    finally :
+        pool.join()
+
+    if len( resolved ) < 1 : return failed
+
+    conn = bmrbmb.nmrstar.idlist.connect( DBFILE, verbose = verbose )
+    try :
+        ids = bmrbmb.nmrstar.idlist.allocate_many( conn, [(path, inchi) for (indexfile, inchi, path) in resolved],
+                verbose = verbose )
+    finally :
+        conn.close()
+
+    for ((indexfile, inchi, path), (bmse, new)) in zip( resolved, ids ) :
+        if new : status = "new"
+        else : status = "exists"
+        sys.stdout.write( "%s\t%s\t%s\t%s\n" % (bmse, status, path, indexfile,) )
+
+    return failed
+
+#
+#
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser( description = "Assign a new BMSE ID or return the existing one" )
+    ap.add_argument( "-v", "--verbose", default = False, action = "store_true",
+        help = "print lots of messages to stdout", dest = "verbose" )
+    ap.add_argument( "-i", "--index", help = "index file", dest = "index", default = None )
+    ap.add_argument( "-d", "--directory", help = "incoming directory", dest = "directory", default = None )
+    ap.add_argument( "-j", "--jobs", help = "batch mode: number of worker processes (default: number of CPUs)",
+        dest = "jobs", type = int, default = None )
+    ap.add_argument( "-c", "--config", help = "config file, for [chemcomp] cachedir", dest = "conffile",
+        default = None )
+    ap.add_argument( "--pattern", help = "batch mode: index file in entry directory (default: %s)" \
+        % (INDEX_PATTERN,), dest = "pattern", default = INDEX_PATTERN )
+    ap.add_argument( "paths", nargs = "*", metavar = "PATH",
+        help = "batch mode: index files and/or entry directories" )
+
+    args = ap.parse_args()
+
+    if (args.index is None) and (len( args.paths ) < 1) :
+        ap.error( "need an index file (-i) or a list of index files/directories" )
 
     if not os.path.exists( DBFILE ) : raise Exception( "no DB fie %s" % (DBFILE,) )
 
+    cachedir = None
+    if args.conffile is not None :
+        cp = ConfigParser.SafeConfigParser()
+        cp.read( os.path.realpath( args.conffile ) )
+        if cp.has_option( "chemcomp", "cachedir" ) :
+            cachedir = cp.get( "chemcomp", "cachedir" )
+
+# batch: one line per entry, tab-separated: ID, new/exists, dirname, index file
+#
+    if len( args.paths ) > 0 :
+        if args.directory is not None :
+            ap.error( "-d only works with a single index file" )
+        paths = list( args.paths )
+        if args.index is not None : paths.insert( 0, args.index )
+        failed = assign_many( find_index_files( paths, args.pattern ), jobs = args.jobs, cachedir = cachedir,
+                verbose = args.verbose )
+        if failed > 0 : sys.exit( 1 )
+        sys.exit( 0 )
+
+    if cachedir is not None :
+        bmrbmb.chemcomp.cache.set_cache_dir( cachedir )
+
+    (inchi, path) = read_index( args.index, args.directory, verbose = args.verbose )
+
     if args.verbose :
         sys.stdout.write( "Get ID for\n InChI %s\n dir %s\n" % (inchi,path,) )
 
-    conn = sqlite3.connect( DBFILE )
-    curs = conn.cursor()
-    sql = "select id from ids where inchi=?"
-#    sql = "select * from ids where inchi=?"
-    bmse = None
-    curs.execute( sql, (inchi,) )
-    for row in curs :
-        bmse = row[0]
+    conn = bmrbmb.nmrstar.idlist.connect( DBFILE, verbose = args.verbose )
+    bmse = bmrbmb.nmrstar.idlist.find_by_inchi( conn, inchi )
 
 #    if bmse is None :
-#        sql = "select id from ids where dirname=?"
-#        curs.execute( sql, (path,) )
-#        for row in curs :
-#            bmse = row[0]
+#        bmse = bmrbmb.nmrstar.idlist.find_by_dirname( conn, path )
 
     if bmse is not None :
         sys.stdout.write( "%s\n" % (bmse,) )
-        curs.close()
         conn.close()
         sys.exit( 0 )
 
-    bmid = 0
-    pat = re.compile( r"^bmse(\d+)$" )
-    sql = "select id from ids"
-    curs.execute( sql )
-    for row in curs :
-        m = pat.search( row[0] )
-        if m :
-            if int( m.group( 1 ) ) > bmid :
-                bmid = int( m.group( 1 ) )
-
-    if bmid == 0 : raise Exception( "no bmse id (huh?)" )
-
-    bmse = "bmse%06d" % ((bmid + 1),)
-    sql = "insert into ids (id,dirname,inchi) values (?,?,?)"
-
-    curs.execute( sql, (bmse,path,inchi,) )
-    if curs.rowcount != 1 : raise Exception( "rowcount is %s" % (curs.rowcount,) )
-    conn.commit()
-    sys.stdout.write( "BMRB ID for %s is %s\n" % (path,bmse,) )
-    curs.close()
+# someone may have added it since: then it's not new
+#
+    (bmse, new) = bmrbmb.nmrstar.idlist.allocate( conn, path, inchi, verbose = args.verbose )
     conn.close()
+    if not new :
+        sys.stdout.write( "%s\n" % (bmse,) )
+        sys.exit( 0 )
+    sys.stdout.write( "BMRB ID for %s is %s\n" % (path,bmse,) )
 
 
 #
@@ -0,0 +1,172 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  batch.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+
+# make many entry directories: same as __main__.py, in a pool of worker processes.
+#
+# list file has one entry per line: BMRB ID and index file (or a glob that matches exactly one),
+# blank lines and lines starting with # are ignored:
+#
+#   bmse001335  /incoming/lovastatin/index.json
+#   bmse001336  /incoming/simvastatin*/index.json
+#
+# Each worker loads the toolkits and connects to NMR-STAR dictionary once, a failed entry
+# is reported and the batch goes on.
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import ConfigParser
+import argparse
+import glob
+import json
+import time
+import traceback
+import multiprocessing
+
+_HERE = os.path.split( os.path.realpath( __file__ ) )[0]
+sys.path.append( _HERE )
+import bmrbmb
+
+# per-worker
+#
+_CONFIG = None
+_SESSION = None
+_VERBOSE = False
+
+#
+#
+def read_list( filename ) :
+    rc = []
+    with open( filename, "rU" ) as f :
+        for line in f :
+            line = line.strip()
+            if (len( line ) < 1) or line.startswith( "#" ) : continue
+            fields = line.split()
+            if len( fields ) != 2 :
+                raise Exception( "bad line in %s: %s" % (filename, line,) )
+            rc.append( (fields[0], fields[1]) )
+    return rc
+
+#
+#
+def init_worker( conffile, verbose ) :
+    global _CONFIG, _SESSION, _VERBOSE
+    _VERBOSE = bool( verbose )
+    _CONFIG = ConfigParser.SafeConfigParser()
+    _CONFIG.read( conffile )
+    _SESSION = bmrbmb.nmrstar.StarMakerSession( config = _CONFIG, verbose = _VERBOSE )
+
+# PubChem CIDs from index files, for prefetching.
+# Bad index files are skipped here, their entries will fail in make_entry()
+#
+def read_cids( patterns ) :
+    rc = []
+    for pattern in patterns :
+        files = glob.glob( pattern )
+        if len( files ) != 1 : continue
+        try :
+            with open( files[0], "rU" ) as f :
+                idx = json.load( f )
+        except Exception :
+            continue
+        if "cid" in idx.keys() :
+            rc.append( idx["cid"] )
+    return rc
+
+# returns (BMRB ID, error message or None, seconds)
+#
+def make_entry( job ) :
+    (bmrbid, pattern, outdir, keep_json, incremental) = job
+    start = time.time()
+    try :
+        files = glob.glob( pattern )
+        if len( files ) != 1 :
+            raise IOError( "%d files match %s" % (len( files ), pattern,) )
+        bmrbmb.pipeline.make_entry_dir( config = _CONFIG, bmrbid = bmrbid, indexfile = files[0],
+                outdir = outdir, keep_json = keep_json, session = _SESSION, incremental = incremental,
+                verbose = _VERBOSE )
+        return (bmrbid, None, time.time() - start)
+    except Exception :
+        return (bmrbid, traceback.format_exc(), time.time() - start)
+
+#
+#
+#
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser( description = "Generate BMRB metabolomics entry directories" )
+    ap.add_argument( "-v", "--verbose", default = False, action = "store_true",
+        help = "print lots of messages to stdout", dest = "verbose" )
+
+    ap.add_argument( "-c", "--config", help = "config file", dest = "conffile", required = True )
+    ap.add_argument( "-l", "--list", help = "list of BMRB IDs and index files", dest = "listfile", required = True )
+    ap.add_argument( "-o", "--outdir", help = "output directory", dest = "outdir", required = True )
+    ap.add_argument( "-j", "--jobs", help = "number of worker processes (default: number of CPUs)",
+        dest = "jobs", type = int, default = multiprocessing.cpu_count() )
+    ap.add_argument( "--max-per-worker", help = "restart worker after this many entries", dest = "maxtasks",
+        type = int, default = None )
+
+    ap.add_argument( "--keep-json", help = "make JSON data file", dest = "json",
+        action = "store_true", default = False )
+    ap.add_argument( "--prefetch", help = "get PubChem data for all entries in bulk before starting",
+        dest = "prefetch", action = "store_true", default = False )
+    ap.add_argument( "--incremental", help = "only redo the steps whose input files changed since last run",
+        dest = "incremental", action = "store_true", default = False )
+
+    args = ap.parse_args()
+
+    conffile = os.path.realpath( args.conffile )
+    outdir = os.path.realpath( args.outdir )
+    if not os.path.isdir( outdir ) : raise IOError( "ERR: not a directory: %s" % (outdir,) )
+
+    jobs = [(bmrbid, idx, outdir, args.json, args.incremental) for (bmrbid, idx) in read_list( args.listfile )]
+
+# workers are forked after this: they get the prefetched data
+#
+    if args.prefetch :
+        cp = ConfigParser.SafeConfigParser()
+        cp.read( conffile )
+        bmrbmb.www.cache.configure( cp )
+        cids = read_cids( [j[1] for j in jobs] )
+        sys.stdout.write( "prefetching PubChem data for %d compounds\n" % (len( cids ),) )
+        n = bmrbmb.www.pubchem_prefetch( cids, verbose = args.verbose )
+        sys.stdout.write( "prefetched %d, the rest will be looked up by workers\n" % (n,) )
+
+# don't let the workers inherit open keep-alive sockets
+#
+        bmrbmb.www.CLIENT.close()
+
+    pool = multiprocessing.Pool( processes = max( 1, args.jobs ), initializer = init_worker,
+            initargs = (conffile, args.verbose), maxtasksperchild = args.maxtasks )
+    failed = []
+    try :
+        for (bmrbid, err, secs) in pool.imap_unordered( make_entry, jobs ) :
+            if err is None :
+                sys.stdout.write( "OK    %s %.1fs\n" % (bmrbid, secs,) )
+            else :
+                sys.stdout.write( "FAIL  %s %.1fs\n" % (bmrbid, secs,) )
+                sys.stderr.write( "ERR: %s\n%s\n" % (bmrbid, err,) )
+                failed.append( bmrbid )
+        pool.close()
+    except :
+        pool.terminate()
+        raise
+    finally :
+        pool.join()
+
+    sys.stdout.write( "%d entries, %d failed\n" % (len( jobs ), len( failed ),) )
+    if len( failed ) > 0 :
+        sys.stdout.write( "failed: %s\n" % (" ".join( sorted( failed ) ),) )
+        sys.exit( 1 )
+
+#
+#
@@ -11,17 +11,28 @@
 
 from __future__ import absolute_import
 
-from . import boilerplate
-from . import chemcomp
-from . import chemshifts
-from . import nmrfam
-from . import nmrstar
-from . import sample
-from . import topspin
-from . import www
-#from .nmrfam2json import FAMtoDAT
-from .nmrfam2incoming import Precheck
-from .incoming2json import FAMtoJSN
+from .lazy import install as _lazy
+
+# submodules are imported when they're first used, see lazy.py
+#
+_lazy( __name__, {
+    "boilerplate" : (".boilerplate", None),
+    "chemcomp" : (".chemcomp", None),
+    "chemshifts" : (".chemshifts", None),
+    "nmrfam" : (".nmrfam", None),
+    "nmrstar" : (".nmrstar", None),
+    "sample" : (".sample", None),
+    "topspin" : (".topspin", None),
+    "www" : (".www", None),
+#    "FAMtoDAT" : (".nmrfam2json", "FAMtoDAT"),
+    "Precheck" : (".nmrfam2incoming", "Precheck"),
+    "FAMtoJSN" : (".incoming2json", "FAMtoJSN"),
+    "Stopwatch" : (".stopwatch", "Stopwatch"),
+    "Manifest" : (".manifest", "Manifest"),
+    "Scheduler" : (".scheduler", "Scheduler"),
+    "staging" : (".staging", None),
+    "pipeline" : (".pipeline", None)
+} )
 
 
 #
@@ -36,8 +47,13 @@ __all__ = [
     "sample",
     "topspin",
     "www",
+    "pipeline",
+    "staging",
     "Precheck",
-    "FAMtoJSN"
+    "FAMtoJSN",
+    "Stopwatch",
+    "Manifest",
+    "Scheduler"
 ]
 #
 #
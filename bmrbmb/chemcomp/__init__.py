@@ -14,10 +14,18 @@ from __future__ import absolute_import
 import os
 import sys
 
-from .obmol import OBmolecule
-from .rdmol import RDmolecule
-from .molecule import Molecule
-from .img3d import make_image
+from ..lazy import install as _lazy
+
+# toolkits are imported when they're first used: OpenBabel with OBmolecule, RDKit with RDmolecule,
+# both with Molecule, PyMOL when make_image() is called
+#
+_lazy( __name__, {
+    "OBmolecule" : (".obmol", "OBmolecule"),
+    "RDmolecule" : (".rdmol", "RDmolecule"),
+    "Molecule" : (".molecule", "Molecule"),
+    "make_image" : (".img3d", "make_image"),
+    "cache" : (".cache", None)
+} )
 
 #
 #
@@ -25,7 +33,8 @@ from .img3d import make_image
 __all__ = [ "OBmolecule",
         "RDmolecule",
         "Molecule",
-        "make_image"
+        "make_image",
+        "cache"
      ]
 #
 #
@@ -0,0 +1,143 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  cache.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# parse each SDF once per process: the same file gets copied and renamed along the way
+# (source dir -> incoming -> entry dir) so molecules are keyed on file contents, not names.
+#
+# molecule() returns the same Molecule every time: if you change it (minimize, removeh, ...)
+# forget() it when done.
+#
+# chem_comp() returns a copy of Molecule.chem_comp that's yours to change. If there's a cache
+# directory (set_cache_dir()) it's also pickled there and next process doesn't have to parse
+# the SDF at all. Clear that directory when toolkits are upgraded.
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import hashlib
+import copy
+import cPickle
+
+from .molecule import Molecule
+
+# bump this when chem_comp changes
+#
+PICKLE_VERSION = 1
+
+_MOLECULES = {}
+_CHEM_COMPS = {}
+_CACHE_DIR = None
+
+#
+#
+def set_cache_dir( path ) :
+    global _CACHE_DIR
+    if path is None :
+        _CACHE_DIR = None
+        return
+    _CACHE_DIR = os.path.realpath( path )
+    if not os.path.isdir( _CACHE_DIR ) :
+        os.makedirs( _CACHE_DIR )
+
+# sha1 of file contents + format
+#
+def file_key( filename, format = "sdf" ) :
+    h = hashlib.sha1()
+    with open( filename, "rb" ) as f :
+        for chunk in iter( lambda : f.read( 65536 ), b"" ) :
+            h.update( chunk )
+    return "%s.%s" % (h.hexdigest(), format,)
+
+#
+#
+def molecule( filename, format = "sdf", verbose = False ) :
+    key = file_key( filename, format )
+    if not key in _MOLECULES :
+        _MOLECULES[key] = Molecule.from_file( filename = filename, format = format, verbose = verbose )
+    elif verbose :
+        sys.stdout.write( "molecule(%s): cached\n" % (filename,) )
+    return _MOLECULES[key]
+
+#
+#
+def chem_comp( filename, format = "sdf", verbose = False ) :
+    key = file_key( filename, format )
+    if not key in _CHEM_COMPS :
+        cc = _load( key, verbose )
+        if cc is None :
+            cc = molecule( filename, format = format, verbose = verbose ).chem_comp
+            _save( key, cc, verbose )
+        _CHEM_COMPS[key] = cc
+    elif verbose :
+        sys.stdout.write( "chem_comp(%s): cached\n" % (filename,) )
+    return copy.deepcopy( _CHEM_COMPS[key] )
+
+# drop molecule made from this file (it's been changed)
+#
+def forget( filename, format = "sdf" ) :
+    key = file_key( filename, format )
+    if key in _MOLECULES :
+        del _MOLECULES[key]
+
+#
+#
+def clear() :
+    _MOLECULES.clear()
+    _CHEM_COMPS.clear()
+
+#
+#
+def _pickle_file( key ) :
+    return os.path.join( _CACHE_DIR, "%s.chem_comp.v%d.pickle" % (key, PICKLE_VERSION,) )
+
+#
+#
+def _load( key, verbose = False ) :
+    if _CACHE_DIR is None : return None
+    pfile = _pickle_file( key )
+    if not os.path.exists( pfile ) : return None
+    try :
+        with open( pfile, "rb" ) as f :
+            rc = cPickle.load( f )
+        if verbose :
+            sys.stdout.write( "chem_comp from %s\n" % (pfile,) )
+        return rc
+    except Exception, e :
+        sys.stderr.write( "WARN: can't read %s: %s\n" % (pfile, str( e ),) )
+        return None
+
+# write to temp file and rename so that parallel runs don't read half a file
+#
+def _save( key, cc, verbose = False ) :
+    if _CACHE_DIR is None : return
+    pfile = _pickle_file( key )
+    tmp = "%s.%d" % (pfile, os.getpid(),)
+    try :
+        with open( tmp, "wb" ) as f :
+            cPickle.dump( cc, f, cPickle.HIGHEST_PROTOCOL )
+        os.rename( tmp, pfile )
+        if verbose :
+            sys.stdout.write( "chem_comp saved to %s\n" % (pfile,) )
+    except Exception, e :
+        sys.stderr.write( "WARN: can't write %s: %s\n" % (pfile, str( e ),) )
+        if os.path.exists( tmp ) : os.unlink( tmp )
+
+#
+#
+#
+if __name__ == '__main__':
+    for i in range( 2 ) :
+        cc = chem_comp( sys.argv[1], verbose = True )
+    sys.stdout.write( "%d atoms\n" % (len( cc["atoms"] ),) )
+
+#
+#
@@ -9,7 +9,13 @@
 #  This code is free: reuse what you like but give credit
 
 # this is a wrapper for pymol
-# you need pymol installed and in PYMOL_PATH in __init__.py
+# you need pymol installed and in PYMOL_PATH below. It's imported when render() is called.
+#
+# PyMOL can't be restarted once it quits, and cmd.quit() exits the process: make_image() runs
+# this file in a new python interpreter that does render(). Don't call render() yourself
+# unless you don't mind your process going away.
+#
+#   python img3d.py [-v] infile.mol outfile.png
 #
 from __future__ import absolute_import
 
@@ -17,22 +23,75 @@ import os
 import sys
 import time
 import threading
+import subprocess
 
 PYMOL_PATH = "/opt/pymol/lib/python2.7/site-packages"
-sys.path.append( PYMOL_PATH )
-import pymol
+
+# seconds: kill PyMOL if it takes longer than this
+#
+TIMEOUT = 600
+
+#
+#
+def _pymol() :
+    if not PYMOL_PATH in sys.path :
+        sys.path.append( PYMOL_PATH )
+    import pymol
+    return pymol
+
+# MOL to PNG in a new python process. Returns True if it made a non-empty PNG, raises Exception
+# if PyMOL crashed or hung.
+#
+def make_image( infile, outfile, verbose = False ) :
+    molfile = os.path.realpath( infile )
+    if not os.path.exists( infile ) :
+        raise IOError( "File not found: %s" % (molfile,) )
+
+    pngfile = os.path.realpath( outfile )
+    if os.path.exists( pngfile ) : os.unlink( pngfile )
+
+    script = "%s.py" % (os.path.splitext( os.path.realpath( __file__ ) )[0],)
+    cmd = [sys.executable, script, molfile, pngfile]
+    if verbose :
+        cmd.insert( 2, "-v" )
+        sys.stdout.write( "%s\n" % (" ".join( cmd ),) )
+
+    p = subprocess.Popen( cmd )
+    deadline = time.time() + TIMEOUT
+    while p.poll() is None :
+        if time.time() > deadline :
+            p.kill()
+            p.wait()
+            raise Exception( "PyMOL timed out after %d seconds on %s" % (TIMEOUT, molfile,) )
+        time.sleep( 1 )
+    if p.returncode != 0 :
+        raise Exception( "PyMOL exited with code %s on %s" % (p.returncode, molfile,) )
+
+    if not os.path.exists( pngfile ) :
+        sys.stderr.write( "Failed: no file (%s)\n" % (pngfile,) )
+        return False
+
+    if os.stat( pngfile ).st_size < 1 :
+        sys.stderr.write( "Failed: 0-byte file (%s)\n" % (pngfile,) )
+        os.unlink( pngfile )
+        return False
+
+    return True
 
 # Sometimes some of the commented out lines work, and sometimes: better than not-coommented-out ones.
 # Sometimes it generates a file and sometimes the file is zero bytes.
 # Go figure.
 #
-def make_image( infile, outfile, verbose = False ) :
+# This exits the process (see above).
+#
+def render( infile, outfile, verbose = False ) :
     molfile = os.path.realpath( infile )
     if not os.path.exists( infile ) :
         raise IOError( "File not found: %s" % (molfile,) )
 
     pngfile = os.path.realpath( outfile )
 
+    pymol = _pymol()
     pymol.pymol_argv = ["pymol", "-qc"]
     pymol.finish_launching()
 
@@ -101,7 +160,17 @@ def make_image( infile, outfile, verbose = False ) :
 #
 #
 if __name__ == '__main__':
-    make_image( sys.argv[1], "out.png", verbose = True )
+
+    import argparse
+    ap = argparse.ArgumentParser( description = "MOL to 3D PNG with PyMOL" )
+    ap.add_argument( "-v", "--verbose", default = False, action = "store_true",
+        help = "print lots of messages to stdout", dest = "verbose" )
+    ap.add_argument( "infile", help = "MOL file" )
+    ap.add_argument( "outfile", nargs = "?", default = "out.png", help = "PNG file (default: out.png)" )
+    args = ap.parse_args()
+
+    if render( args.infile, args.outfile, verbose = args.verbose ) is False :
+        sys.exit( 1 )
 
 #
 #
@@ -77,6 +77,37 @@ class Molecule( object ) :
         self._rdmol = rdmol
         self._verbose = bool( verbose )
 
+# chem_comp, masses, atom_counts are computed once, see invalidate()
+#
+        self._cache = {}
+
+    # call this after changing the molecule
+    #
+    def invalidate( self ) :
+        if self._verbose : sys.stdout.write( "%s.invalidate()\n" % (self.__class__.__name__,) )
+        self._cache.clear()
+
+    # energy minimization changes the molecule: only the toolkit that did it has new coordinates.
+    # RDKit does a better job of it.
+    #
+    def minimize( self, field = None, toolkit = "rdkit" ) :
+        if toolkit == "rdkit" :
+            if field is None : self._rdmol.minimize()
+            else : self._rdmol.minimize( field = field )
+        elif toolkit == "openbabel" :
+            if field is None : self._obmol.minimize()
+            else : self._obmol.minimize( field = field )
+        else :
+            raise NotImplementedError( "minimize(): %s" % (toolkit,) )
+        self.invalidate()
+
+    # Adding them back is not guaranteed to result in the same molecule
+    #
+    def removeh( self ) :
+        self._obmol.removeh()
+        self._rdmol.removeh()
+        self.invalidate()
+
     # wrapper for RDKit MOL writer
     #
     def __mol__( self ) :
@@ -102,8 +133,17 @@ class Molecule( object ) :
     # chem comp stuff
     # can get big-ish, don't use on large molecules
     #
+    # this is the same dict every time: copy it if you're going to change it
+    #
     @property
     def chem_comp( self ) :
+        if not "chem_comp" in self._cache :
+            self._cache["chem_comp"] = self._make_chem_comp()
+        return self._cache["chem_comp"]
+
+    #
+    #
+    def _make_chem_comp( self ) :
 
         rc = { "sf_category" : "chem_comp" }
 
@@ -216,8 +256,6 @@ class Molecule( object ) :
         rc["formula"] = self.formula
         rc["charge"] = self.charge
 
-# don't recalculate for every call
-#
         cnts = self.atom_counts
         rc["num_atoms_all"] = cnts["all"]
         rc["num_atoms_nh"] = cnts["non-H"]
@@ -254,23 +292,27 @@ class Molecule( object ) :
     # we could fetch the table from NIST and calculate weights ourselves...
     #
     def __masses__( self ) :
-        rc = { "mass" : self._obmol._mol.molwt, "monoisotopic" : self._obmol._mol.exactmass }
-        rc["c13"] = self._obmol.monoisotopic_mass( carbon = 13 )
-        rc["n15"] = self._obmol.monoisotopic_mass( nitrogen = 15 )
-        rc["c13n15"] = self._obmol.monoisotopic_mass( carbon = 13, nitrogen = 15 )
-        return rc
+        if not "masses" in self._cache :
+            rc = { "mass" : self._obmol._mol.molwt, "monoisotopic" : self._obmol._mol.exactmass }
+            rc["c13"] = self._obmol.monoisotopic_mass( carbon = 13 )
+            rc["n15"] = self._obmol.monoisotopic_mass( nitrogen = 15 )
+            rc["c13n15"] = self._obmol.monoisotopic_mass( carbon = 13, nitrogen = 15 )
+            self._cache["masses"] = rc
+        return self._cache["masses"]
     masses = property( __masses__ )
 
     # atoms
     # NMR-STAR chem comp has fields for num atoms and num non-hydrogens
     #
     def __atom_counts__( self ) :
-        rc = { "all" : 0, "non-H" : 0 }
-        for atom in self.iter_atoms() :
-            rc["all"] += 1
-            if not atom["type"] in ("H","D","T") :
-                rc["non-H"] += 1
-        return rc
+        if not "atom_counts" in self._cache :
+            rc = { "all" : 0, "non-H" : 0 }
+            for atom in self.iter_atoms() :
+                rc["all"] += 1
+                if not atom["type"] in ("H","D","T") :
+                    rc["non-H"] += 1
+            self._cache["atom_counts"] = rc
+        return self._cache["atom_counts"]
     atom_counts = property( __atom_counts__ )
 
     #
@@ -278,6 +278,13 @@ class OBmolecule( object ) :
         ff.SteepestDescent( 2000 )
         ff.GetCoordinates( self._mol.OBMol )
 
+    # this changes the molecule too
+    #
+    def removeh( self ) :
+        """remove hydrogens"""
+        if self._verbose : sys.stdout.write( "%s.removeh()\n" % (self.__class__.__name__,) )
+        self._mol.removeh()
+
     # chem comp bond
     # return { "id" : N, "type" : covalent|amide|ester|carbonyl, "atom1" : I, "atom2" : J }
     #
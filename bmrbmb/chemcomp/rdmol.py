@@ -317,6 +317,13 @@ class RDmolecule( object ) :
         except ValueError :
             pass
 
+    # this changes the molecule too
+    #
+    def removeh( self ) :
+        """remove hydrogens"""
+        if self._verbose : sys.stdout.write( "%s.removeh()\n" % (self.__class__.__name__,) )
+        self._mol = rdkit.Chem.RemoveHs( self._mol )
+
 ###############################
     #
     # chem comp atom
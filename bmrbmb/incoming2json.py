@@ -49,6 +49,10 @@ class FAMtoJSN( object ) :
 #
     DATASET_MASK = "set%02d"
 
+# seconds to wait for web lookups in _make_chem_comp()
+#
+    LOOKUP_TIMEOUT = { "bmrbid" : 20, "iupac_name" : 30, "pubchem" : 60 }
+
     # main
     # indexfile is the catalog file, see nmrfam2incoming.py
     #
@@ -81,6 +85,7 @@ class FAMtoJSN( object ) :
             raise IOError( "Not a directory: %s" % (self._indir,) )
         self._verbose = bool( verbose )
         self._dat = []
+        self._sdf = None
         self._mol = None
         self._chem_comp = None
         self._inchi = None
@@ -195,8 +200,8 @@ class FAMtoJSN( object ) :
         if self._verbose : sys.stdout.write( "%s.make_chem_comp()\n" % (self.__class__.__name__,) )
 
         sdf = os.path.join( self._indir, self._idx["sdf"] )
-        self._mol = chemcomp.Molecule.from_file( filename = sdf, verbose = self._verbose )
-        self._chem_comp = self._mol.chem_comp
+        self._sdf = sdf
+        self._chem_comp = chemcomp.cache.chem_comp( filename = sdf, verbose = self._verbose )
 
         if "descriptors" in self._chem_comp.keys() :
             for i in self._chem_comp["descriptors"] :
@@ -220,23 +225,30 @@ class FAMtoJSN( object ) :
                 self._chem_comp["common_name"] = []
             self._chem_comp["common_name"].append( self._idx["catalog_name"] )
 
-# web stuff
+# web stuff: all at once, whatever doesn't answer in time is left out
 #
+        inchi_key = www.key_for_inchi( self._inchi, self._chem_comp.get( "descriptors" ) )
+        jobs = { "bmrbid" : (www.bmrbid, (self._inchi, inchi_key), self.LOOKUP_TIMEOUT["bmrbid"]),
+            "iupac_name" : (www.cactus_iupac_name, (self._inchi,), self.LOOKUP_TIMEOUT["iupac_name"]) }
+        if "cid" in self._idx.keys() :
+            jobs["pubchem"] = (www.get_pubchem_data, (self._idx["cid"],), self.LOOKUP_TIMEOUT["pubchem"])
+        found = www.lookup_all( jobs, verbose = self._verbose )
+
         if not "dblinks" in self._chem_comp.keys() :
             self._chem_comp["dblinks"] = []
-        bmrbid = www.bmrbid( self._inchi, self._verbose )
+        bmrbid = found["bmrbid"]
         if not bmrbid is None :
             self._chem_comp["dblinks"].append( bmrbid )
 
         if not "identifiers" in self._chem_comp.keys() :
             self._chem_comp["identifiers"] = []
-        iupac_name = www.cactus_iupac_name( self._inchi, self._verbose )
+        iupac_name = found["iupac_name"]
         if not iupac_name is None :
             for name in iupac_name :
                 self._chem_comp["identifiers"].append( name )
 
-        if "cid" in self._idx.keys() :
-            pug = www.get_pubchem_data( self._idx["cid"], self._verbose )
+        if "pubchem" in found.keys() :
+            pug = found["pubchem"]
             if pug is not None :
                 if "identifiers" in pug.keys() :
                     for i in pug["identifiers"] :
@@ -251,6 +263,17 @@ class FAMtoJSN( object ) :
 #
         self._dat.append( [self._chem_comp] )
 
+    ################################################################################################
+    # molecule for add_alatis_map() and add_author_atomname_map(): only they need it, chem_comp
+    # may well come from the pickle. Same file as chem_comp.
+    #
+    def _molecule( self ) :
+        if self._mol is None :
+            if self._sdf is None :
+                raise Exception( "Run precheck() first!" )
+            self._mol = chemcomp.cache.molecule( filename = self._sdf, verbose = self._verbose )
+        return self._mol
+
     ################################################################################################
     # ALATIS map: for entries made before/without ALATIS
     # atom_ids throughout the entry are pre-alatis
@@ -262,7 +285,7 @@ class FAMtoJSN( object ) :
         if self._chem_comp is None :
             raise Exception( "Run precheck() first!" )
 
-        alt = self._mol.alatis_map()
+        alt = self._molecule().alatis_map()
         if alt is None :
             return
 
@@ -285,7 +308,7 @@ class FAMtoJSN( object ) :
         if self._chem_comp is None :
             raise Exception( "Run precheck() first!" )
 
-        alt = self._mol.alatis_map()
+        alt = self._molecule().alatis_map()
         if alt is None :
             return
 
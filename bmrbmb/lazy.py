@@ -0,0 +1,102 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  lazy.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# import package contents on first use: "import bmrbmb" shouldn't drag in RDKit, OpenBabel,
+# PyMOL, starobj, and urllib2 when all you want is the BMSE ID list.
+#
+# At the end of package's __init__.py:
+#
+#   install( __name__, { "Molecule" : (".molecule", "Molecule"), "cache" : (".cache", None) } )
+#
+# name : (module, attribute) -- attribute None is the module itself. Module name is relative
+# to the package. The package in sys.modules is replaced with LazyModule that imports
+# the module when the name is first looked up and passes everything else through to the package,
+# so bmrbmb.chemcomp.Molecule, "from bmrbmb.chemcomp import Molecule", and
+# "import bmrbmb.chemcomp.cache" all work as before.
+#
+
+from __future__ import absolute_import
+
+import sys
+import types
+import importlib
+
+#
+#
+#
+class LazyModule( types.ModuleType ) :
+
+    # everything else is in the original module: functions defined in __init__.py use its globals,
+    # so that's where the names are looked up and set
+    #
+    def __init__( self, module, attrs ) :
+        types.ModuleType.__init__( self, module.__name__, module.__doc__ )
+        self.__dict__["_lazy_module"] = module
+        self.__dict__["_lazy_attrs"] = dict( attrs )
+
+    # only called when the name isn't in self.__dict__: imported names are kept there
+    #
+    def __getattr__( self, name ) :
+        module = self.__dict__["_lazy_module"]
+        attrs = self.__dict__["_lazy_attrs"]
+        if (not name in attrs) or (name in module.__dict__) :
+            return getattr( module, name )
+        (modname, attr) = attrs[name]
+        mod = importlib.import_module( modname, self.__name__ )
+        if attr is None : val = mod
+        else : val = getattr( mod, attr )
+        setattr( module, name, val )
+        self.__dict__[name] = val
+        return val
+
+    #
+    #
+    def __setattr__( self, name, value ) :
+        setattr( self.__dict__["_lazy_module"], name, value )
+        if name in self.__dict__["_lazy_attrs"] :
+            self.__dict__[name] = value
+
+    #
+    #
+    def __delattr__( self, name ) :
+        delattr( self.__dict__["_lazy_module"], name )
+        self.__dict__.pop( name, None )
+
+    #
+    #
+    def __dir__( self ) :
+        return sorted( set( dir( self.__dict__["_lazy_module"] ) ) | set( self.__dict__["_lazy_attrs"].keys() ) )
+
+# replace package name in sys.modules with LazyModule
+#
+def install( name, attrs ) :
+    mod = sys.modules[name]
+    if isinstance( mod, LazyModule ) :
+        mod.__dict__["_lazy_attrs"].update( attrs )
+        return mod
+    lm = LazyModule( mod, attrs )
+    sys.modules[name] = lm
+    return lm
+
+#
+#
+#
+if __name__ == '__main__':
+
+    import os
+    sys.path.insert( 0, os.path.realpath( os.path.join( os.path.split( __file__ )[0], ".." ) ) )
+    import bmrbmb
+    for name in sys.argv[1:] :
+        sys.stdout.write( "%s: %s\n" % (name, getattr( bmrbmb, name ),) )
+    sys.stdout.write( "loaded: %s\n" % (", ".join( sorted( i for i in sys.modules.keys() \
+            if i.startswith( "bmrbmb." ) and (sys.modules[i] is not None) ) ),) )
+
+#
+#
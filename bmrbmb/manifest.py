@@ -0,0 +1,172 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  manifest.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# what went into the entry directory: for each pipeline stage, sha1 of its input files and
+# size + mtime of the files it made. Kept in the entry directory as .manifest.json.
+#
+# A stage is current if its inputs hash the same and its outputs haven't been touched since.
+# Input hashes are cached by (size, mtime) so a multi-gigabyte tarball is only re-read when
+# it changes.
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import json
+import hashlib
+
+#
+#
+#
+class Manifest( object ) :
+
+    FILENAME = ".manifest.json"
+    VERSION = 1
+
+    #
+    #
+    def __init__( self, entrydir, verbose = False ) :
+        self._dir = os.path.realpath( entrydir )
+        self._verbose = bool( verbose )
+        self._data = { "version" : self.VERSION, "files" : {}, "stages" : {} }
+
+    # empty manifest if there isn't one or it's unreadable
+    #
+    @classmethod
+    def read( cls, entrydir, verbose = False ) :
+        rc = cls( entrydir, verbose )
+        mfile = rc.filename
+        if not os.path.exists( mfile ) : return rc
+        try :
+            with open( mfile, "rU" ) as f :
+                dat = json.load( f )
+            if dat.get( "version" ) == cls.VERSION :
+                rc._data = dat
+        except Exception, e :
+            sys.stderr.write( "WARN: can't read %s: %s\n" % (mfile, str( e ),) )
+        return rc
+
+    #
+    #
+    @property
+    def __json__( self ) :
+        return json.dumps( self._data, indent = 4, sort_keys = True )
+
+    #
+    #
+    @property
+    def filename( self ) :
+        return os.path.join( self._dir, self.FILENAME )
+
+    # forget the stages, keep the input hashes: they're still good
+    #
+    def clear( self ) :
+        self._data["stages"] = {}
+
+    # write to temp file and rename so that a crash doesn't leave half a manifest
+    #
+    def save( self ) :
+        if not os.path.isdir( self._dir ) : os.makedirs( self._dir )
+        tmp = "%s.%d" % (self.filename, os.getpid(),)
+        with open( tmp, "wb" ) as out :
+            out.write( self.__json__ )
+        os.rename( tmp, self.filename )
+
+    # sha1 of the file, re-read only if size or mtime changed
+    #
+    def file_hash( self, filename ) :
+        filename = os.path.realpath( filename )
+        st = os.stat( filename )
+        rec = self._data["files"].get( filename )
+        if (rec is not None) and (rec["size"] == st.st_size) and (rec["mtime"] == st.st_mtime) :
+            return rec["sha1"]
+
+        if self._verbose : sys.stdout.write( "sha1 %s\n" % (filename,) )
+        h = hashlib.sha1()
+        with open( filename, "rb" ) as f :
+            for chunk in iter( lambda : f.read( 1048576 ), b"" ) :
+                h.update( chunk )
+        self._data["files"][filename] = { "size" : st.st_size, "mtime" : st.st_mtime, "sha1" : h.hexdigest() }
+        return h.hexdigest()
+
+    # { name : sha1 } for names in srcdir
+    #
+    def inputs( self, srcdir, names ) :
+        rc = {}
+        for i in names :
+            rc[i] = self.file_hash( os.path.join( srcdir, i ) )
+        return rc
+
+    # { relative path : [ size, mtime ] } for files in and under outputs (relative to the entry dir)
+    # skipping paths in exclude. Output files that aren't there are None: the stage didn't make
+    # everything it should've, next time it isn't current.
+    #
+    def _stat( self, outputs, exclude = () ) :
+        rc = {}
+        skip = set( os.path.join( self._dir, i ) for i in exclude )
+        for i in outputs :
+            path = os.path.join( self._dir, i )
+            if path in skip : continue
+            if not os.path.isdir( path ) :
+                if os.path.exists( path ) :
+                    st = os.stat( path )
+                    rc[os.path.relpath( path, self._dir )] = [st.st_size, st.st_mtime]
+                else :
+                    rc[os.path.relpath( path, self._dir )] = None
+                continue
+            for (d, dirs, files) in os.walk( path ) :
+                dirs[:] = [j for j in dirs if not os.path.join( d, j ) in skip]
+                for j in files :
+                    f = os.path.join( d, j )
+                    if f in skip : continue
+                    st = os.lstat( f )
+                    rc[os.path.relpath( f, self._dir )] = [st.st_size, st.st_mtime]
+        return rc
+
+    # inputs: same as last time, outputs: there and not changed
+    #
+    def is_current( self, stage, inputs ) :
+        rec = self._data["stages"].get( stage )
+        if rec is None : return False
+        if rec["inputs"] != inputs : return False
+        for (name, stat) in rec["outputs"].items() :
+            if stat is None : return False
+            (size, mtime) = stat
+            path = os.path.join( self._dir, name )
+            if not os.path.lexists( path ) : return False
+            st = os.lstat( path )
+            if (st.st_size != size) or (st.st_mtime != mtime) : return False
+        return True
+
+    # about to (re)make it: if that fails, the old record's no good either
+    #
+    def start( self, stage ) :
+        if stage in self._data["stages"] :
+            del self._data["stages"][stage]
+            self.save()
+
+    #
+    #
+    def done( self, stage, inputs, outputs = (), exclude = () ) :
+        self._data["stages"][stage] = { "inputs" : inputs, "outputs" : self._stat( outputs, exclude ) }
+        self.save()
+
+#
+#
+#
+if __name__ == '__main__':
+
+    m = Manifest.read( sys.argv[1], verbose = True )
+    sys.stdout.write( m.__json__ )
+    sys.stdout.write( "\n" )
+
+#
+#
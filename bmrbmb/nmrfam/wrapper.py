@@ -321,7 +321,8 @@ class FromNMRFAM( object ) :
 #
         if not "dblinks" in self._chem_comp.keys() :
             self._chem_comp["dblinks"] = []
-        bmrbid = bmrbmb.www.bmrbid( self._inchi, self._verbose )
+        inchi_key = bmrbmb.www.key_for_inchi( self._inchi, self._chem_comp.get( "descriptors" ) )
+        bmrbid = bmrbmb.www.bmrbid( self._inchi, inchi_key, verbose = self._verbose )
         if not bmrbid is None :
             self._chem_comp["dblinks"].append( bmrbid )
 
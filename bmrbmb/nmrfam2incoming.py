@@ -20,6 +20,7 @@ import pprint
 if __name__ != "__main__" :
     from . import chemcomp
     from . import topspin
+    from . import staging
 
 """Read the json index file and copy files to $BMRBID/incoming.
 This combines the "precheck" for completeness and creation of "incoming" directory
@@ -193,9 +194,9 @@ class Precheck( object ) :
 #  (early versions of alatis didn't put it in sdf, it had to be in the index)
 
         inchi = None
-        mol = chemcomp.Molecule.from_file( filename = self._index["sdf"], verbose = self._verbose )
-        if "descriptors" in mol.chem_comp.keys() :
-            for i in mol.chem_comp["descriptors"] :
+        cc = chemcomp.cache.chem_comp( filename = self._index["sdf"], verbose = self._verbose )
+        if "descriptors" in cc.keys() :
+            for i in cc["descriptors"] :
                 if (i["type"] == "InChI") and (i["program"] == "ALATIS") :
                     inchi = i["descriptor"]
         if inchi is None :
@@ -244,7 +245,7 @@ class Precheck( object ) :
                 i += 1
                 self._index["data"][i] = self._check_dataset( data = self._idx["data"][k] )
 
-    # copy files to incoming
+    # copy (or link, see staging) files to incoming
     #
     def copy_files( self ) :
         if self._verbose : sys.stdout.write( "%s.copy_files()\n" % (self.__class__.__name__,) )
@@ -259,9 +260,7 @@ class Precheck( object ) :
             src = self._index[i]
             fname = os.path.split( src )[1]
             dst = os.path.join( self._outdir, fname )
-            if self._verbose :
-                sys.stdout.write( "copy %s to %s\n" % (src,dst,) )
-            shutil.copy( src, dst )
+            staging.stage( src, dst, verbose = self._verbose )
             self._index[i] = fname
 
         for i in self._index["data"].keys() :
@@ -275,9 +274,7 @@ class Precheck( object ) :
                 if os.path.exists( dst ) :
                     raise IOError( "%s already exists in %s, won't overwrite" % (fname, self._outdir) )
 
-                if self._verbose :
-                    sys.stdout.write( "copy %s to %s\n" % (src,dst,) )
-                shutil.copy( src, dst )
+                staging.stage( src, dst, verbose = self._verbose )
                 self._index["data"][i][j] = fname
 
             for j in ("PEAKFILES", "PNGFILES") :
@@ -292,9 +289,7 @@ class Precheck( object ) :
                     dst = os.path.join( self._outdir, fname )
                     if os.path.exists( dst ) :
                         raise IOError( "%s already exists in %s, won't overwrite" % (fname, self._outdir) )
-                    if self._verbose :
-                        sys.stdout.write( "copy %s to %s\n" % (src,dst,) )
-                    shutil.copy( src, dst )
+                    staging.stage( src, dst, verbose = self._verbose )
                     tmplist[fname] = self._index["data"][i][j][src]
 
                 del self._index["data"][i][j]
@@ -315,6 +310,7 @@ if __name__ == "__main__" :
 
     import chemcomp
     import topspin
+    import staging
 
     rc = Precheck.make_incoming( indexfile = sys.argv[1], outdir = sys.argv[2], verbose = True )
 
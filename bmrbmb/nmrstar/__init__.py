@@ -50,74 +50,57 @@ DATASET_DIR = os.path.join( "nmr", DATASET_MASK )
 PEAKFILE_DIR = os.path.join( DATASET_DIR, "transitions" )
 SPECTRA_DIR = os.path.join( DATASET_DIR, "spectra" )
 
-# sqlite3 database with one table: ids (id text primary key, dirname text, inchi text)
+# sqlite3 database with one table: ids (id text primary key, dirname text, inchi text, seq integer)
+# see idlist.py
 #
 IDLIST = "/share/dmaziuk/projects/metabolomics_pipe/bmrbids.sqlt3"
 
 # return bmrb id for dirname. inchi string gets added when creating a new record
+# if inchi already has an ID, that's the one (it's unique now)
 #
 def bmrbid( dirname, inchi, verbose = False ) :
     global IDLIST
-    if not os.path.exists( os.path.realpath( IDLIST ) ) :
-        raise IOError( "Not found: %s" % (os.path.realpath( IDLIST ),) )
+    conn = idlist.connect( IDLIST, verbose = verbose )
+    try :
+        rc = idlist.find_by_dirname( conn, dirname )
+        if rc is not None : return rc
 
-    conn = sqlite3.connect( os.path.realpath( IDLIST ) )
-    curs = conn.cursor()
-    rc = None
-    sql = "select id from ids where dirname=?"
-    curs.execute( sql, (dirname,) )
-    for row in curs :
-        rc = row[0]
-        break
+        rc = idlist.find_by_inchi( conn, inchi )
+        if rc is not None :
+            sys.stderr.write( "WARN: no %s in ID list, but %s has ID %s\n" % (dirname,inchi,rc,) )
+            return rc
 
-    if rc is None :
-        sql = "select id from ids where inchi=?"
-        curs.execute( sql, (inchi,) )
-        for row in curs :
-            sys.stderr.write( "WARN: no %s in ID list, but %s has ID %s\n" % (dirname,inchi,row[0],) )
-
-# make new one
-#
-        pat = re.compile( r"^bmse(\d+)$" )
-        sql = "select id from ids"
-        bid = -1
-        curs.execute( sql )
-        for row in curs :
-            m = pat.search( row[0] )
-            if not m :
-                raise Exception( "ID %s does not match pattern" % (row[0],) )
-            if int( m.group( 1 ) ) > bid :
-                bid = int( m.group( 1 ) )
-
-        if bid < 0 :
-            raise Exception( "Can't add BMRB ID" )
-
-        bid += 1
-        rc = "bmse%06d" % (bid,)
-
-        sql = "insert into ids (id,dirname,inchi) values (?,?,?)"
-        curs.execute( sql, (rc,dirname,inchi,) )
-        conn.commit()
-
-    curs.close()
-    conn.close()
-    return rc
+        (rc, new) = idlist.allocate( conn, dirname, inchi, verbose = verbose )
+        return rc
+    finally :
+        conn.close()
 
 #
 #
 #
-from .entrydir import EntryDir
-from .extras import EntryExtras
-from .star import StarMaker
+from . import idlist
+
+# starobj is imported with StarMaker: not needed for the ID list
+#
+from ..lazy import install as _lazy
+_lazy( __name__, {
+    "EntryDir" : (".entrydir", "EntryDir"),
+    "EntryExtras" : (".extras", "EntryExtras"),
+    "StarMaker" : (".star", "StarMaker"),
+    "StarMakerSession" : (".star", "StarMakerSession"),
+    "SQLProfiler" : (".sqlprofile", "SQLProfiler")
+} )
 
 #
 #
 #
 __all__ = [ "README", "DATASET_MASK", "DATASET_DIR", "PEAKFILE_DIR", "SPECTRA_DIR",
-        "bmrbid",
+        "bmrbid", "idlist",
         "EntryDir",
         "EntryExtras",
-        "StarMaker"
+        "StarMaker",
+        "StarMakerSession",
+        "SQLProfiler"
     ]
 #
 #
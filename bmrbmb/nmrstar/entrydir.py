@@ -30,9 +30,10 @@ import sys
 import shutil
 import json
 import re
-import tarfile
 
 from . import README, DATASET_DIR, PEAKFILE_DIR, SPECTRA_DIR
+from .. import topspin
+from .. import staging
 
 #
 #
@@ -58,26 +59,41 @@ class EntryDir( object ) :
 # we'll need sdf later
 #
         self._sdf = os.path.join( self._outdir, "%s%s" % (self._bmrbid,os.path.splitext( self._idx["sdf"] )[1],) )
+        self._molpic = os.path.join( self._outdir, "%s_nom%s" % (self._bmrbid,os.path.splitext( self._idx["molpic"] )[1],) )
         os.umask( 0o002 )
 
+    # clean: start over, else only make the missing ones
     #
-    #
-    def makedirs( self ) :
+    def makedirs( self, clean = True ) :
 
         if not os.path.isdir( self._outdir ) :
             os.makedirs( self._outdir )
 
 
         nmrdir = os.path.split( os.path.join( self._outdir, DATASET_DIR ) )[0]
-        if os.path.isdir( nmrdir ) :
+        if clean and os.path.isdir( nmrdir ) :
             shutil.rmtree( nmrdir )
 
-        os.makedirs( nmrdir )
         for i in self._idx["data"].keys() :
             num = int( i )
-            os.makedirs( os.path.join( self._outdir, DATASET_DIR % (num,) ) )
-            os.makedirs( os.path.join( self._outdir, PEAKFILE_DIR % (num,) ) )
-            os.makedirs( os.path.join( self._outdir, SPECTRA_DIR  % (num,) ) )
+            for j in (DATASET_DIR, PEAKFILE_DIR, SPECTRA_DIR) :
+                path = os.path.join( self._outdir, j % (num,) )
+                if not os.path.isdir( path ) :
+                    os.makedirs( path )
+
+    # empty the directory except for names in keep, so the steps below can be re-run
+    #
+    def _cleandir( self, path, keep = () ) :
+        if not os.path.isdir( path ) :
+            os.makedirs( path )
+            return
+        for i in os.listdir( path ) :
+            if i in keep : continue
+            f = os.path.join( path, i )
+            if os.path.isdir( f ) and not os.path.islink( f ) :
+                shutil.rmtree( f )
+            else :
+                os.unlink( f )
 
     # copy files in top-level directory
     #
@@ -86,18 +102,18 @@ class EntryDir( object ) :
 # sdf
 
         src = os.path.join( self._srcdir, self._idx["sdf"] )
-        shutil.copy( src, self._sdf )
+        staging.stage( src, self._sdf, verbose = self._verbose )
 
 # svg - this one has atom labels, rename to "_nom"
 # if it has a <rect> -- strip that off
 #
         src = os.path.join( self._srcdir, self._idx["molpic"] )
-        dst = os.path.join( self._outdir, "%s_nom%s" % (self._bmrbid,os.path.splitext( self._idx["molpic"] )[1],) )
+        dst = self._molpic
 
 # ... unless it's a png from marvin
 #
         if os.path.splitext( self._idx["molpic"] )[1].lower() != ".svg" :
-            shutil.copy( src, dst )
+            staging.stage( src, dst, verbose = self._verbose )
         else :
             rectpat = re.compile( r'^<svg:rect\s.+</svg:rect>$' )
 #        dst2 = os.path.join( self._outdir, "%s_nom2%s" % (self._bmrbid,os.path.splitext( self._idx["molpic"] )[1],) )
@@ -123,6 +139,7 @@ class EntryDir( object ) :
         for i in self._idx["data"].keys() :
             set_num = int( i )
             peakdir = os.path.join( self._outdir, PEAKFILE_DIR % (set_num,) )
+            self._cleandir( peakdir )
 
             for j in self._idx["data"][i]["PEAKFILES"].keys() :
                 src = os.path.join( self._srcdir, j )
@@ -130,7 +147,7 @@ class EntryDir( object ) :
                 dstdir = os.path.join( peakdir, dstname )
                 dst = os.path.join( dstdir, "%s%s" % (dstname,os.path.splitext( j )[1],) )
                 os.makedirs( dstdir )
-                shutil.copy( src, dst )
+                staging.stage( src, dst, verbose = self._verbose )
 
     # copy pictures
     #
@@ -139,6 +156,7 @@ class EntryDir( object ) :
         for i in self._idx["data"].keys() :
             set_num = int( i )
             specdir = os.path.join( self._outdir, SPECTRA_DIR % (set_num,) )
+            self._cleandir( specdir )
 
             for j in self._idx["data"][i]["PNGFILES"].keys() :
                 src = os.path.join( self._srcdir, j )
@@ -146,7 +164,7 @@ class EntryDir( object ) :
                 dstdir = os.path.join( specdir, dstname )
                 dst = os.path.join( dstdir, "%s%s" % (dstname,os.path.splitext( j )[1],) )
                 os.makedirs( dstdir )
-                shutil.copy( src, dst )
+                staging.stage( src, dst, verbose = self._verbose )
 
     # untar timedomain data
     #
@@ -157,26 +175,14 @@ class EntryDir( object ) :
             tarball = self._idx["data"][i]["timedomain"]
             src = os.path.join( self._srcdir, tarball )
             tgtdir = os.path.join( self._outdir, DATASET_DIR % (set_num,) )
+            self._cleandir( tgtdir, keep = (os.path.basename( PEAKFILE_DIR ), os.path.basename( SPECTRA_DIR )) )
 
-# strip off top dir if present
-#
-            tar = tarfile.open( src, "r" )
-            (car,cdr) = os.path.split( tar.getmembers()[0].name )
-            while car != "" :
-                (car,cdr) = os.path.split( car )
-            root = "%s/" % (cdr,)
-            extract = []
-            for i in tar.getmembers() :
-                if self._verbose :
-                    sys.stdout.write( "root = %s, replace with '' in %s if startswith\n" % (root,i.name) )
-                if i.name.startswith( root ) :
-                    i.name = i.name.replace( root, "" )
-                    extract.append( i )
+# one pass: top dir is stripped off and the file list is kept for FAMtoJSN
+#
             if self._verbose :
-                sys.stdout.write( "Untar these to %s:\n" % (self._datadir,) )
-                for i in extract : sys.stdout.write( " - %s\n" % (i.name,) )
-            tar.extractall( members = extract, path = tgtdir )
-            tar.close()
+                sys.stdout.write( "Untar %s to %s\n" % (src,tgtdir,) )
+            efl = topspin.ExperimentFiles( tarfile = src, verbose = self._verbose )
+            efl.extract( outdir = tgtdir, clean = False )
 
 #
 #
@@ -20,13 +20,11 @@ import os
 import sys
 import tempfile
 
-# self
+# self: this also runs as a script, see command()
 #
-#_HERE = os.path.split( __file__ )[0]
-#sys.path.append( os.path.realpath( os.path.join( os.path.join( _HERE, ".." ), ".." ) ) )
-#import bmrbmb.chemcomp
-
-from .. import chemcomp
+_HERE = os.path.split( __file__ )[0]
+sys.path.append( os.path.realpath( os.path.join( os.path.join( _HERE, ".." ), ".." ) ) )
+import bmrbmb.chemcomp
 
 # class because I want to keep the molecule
 #
@@ -42,6 +40,22 @@ class EntryExtras( object ) :
         rc.make_svg()
         rc.make_png()
 
+# we've messed with the molecule
+#
+        bmrbmb.chemcomp.cache.forget( rc._infile )
+
+    # command line for makefiles() in a new python process: PyMOL exits the process it runs in
+    # and can't be started again in a fork of one where it's been loaded.
+    # timejson: Stopwatch stats are written to this file
+    #
+    @classmethod
+    def command( cls, sdf, timejson = None, verbose = False ) :
+        rc = [sys.executable, "%s.py" % (os.path.splitext( os.path.realpath( __file__ ) )[0],)]
+        if verbose : rc.append( "-v" )
+        if timejson is not None : rc.extend( ["--time-json", os.path.realpath( timejson )] )
+        rc.append( os.path.realpath( sdf ) )
+        return rc
+
     #
     #
     def __init__( self, sdf, verbose ) :
@@ -49,7 +63,7 @@ class EntryExtras( object ) :
         if not os.path.exists( infile ) :
             raise IOError( "Not found: %s" % (infile,) )
         self._infile = infile
-        self._mol = chemcomp.Molecule.from_file( filename = infile, verbose = verbose )
+        self._mol = bmrbmb.chemcomp.cache.molecule( filename = infile, verbose = verbose )
         self._verbose = bool( verbose )
 
     # SDF to MOL: this only really strips off SDF "properties" from the end of MOL block.
@@ -74,32 +88,57 @@ class EntryExtras( object ) :
         with open( outfile, "wb" ) as out :
             out.write( self._mol._obmol.to_svg( full = False ) )
 
+# small SVG is made without hydrogens
+#
+        self._mol.invalidate()
+
     # pymol: MOL to 3D PNG. The image is intended to be used instead of jsmol widget in lists etc.
-    # where you'd end up creating lots of jsmol instances.
+    # where you'd end up creating lots of jsmol instances. PyMOL runs in its own process.
     # energy-minimizing first tends to help, RDKit does a better job of it
+    # PyMOL sometimes makes no image or an empty one: that's a warning, not a failure.
+    # It timing out or crashing is (make_image() raises).
     #
     def make_png( self, minimize = True ) :
 
         if minimize :
             (fd, fname) = tempfile.mkstemp( dir = os.path.split( self._infile )[0], suffix = ".mol")
             molfile = fname
-            self._mol._rdmol.minimize()
-            os.write( fd, self._mol._rdmol.mol )
+            self._mol.minimize()
+            os.write( fd, self._mol.mol )
             os.close( fd )
         else :
             molfile = "%s.mol" % (os.path.splitext( self._infile )[0],)
 
         outfile = "%s.png" % (os.path.splitext( self._infile )[0],)
-        chemcomp.make_image( molfile, outfile, verbose = self._verbose )
-
-        if minimize :
-            os.unlink( molfile )
+        try :
+            if not bmrbmb.chemcomp.make_image( molfile, outfile, verbose = self._verbose ) :
+                sys.stderr.write( "WARN: PyMOL made no image: %s\n" % (outfile,) )
+        finally :
+            if minimize :
+                os.unlink( molfile )
 
 #
 #
 #
 if __name__ == '__main__':
-    EntryExtras.makefiles( sdf = sys.argv[1], verbose = True )
+
+    import argparse
+    ap = argparse.ArgumentParser( description = "Make MOL, SVG, and 3D PNG files from SDF" )
+    ap.add_argument( "-v", "--verbose", default = False, action = "store_true",
+        help = "print lots of messages to stdout", dest = "verbose" )
+    ap.add_argument( "--time-json", help = "write the times to this JSON file", dest = "timejson" )
+    ap.add_argument( "sdf", help = "SDF file" )
+    args = ap.parse_args()
+
+    if args.timejson is None :
+        EntryExtras.makefiles( sdf = args.sdf, verbose = args.verbose )
+    else :
+        from bmrbmb.stopwatch import Stopwatch
+        sw = Stopwatch()
+        with sw.stage( "EntryExtras.makefiles" ) :
+            EntryExtras.makefiles( sdf = args.sdf, verbose = args.verbose )
+        with open( args.timejson, "wb" ) as f :
+            f.write( sw.__json__ )
 
 #
 #
@@ -0,0 +1,163 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  idlist.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# BMSE ID list: sqlite3 database with one table,
+#   ids (id text primary key, dirname text, inchi text, seq integer)
+# seq is the number in "bmseNNNNNN", with unique index: next ID is max( seq ) + 1 without
+# reading the whole table. inchi and dirname are indexed, unique if the old data allows.
+#
+# New IDs are made inside "begin immediate" so that two processes can't hand out the same one:
+# the second waits for the first to commit.
+#
+# Older databases w/o seq column are migrated when opened (schema version is in user_version).
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import re
+import sqlite3
+
+SCHEMA_VERSION = 1
+IDPAT = re.compile( r"^bmse(\d+)$" )
+IDFMT = "bmse%06d"
+
+# seconds to wait for the other process' transaction
+#
+TIMEOUT = 60
+
+# autocommit: transactions are begin/commit'ed here
+#
+def connect( dbfile, verbose = False ) :
+    dbfile = os.path.realpath( dbfile )
+    if not os.path.exists( dbfile ) :
+        raise IOError( "Not found: %s" % (dbfile,) )
+    conn = sqlite3.connect( dbfile, timeout = TIMEOUT, isolation_level = None )
+    migrate( conn, verbose )
+    return conn
+
+#
+#
+def migrate( conn, verbose = False ) :
+    if conn.execute( "pragma user_version" ).fetchone()[0] >= SCHEMA_VERSION : return
+
+    conn.execute( "begin immediate" )
+    try :
+        if conn.execute( "pragma user_version" ).fetchone()[0] >= SCHEMA_VERSION :
+            conn.execute( "commit" )
+            return
+        if verbose : sys.stdout.write( "migrating BMSE ID list to schema version %d\n" % (SCHEMA_VERSION,) )
+
+        cols = [row[1] for row in conn.execute( "pragma table_info(ids)" )]
+        if not "seq" in cols :
+            conn.execute( "alter table ids add column seq integer" )
+        seqs = []
+        for (bmse,) in conn.execute( "select id from ids where seq is null" ) :
+            m = IDPAT.search( bmse )
+            if not m :
+                raise Exception( "ID %s does not match pattern" % (bmse,) )
+            seqs.append( (int( m.group( 1 ) ), bmse) )
+        conn.executemany( "update ids set seq=? where id=?", seqs )
+
+        conn.execute( "create unique index if not exists ids_seq on ids (seq)" )
+
+# old bmrbid() didn't check for existing InChI so there may be more than one ID for it:
+# those need sorting out by hand, meanwhile find_by_inchi() returns the first one
+#
+        try :
+            conn.execute( "create unique index if not exists ids_inchi on ids (inchi)" )
+        except sqlite3.IntegrityError :
+            dups = ["%s (%s)" % (row[0], row[1],) for row in conn.execute( "select group_concat(id,','),inchi " \
+                    + "from ids where inchi is not null group by inchi having count(*) > 1" )]
+            sys.stderr.write( "WARN: duplicate InChIs in BMSE ID list, InChI index is not unique: %s\n" \
+                    % ("; ".join( dups ),) )
+            conn.execute( "create index if not exists ids_inchi_nonunique on ids (inchi)" )
+
+# there's a few "incoming"s in the old list
+#
+        try :
+            conn.execute( "create unique index if not exists ids_dirname on ids (dirname)" )
+        except sqlite3.IntegrityError :
+            dups = [row[0] for row in conn.execute( "select dirname from ids group by dirname having count(*) > 1" )]
+            sys.stderr.write( "WARN: duplicate dirnames in BMSE ID list, dirname index is not unique: %s\n" \
+                    % (", ".join( dups ),) )
+            conn.execute( "create index if not exists ids_dirname_nonunique on ids (dirname)" )
+
+        conn.execute( "pragma user_version = %d" % (SCHEMA_VERSION,) )
+        conn.execute( "commit" )
+    except :
+        conn.execute( "rollback" )
+        raise
+
+#
+#
+def find_by_inchi( conn, inchi ) :
+    if inchi is None : return None
+    row = conn.execute( "select id from ids where inchi=? order by seq limit 1", (inchi,) ).fetchone()
+    if row is None : return None
+    return row[0]
+
+#
+#
+def find_by_dirname( conn, dirname ) :
+    if dirname is None : return None
+    row = conn.execute( "select id from ids where dirname=? order by seq limit 1", (dirname,) ).fetchone()
+    if row is None : return None
+    return row[0]
+
+# returns (ID, True if it's new). If there's already an ID for inchi (someone could've just made it),
+# that's the one.
+#
+def allocate( conn, dirname, inchi, verbose = False ) :
+    return allocate_many( conn, [(dirname, inchi)], verbose = verbose )[0]
+
+# same for a list of (dirname, inchi), all in one transaction: [(ID, True if it's new)]
+#
+def allocate_many( conn, entries, verbose = False ) :
+    conn.execute( "begin immediate" )
+    try :
+        rc = []
+        last = None
+        for (dirname, inchi) in entries :
+            bmse = find_by_inchi( conn, inchi )
+            if bmse is not None :
+                rc.append( (bmse, False) )
+                continue
+
+            if last is None :
+                last = conn.execute( "select max(seq) from ids" ).fetchone()[0]
+                if last is None :
+                    raise Exception( "Can't add BMRB ID: no IDs in the list" )
+            last += 1
+            bmse = IDFMT % (last,)
+            curs = conn.execute( "insert into ids (id,dirname,inchi,seq) values (?,?,?,?)",
+                    (bmse, dirname, inchi, last,) )
+            if curs.rowcount != 1 : raise Exception( "rowcount is %s" % (curs.rowcount,) )
+            if verbose : sys.stdout.write( "new BMRB ID %s for %s\n" % (bmse, dirname,) )
+            rc.append( (bmse, True) )
+        conn.execute( "commit" )
+        return rc
+    except :
+        conn.execute( "rollback" )
+        raise
+
+#
+#
+#
+if __name__ == '__main__':
+
+    conn = connect( sys.argv[1], verbose = True )
+    (n, last) = conn.execute( "select count(*), max(seq) from ids" ).fetchone()
+    sys.stdout.write( "%d IDs, last is %s\n" % (n, IDFMT % (last,),) )
+    conn.close()
+
+#
+#
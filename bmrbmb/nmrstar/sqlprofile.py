@@ -0,0 +1,132 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  sqlprofile.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# count the SQL StarMaker sends to the entry DB: per statement template, number of calls,
+# total and max time, rows affected. Templates are statements with literals replaced by "?",
+# so e.g. per-table deletes don't all end up in one line.
+#
+# Cheap enough to leave on: two time() calls and a dict update per statement, no output
+# until report().
+#
+
+from __future__ import absolute_import
+
+import sys
+import time
+import re
+import json
+import collections
+
+#
+#
+#
+class SQLProfiler( object ) :
+
+    LITERALS = re.compile( r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b" )
+
+    #
+    #
+    def __init__( self ) :
+        self._stats = collections.OrderedDict()
+
+    #
+    #
+    @property
+    def __json__( self ) :
+        return json.dumps( self._stats.values(), indent = 4 )
+
+    #
+    #
+    @classmethod
+    def template( cls, sql ) :
+        return " ".join( cls.LITERALS.sub( "?", sql ).split() )
+
+    #
+    #
+    @property
+    def stats( self ) :
+        return self._stats.values()
+
+    #
+    #
+    def clear( self ) :
+        self._stats.clear()
+
+    # add stats from another profiler, e.g. one in a child process
+    #
+    def merge( self, stats ) :
+        for s in stats :
+            if not s["sql"] in self._stats :
+                self._stats[s["sql"]] = dict( s )
+                continue
+            rec = self._stats[s["sql"]]
+            for i in ("count", "total", "rows") :
+                rec[i] += s[i]
+            if s["max"] > rec["max"] : rec["max"] = s["max"]
+
+    # rows < 0 is "don't know", e.g. for selects
+    #
+    def add( self, sql, seconds, rows = -1 ) :
+        key = self.template( sql )
+        if not key in self._stats :
+            self._stats[key] = { "sql" : key, "count" : 0, "total" : 0.0, "max" : 0.0, "rows" : 0 }
+        rec = self._stats[key]
+        rec["count"] += 1
+        rec["total"] += seconds
+        if seconds > rec["max"] : rec["max"] = seconds
+        if rows > 0 : rec["rows"] += rows
+
+    # run func( *args, **kwargs ) and add it as sql. Returns whatever func returns:
+    # the rows affected are taken from it if it's a cursor.
+    #
+    def run( self, sql, func, *args, **kwargs ) :
+        start = time.time()
+        rc = func( *args, **kwargs )
+        rows = getattr( rc, "rowcount", -1 )
+        if rows is None : rows = -1
+        self.add( sql, time.time() - start, rows )
+        return rc
+
+    # top N by total time
+    #
+    def report( self, out = sys.stderr, top = 20, width = 100 ) :
+        if len( self._stats ) < 1 : return
+        stats = sorted( self._stats.values(), key = lambda x : x["total"], reverse = True )
+        if top is not None : stats = stats[:top]
+        total = sum( s["total"] for s in self._stats.values() )
+        out.write( "%7s   %10s   %10s   %6s   %8s   %s\n" % ("count", "total, s", "max, s", "%", "rows", "statement") )
+        for s in stats :
+            sql = s["sql"]
+            if len( sql ) > width : sql = sql[:width - 3] + "..."
+            pct = 0.0
+            if total > 0 : pct = 100.0 * s["total"] / total
+            out.write( "%7d   %10.4f   %10.4f   %6.1f   %8d   %s\n" % (s["count"], s["total"], s["max"], pct,
+                    s["rows"], sql) )
+        out.write( "%d statement templates, %d statements, %.4f s\n" % (len( self._stats ),
+                sum( s["count"] for s in self._stats.values() ), total) )
+
+#
+#
+#
+if __name__ == '__main__':
+
+    import sqlite3
+    p = SQLProfiler()
+    conn = sqlite3.connect( ":memory:" )
+    p.run( "create table t (x int, y text)", conn.execute, "create table t (x int, y text)" )
+    sql = "insert into t (x, y) values (?, ?)"
+    p.run( sql, conn.executemany, sql, [(i, str( i )) for i in range( 10000 )] )
+    for i in range( 10 ) :
+        sql = "delete from t where x = %d" % (i,)
+        p.run( sql, conn.execute, sql )
+    p.report( sys.stdout )
+
+#
+#
@@ -20,6 +20,8 @@ import json
 import datetime
 import pprint
 import re
+import collections
+import sqlite3
 
 #
 # CHANGEME!
@@ -34,6 +36,93 @@ import starobj
 #sys.path.append( os.path.realpath( os.path.join( os.path.join( _HERE, ".." ), ".." ) ) )
 #import bmrbmb.nmrstar
 from . import DATASET_MASK, DATASET_DIR, PEAKFILE_DIR, SPECTRA_DIR
+
+################################################################################################
+# entry schema template, optional
+#
+def template_path( config ) :
+    if not config.has_option( "entry", "template" ) : return None
+    rc = config.get( "entry", "template" ).strip()
+    if rc == "" : return None
+    return rc
+
+################################################################################################
+# copy (empty) sqlite3 database: tables, indexes, etc.
+# sqlite backup API is only in python 3.7+, elsewhere replay the DDL in one script.
+# sqlite's own tables (sqlite_sequence, sqlite_stat1, ...) can't be created, sqlite makes them
+# as needed. Whatever is already in dst (starobj may have made some tables) is left as is.
+#
+def copy_schema( src, dst ) :
+    if hasattr( src, "backup" ) :
+        src.backup( dst )
+        return
+
+    have = set( row[0] for row in dst.execute( "select name from sqlite_master" ) )
+    ddl = []
+    for row in src.execute( "select name, sql from sqlite_master where sql is not null " \
+            + "and name not like 'sqlite\\_%' escape '\\' order by rowid" ) :
+        if row[0] in have : continue
+        ddl.append( "%s;" % (row[1],) )
+    dst.executescript( "\n".join( ddl ) )
+    dst.commit()
+
+################################################################################################
+# entry DB connection for starobj while StarMaker builds an entry in a transaction: commit() does
+# nothing, the rest goes to the real connection. With sqlite a commit ends the transaction and all
+# its savepoints, so starobj's commits wait for StarMaker._commit() (releasing the outermost
+# savepoint is the commit).
+#
+class HeldConnection( object ) :
+
+    #
+    #
+    def __init__( self, conn ) :
+        self.__dict__["_conn"] = conn
+        self.__dict__["commits"] = 0
+
+    #
+    #
+    def commit( self ) :
+        self.__dict__["commits"] += 1
+
+    #
+    #
+    def __getattr__( self, name ) :
+        return getattr( self.__dict__["_conn"], name )
+
+    #
+    #
+    def __setattr__( self, name, value ) :
+        setattr( self.__dict__["_conn"], name, value )
+
+    # put this in place of the connection in objs' attributes, and in dicts and lists they hold.
+    # Returns [(container, key)] for uninstall()
+    #
+    def install( self, objs ) :
+        conn = self.__dict__["_conn"]
+        rc = []
+        for obj in objs :
+            if not hasattr( obj, "__dict__" ) : continue
+            for (name, val) in vars( obj ).items() :
+                if val is conn :
+                    rc.append( (obj, name) )
+                elif isinstance( val, dict ) :
+                    rc.extend( (val, k) for (k, v) in val.items() if v is conn )
+                elif isinstance( val, list ) :
+                    rc.extend( (val, i) for (i, v) in enumerate( val ) if v is conn )
+        for (where, key) in rc :
+            if isinstance( where, (dict, list) ) : where[key] = self
+            else : setattr( where, key, self )
+        return rc
+
+    # put the real connection back
+    #
+    def uninstall( self, places ) :
+        conn = self.__dict__["_conn"]
+        for (where, key) in places :
+            if isinstance( where, (dict, list) ) : where[key] = conn
+            else : setattr( where, key, conn )
+
 #
 #
 #
@@ -46,7 +135,8 @@ class StarMaker( object ) :
     #
     #
     @classmethod
-    def from_nmrfam( cls, config, data, id = "temp123", verbose = False ) :
+    def from_nmrfam( cls, config, data, id = "temp123", transaction = True, timer = None, profiler = None,
+            verbose = False ) :
 
         wrp = starobj.DbWrapper( config = config, verbose = verbose )
         wrp.connect()
@@ -58,62 +148,142 @@ class StarMaker( object ) :
         star = starobj.NMRSTAREntry( wrp, verbose = verbose )
 
         rc = cls( stardict = sd, entrydb = star, entrydata = data, entryid = id,
-                verbose = verbose )
-        rc._create_tables()
+                timer = timer, profiler = profiler, verbose = verbose )
+        rc._create_tables( template = template_path( config ) )
+        rc.build( transaction = transaction )
+
+        return rc
+
+    ################################################################################################
+    #
+    def __init__( self, stardict, entrydb, entrydata, entryid, molname = None, timer = None,
+            profiler = None, verbose = False ) :
+        self._dict = stardict
+        self._star = entrydb
+        self._json = entrydata
+        self._id = entryid
+        self._verbose = bool( verbose )
+
+# entry DB statement stats, profiler is a bmrbmb.nmrstar.sqlprofile.SQLProfiler. See _sql()
+#
+        self._profiler = profiler
+
+# time every saveframe builder, timer is a bmrbmb.stopwatch.Stopwatch
+#
+        if timer is not None :
+            for name in [n for n in dir( self ) if n.startswith( "_make_" )] :
+                setattr( self, name, timer.wrap( getattr( self, name ), "StarMaker.%s" % (name,) ) )
+
+# category index, see _index_tables()
+#
+        self._tables = {}
+        self._solutes = []
+        self._index_tables()
+
+# loop rows waiting to be written, see _add_row()
+#
+        self._rows = collections.OrderedDict()
+        self._conn = None
+
+# open savepoints, None if not in a transaction. See _begin()
+#
+        self._savepoints = None
+        self._isolation = None
+        self._held = None
+
+# category -> framecode -> local ID of saveframes made so far, see _insert_saveframe()
+# and assigned chem shift list framecode -> its chem shift reference label
+#
+        self._sfids = {}
+        self._shift_refs = {}
+
+        self._set_title( molname )
+
+# FIXME! this is also in entrydir.py, should be refactored
+#  (however here we always want unix path separator)
+#
+#        self._setid = setid
+#        self._setname = "set%02d"  % (self._setid,)
+#        self._datadir = "nmr/%s" % (self._setname,)
+#        self._peakdir = "%s/transitions" % (self._datadir,)
+#        self._specdir = "%s/spectra" % (self._datadir,)
+
+    ################################################################################################
+    # make all saveframes.
+    # In transactional mode the entry is built in one transaction with a savepoint around each
+    # saveframe category, and committed only after the sanity check. On error everything is
+    # rolled back: the tables are still there and empty, ready for the next entry.
+    #
+    def build( self, transaction = True ) :
 
 # hardcoded
 # used by _make_entry_info() and _make_chem_comp()
 # FIXME oughta run enrtydir() first abd make sure these actually exist...
 #
-        files = { "MOL" : "%s.mol" % (rc._id,), "PNG" : "%s.png" % (rc._id,),
-            "SVG" : "%s.svg" % (rc._id,), "SVG_N" : "%s_nom.svg" % (rc._id,),
-            "SDF" : "%s.sdf" % (rc._id,) }
+        files = { "MOL" : "%s.mol" % (self._id,), "PNG" : "%s.png" % (self._id,),
+            "SVG" : "%s.svg" % (self._id,), "SVG_N" : "%s_nom.svg" % (self._id,),
+            "SDF" : "%s.sdf" % (self._id,) }
+
+        if transaction : self._begin()
+        try :
 
 # there's only one entry information
 #
-        tables = rc._get_tables( "entry_information" )
-        if tables is None : raise Exception( "no entry information" )
-        rc._make_entry_info( table = tables[0], files = files )
+            self._savepoint( "entry_information" )
+            tables = self._get_tables( "entry_information" )
+            if tables is None : raise Exception( "no entry information" )
+            self._make_entry_info( table = tables[0], files = files )
+            self._release( "entry_information" )
 
 # we want entry citation to come 1st in the star file
 #
-        tables = rc._get_tables( "citations" )
-        if tables is None : raise Exception( "no citations" )
-        num = 2
-        for table in tables :
-            if table["class"] == "entry citation" :
-                rc._make_citation( table, citid = 1 )
-            else :
-                rc._make_citation( table, citid = num )
-                num += 1
+            self._savepoint( "citations" )
+            tables = self._get_tables( "citations" )
+            if tables is None : raise Exception( "no citations" )
+            num = 2
+            for table in tables :
+                if table["class"] == "entry citation" :
+                    self._make_citation( table, citid = 1 )
+                else :
+                    self._make_citation( table, citid = num )
+                    num += 1
+            self._release( "citations" )
 
 # NOTE that there is only one natural/experimental source saveframes,
 # in these entries there's only one row in their data tables and almost all values are 'na',
 # and only one entity too.
 # They shouldn't be mandatory in these entries in the 1st place but try telling Eldon...
 #
-        tables = rc._get_tables( "natural_source" )
-        if tables is None : raise Exception( "no natural source" )
-        rc._make_nat_src( tables[0] )
+            self._savepoint( "natural_source" )
+            tables = self._get_tables( "natural_source" )
+            if tables is None : raise Exception( "no natural source" )
+            self._make_nat_src( tables[0] )
+            self._release( "natural_source" )
 
-        tables = rc._get_tables( "experimental_source" )
-        if tables is None : raise Exception( "no experimental source" )
-        rc._make_expt_src( tables[0] )
+            self._savepoint( "experimental_source" )
+            tables = self._get_tables( "experimental_source" )
+            if tables is None : raise Exception( "no experimental source" )
+            self._make_expt_src( tables[0] )
+            self._release( "experimental_source" )
 
 # boilerplate saveframes
 #
-        tables = rc._get_tables( "software" )
-        if tables is None : raise Exception( "no software" )
-        num = 1
-        for table in tables :
-            rc._make_software( table, softid = num )
-            num += 1
+            self._savepoint( "software" )
+            tables = self._get_tables( "software" )
+            if tables is None : raise Exception( "no software" )
+            num = 1
+            for table in tables :
+                self._make_software( table, softid = num )
+                num += 1
+            self._release( "software" )
 
 #FIXME: there is only one now, may need to expand
 #
-        tables = rc._get_tables( "NMR_spectrometer" )
-        if tables is None : raise Exception( "no spectroemter" )
-        rc._make_spectrometer( tables[0] )
+            self._savepoint( "NMR_spectrometer" )
+            tables = self._get_tables( "NMR_spectrometer" )
+            if tables is None : raise Exception( "no spectroemter" )
+            self._make_spectrometer( tables[0] )
+            self._release( "NMR_spectrometer" )
 
 # assembly and entity are built from chem comp, we need to make that first
 # there is only one chem comp in these entries
@@ -121,99 +291,98 @@ class StarMaker( object ) :
 #   e.g. comp ids are "BMETxxxxxx" but for multiple ones it'll have to be BMETxxxxxx_01, *_02, ...
 #   image files need to be renamed (in entrydir.py), etc.
 #
-        tables = rc._get_tables( "chem_comp" )
-        if (tables is None) or (len( tables ) < 1) : raise Exception( "no chem comps" )
-        if len( tables ) > 1 :
-            raise NotImplementedError( "don't know how to make %d chem comps" % (len( tables ),) )
+            self._savepoint( "chem_comp" )
+            tables = self._get_tables( "chem_comp" )
+            if (tables is None) or (len( tables ) < 1) : raise Exception( "no chem comps" )
+            if len( tables ) > 1 :
+                raise NotImplementedError( "don't know how to make %d chem comps" % (len( tables ),) )
 
-        rc._make_chem_comp( tables[0], files = files )
-        rc._make_entity()
-        rc._make_assembly()
+            self._make_chem_comp( tables[0], files = files )
+            self._make_entity()
+            self._make_assembly()
+            self._release( "chem_comp" )
 
 # must come before experiments: experiments have sample & conditions names but not ids.
 #  want to create those ids first
 # sample
 #
-        tables = rc._get_tables( "sample" )
-        if tables is None : raise Exception( "no samples" )
-        i = 1
-        for table in tables :
-            rc._make_sample( table, sampleid = i, assemblyid = 1, entityid = 1 )
-            i += 1
+            self._savepoint( "sample" )
+            tables = self._get_tables( "sample" )
+            if tables is None : raise Exception( "no samples" )
+            i = 1
+            for table in tables :
+                self._make_sample( table, sampleid = i, assemblyid = 1, entityid = 1 )
+                i += 1
+            self._release( "sample" )
 
 # conditions
 #
-        tables = rc._get_tables( "sample_conditions" )
-        if tables is None : raise Exception( "no sample conditions" )
-        i = 1
-        for table in tables :
-            rc._make_sample_conditions( table, condsid = i )
-            i += 1
+            self._savepoint( "sample_conditions" )
+            tables = self._get_tables( "sample_conditions" )
+            if tables is None : raise Exception( "no sample conditions" )
+            i = 1
+            for table in tables :
+                self._make_sample_conditions( table, condsid = i )
+                i += 1
+            self._release( "sample_conditions" )
 
 # there can be only one
 # experiment_files are for many datasets, should contain "dataset_id"
 #  they need sample and conditions ids
 #
-        tables = rc._get_tables( "experiment_list" )
-        if tables is None : raise Exception( "no experiment list" )
-        rc._make_experiment_list( tables[0] )
+            self._savepoint( "experiment_list" )
+            tables = self._get_tables( "experiment_list" )
+            if tables is None : raise Exception( "no experiment list" )
+            self._make_experiment_list( tables[0] )
+            self._release( "experiment_list" )
 
 # there can be separate CSrefs for different CSs
 # like w/ experiments, CS have ref names but not ids
 #
-        tables = rc._get_tables( "chem_shift_reference" )
-        if tables is None : raise Exception( "no CS ref" )
-        i = 1
-        for table in tables :
-            rc._make_cs_reference( table, refid = i )
-            i += 1
+            self._savepoint( "chem_shift_reference" )
+            tables = self._get_tables( "chem_shift_reference" )
+            if tables is None : raise Exception( "no CS ref" )
+            i = 1
+            for table in tables :
+                self._make_cs_reference( table, refid = i )
+                i += 1
+            self._release( "chem_shift_reference" )
 
 # since CS is linked 1-1 to sample conditions & CSref, we may have to make two
 #
-        tables = rc._get_tables( "assigned_chemical_shifts" )
-        if tables is None : raise Exception( "no CS" )
-        i = 1
-        for table in tables :
-            rc._make_chemical_shifts( table, listid = i )
-            i += 1
+            self._savepoint( "assigned_chemical_shifts" )
+            tables = self._get_tables( "assigned_chemical_shifts" )
+            if tables is None : raise Exception( "no CS" )
+            i = 1
+            for table in tables :
+                self._make_chemical_shifts( table, listid = i )
+                i += 1
+            self._release( "assigned_chemical_shifts" )
 
 # there's always peaks
 #  be nice, sort them by experiment
 #
-        tables = rc._get_tables( "spectral_peak_list" )
-        if tables is None : raise Exception( "no peaks" )
-        num = 1
-        for table in sorted( tables, cmp = lambda x, y : cmp( int( x["experiment_id"] ), int( y["experiment_id"] ) ) ) :
-            rc._make_peak_list( table, localid = num )
-            num += 1
-
-        if not rc._is_sane() : raise Exception( "Failed sanity check" )
+            self._savepoint( "spectral_peak_list" )
+            tables = self._get_tables( "spectral_peak_list" )
+            if tables is None : raise Exception( "no peaks" )
+            num = 1
+            for table in sorted( tables, cmp = lambda x, y : cmp( int( x["experiment_id"] ), int( y["experiment_id"] ) ) ) :
+                self._make_peak_list( table, localid = num )
+                num += 1
+            self._release( "spectral_peak_list" )
 
-        return rc
+            if not self._is_sane() : raise Exception( "Failed sanity check" )
 
-    ################################################################################################
-    #
-    def __init__( self, stardict, entrydb, entrydata, entryid, molname = None, verbose = False ) :
-        self._dict = stardict
-        self._star = entrydb
-        self._json = entrydata
-        self._id = entryid
-        self._verbose = bool( verbose )
-        if molname is None :
-            self._title = None
-            self._get_title()
-        else :
-            self._title = str( molname ).strip()
-        if self._title is None : raise Exception( "no molecule name" )
+        except :
+            if not transaction : raise
+            (t, v, tb) = sys.exc_info()
+            try :
+                self._rollback()
+            except Exception, e :
+                sys.stderr.write( "WARN: %s\n" % (str( e ),) )
+            raise t, v, tb
 
-# FIXME! this is also in entrydir.py, should be refactored
-#  (however here we always want unix path separator)
-#
-#        self._setid = setid
-#        self._setname = "set%02d"  % (self._setid,)
-#        self._datadir = "nmr/%s" % (self._setname,)
-#        self._peakdir = "%s/transitions" % (self._datadir,)
-#        self._specdir = "%s/spectra" % (self._datadir,)
+        if transaction : self._commit()
 
     ################################################################################################
     #
@@ -228,42 +397,307 @@ class StarMaker( object ) :
                 err.write( "\n" )
 
     ################################################################################################
-    # title is mol_common_name of sample component of type solute
+    # start over with another entry in the same entry DB: tables are emptied, not re-created.
+    # Whatever was there is gone, so call to_star() on the previous entry first.
     #
-    def _get_title( self ) :
-        for i in self._json :
-            for j in i :
-                for k in j.keys() :
-                    if (k == "sample_component") and (isinstance( j[k], list )) :
-                        for l in j[k] :
-                            if l["type"] == "solute" :
-                                self._title = l["mol_common_name"]
-                                return
+    def reset( self, entrydata, entryid, molname = None ) :
+        if self._savepoints is not None :
+            raise Exception( "reset inside a transaction" )
+        self._rows.clear()
+        self._clear_tables()
+
+        self._json = entrydata
+        self._id = entryid
+        self._index_tables()
+        self._sfids.clear()
+        self._shift_refs.clear()
+        self._set_title( molname )
+
+    ################################################################################################
+    # delete all rows from all tables in the entry DB, keep the tables
+    #
+    def _clear_tables( self ) :
+        curs = self._cursor()
+        if not isinstance( self._conn, sqlite3.Connection ) :
+            curs.close()
+            raise NotImplementedError( "can only clear sqlite3 entry database" )
+
+        curs.execute( "select name from sqlite_master where type='table'" )
+        tables = [row[0] for row in curs if not row[0].startswith( "sqlite_" )]
+        for table in tables :
+            sql = 'delete from "%s"' % (table,)
+            self._sql( sql, curs.execute, sql )
+        curs.close()
+        self._conn.commit()
+        if self._verbose :
+            sys.stdout.write( "%d tables cleared\n" % (len( tables ),) )
 
     ################################################################################################
     # incoming data is the list of saveframe categories,
     #   which is a list of saverames,
     #     which is a dict of tables (value is a list) and free tags (value is a primitive type)
     #
-    def _get_tables( self, category ) :
-        rc = []
+    # walk it once: sf_category -> list of saveframes in input order,
+    # and solute sample components (for the title)
+    #
+    def _index_tables( self ) :
+        self._tables.clear()
+        del self._solutes[:]
         for i in self._json :
             for j in i :
-                for k in j.keys() :
-                    if k == "sf_category" :
-                        if j[k] == category :
-                            rc.append( j )
-                            break
-        if len( rc ) < 1 : return None
-        return rc
+                if "sf_category" in j :
+                    if not j["sf_category"] in self._tables :
+                        self._tables[j["sf_category"]] = []
+                    self._tables[j["sf_category"]].append( j )
+                if ("sample_component" in j) and (isinstance( j["sample_component"], list )) :
+                    for l in j["sample_component"] :
+                        if l["type"] == "solute" :
+                            self._solutes.append( l )
+
+    ################################################################################################
+    # title is mol_common_name of sample component of type solute
+    #
+    def _get_title( self ) :
+        if len( self._solutes ) > 0 :
+            self._title = self._solutes[0]["mol_common_name"]
+
+    # molname overrides the title from the data
+    #
+    def _set_title( self, molname = None ) :
+        if molname is None :
+            self._title = None
+            self._get_title()
+        else :
+            self._title = str( molname ).strip()
+        if self._title is None : raise Exception( "no molecule name" )
+
+    ################################################################################################
+    # saveframes of this category, or None
+    #
+    def _get_tables( self, category ) :
+        if not category in self._tables : return None
+        return self._tables[category]
 
     ################################################################################################
     # not all tables we need are in the input, so just create all and let the unparser sort them out
     #
-    def _create_tables( self ) :
+    # creating them takes thousands of DDL statements, so if there's a template path, copy the schema
+    # from a template DB made for this dictionary version instead. The template is made on first use
+    # and the version is in the file name: new dictionary, new template.
+    #
+    def _create_tables( self, template = None ) :
+        if template is not None :
+            self._cursor().close()
+            if not isinstance( self._conn, sqlite3.Connection ) :
+                sys.stderr.write( "WARN: entry DB is not sqlite3, ignoring template\n" )
+                template = None
+
+        if template is not None :
+            (base, ext) = os.path.splitext( template )
+            tmpl = "%s-%s%s" % (base, self._dict.version, ext)
+            if os.path.exists( tmpl ) :
+                if self._verbose :
+                    sys.stdout.write( "copying entry tables from %s\n" % (tmpl,) )
+                src = sqlite3.connect( tmpl )
+                try :
+                    copy_schema( src, self._conn )
+                finally :
+                    src.close()
+                return
+
         self._star.create_tables( dictionary = self._dict, db = self._star._db, use_types = True,
                 verbose = self._verbose )
 
+        if template is not None :
+            if self._verbose :
+                sys.stdout.write( "making template %s\n" % (tmpl,) )
+            tmp = "%s.%d" % (tmpl, os.getpid())
+            if os.path.exists( tmp ) : os.unlink( tmp )
+            dst = sqlite3.connect( tmp )
+            try :
+                copy_schema( self._conn, dst )
+            finally :
+                dst.close()
+            os.rename( tmp, tmpl )
+
+    ################################################################################################
+    # starobj has no executemany() so we go to the DB-API connection for bulk inserts.
+    # Any cursor knows its connection.
+    #
+    def _cursor( self ) :
+        if self._conn is None :
+            self._conn = self._star.query( "select 1", newcursor = True ).connection
+        return self._conn.cursor()
+
+    ################################################################################################
+    # row buffer: inserts are queued per statement (i.e. per table) and written with one
+    # executemany() each by _flush(). Builders flush at the end of each saveframe, and
+    # _execute() flushes before any update that reads the rows back.
+    #
+    # params is copied: callers reuse the same dict for every row.
+    #
+    def _add_row( self, sql, params = None ) :
+        if self._verbose :
+            sys.stdout.write( sql )
+            sys.stdout.write( "\n" )
+            if params is not None :
+                pprint.pprint( params )
+        if not sql in self._rows :
+            self._rows[sql] = []
+        if params is None :
+            self._rows[sql].append( {} )
+        else :
+            self._rows[sql].append( dict( params ) )
+
+    #
+    #
+    def _flush( self, commit = True ) :
+        if len( self._rows ) > 0 :
+            curs = self._cursor()
+            for (sql, rows) in self._rows.items() :
+                self._sql( sql, curs.executemany, sql, rows )
+                if self._verbose :
+                    sys.stdout.write( "%d rows inserted\n" % (len( rows ),) )
+            curs.close()
+            self._rows.clear()
+        if commit and (self._savepoints is None) :
+            if self._conn is None : self._cursor().close()
+            self._conn.commit()
+
+    # update/insert-select: write out pending rows first, commit is left to _flush()
+    #
+    def _execute( self, sql, params = None ) :
+        self._flush( commit = False )
+        return self._sql( sql, self._star.execute, sql, params = params, commit = False )
+
+    # select
+    #
+    def _query( self, sql, newcursor = False ) :
+        return self._sql( sql, self._star.query, sql, newcursor = newcursor )
+
+    # everything that goes to entry DB goes through here
+    #
+    def _sql( self, sql, func, *args, **kwargs ) :
+        if self._profiler is None : return func( *args, **kwargs )
+        return self._profiler.run( sql, func, *args, **kwargs )
+
+    ################################################################################################
+    # saveframe registry: child rows get their foreign keys from here at insert time
+    # instead of update ... set "X_ID"=(select "ID" from ... where "Sf_framecode"=...) passes.
+    #
+    def _insert_saveframe( self, name, category, localid ) :
+        sfid = self._sql( "-- starobj insert_saveframe( %s )" % (category,), self._star.insert_saveframe,
+                name = name, entryid = self._id, category = category )
+        if not category in self._sfids :
+            self._sfids[category] = {}
+        self._sfids[category][name] = localid
+        return sfid
+
+    # None if there's no such saveframe, same as the subquery
+    #
+    def _label_id( self, category, label ) :
+        if not category in self._sfids : return None
+        if not label in self._sfids[category] : return None
+        return self._sfids[category][label]
+
+    ################################################################################################
+    # transactions: the outermost savepoint is the entry transaction, releasing it commits.
+    # Nothing may commit the entry DB in between: _flush() doesn't while a transaction is open.
+    #
+    # python 2 sqlite3 module commits the open transaction before any statement that isn't
+    # DML, savepoints included, so we turn its transaction handling off for the duration.
+    #
+    def _savepoint_sql( self, sql ) :
+        if self._verbose :
+            sys.stdout.write( sql )
+            sys.stdout.write( "\n" )
+        curs = self._cursor()
+        self._sql( sql, curs.execute, sql )
+        curs.close()
+
+    #
+    #
+    def _begin( self ) :
+        if self._savepoints is not None :
+            raise Exception( "already in a transaction" )
+        self._cursor().close()
+        if hasattr( self._conn, "isolation_level" ) :
+            self._conn.commit()
+            self._isolation = self._conn.isolation_level
+            self._conn.isolation_level = None
+
+# starobj commits after its own statements (insert_saveframe() does). Its commit() is put off
+# until we're done, see HeldConnection. If we can't find its connection, there's no transaction.
+#
+        held = HeldConnection( self._conn )
+        places = held.install( [self._star, getattr( self._star, "_db", None )] )
+        if len( places ) < 1 :
+            sys.stderr.write( "WARN: can't find starobj's entry DB connection, building without transaction\n" )
+            if hasattr( self._conn, "isolation_level" ) :
+                self._conn.isolation_level = self._isolation
+            return
+        self._held = (held, places)
+        self._savepoints = []
+        self._savepoint( "entry" )
+
+    # no-ops outside of a transaction
+    #
+    def _savepoint( self, name ) :
+        if self._savepoints is None : return
+        self._savepoint_sql( 'savepoint "%s"' % (name,) )
+        self._savepoints.append( name )
+
+    # release named savepoint and any still open inside it
+    #
+    def _release( self, name ) :
+        if self._savepoints is None : return
+        if not name in self._savepoints :
+            raise Exception( "no savepoint %s" % (name,) )
+        self._flush( commit = False )
+        self._savepoint_sql( 'release savepoint "%s"' % (name,) )
+        del self._savepoints[self._savepoints.index( name ):]
+
+    #
+    #
+    def _commit( self ) :
+        if self._savepoints is None : return
+        self._release( "entry" )
+        self._end()
+
+    # unwind innermost first: the saveframe that failed, then everything before it
+    #
+    def _rollback( self ) :
+        if self._savepoints is None : return
+        self._rows.clear()
+        self._sfids.clear()
+        self._shift_refs.clear()
+
+# "entry" is the first savepoint and the last one released: if rolling back to it works, the entry DB
+# is as it was before _begin(). If anything committed in the middle, it's gone and this fails.
+#
+        try :
+            while len( self._savepoints ) > 0 :
+                name = self._savepoints.pop()
+                self._savepoint_sql( 'rollback to savepoint "%s"' % (name,) )
+                self._savepoint_sql( 'release savepoint "%s"' % (name,) )
+        except sqlite3.Error, e :
+            raise Exception( "rollback failed, entry DB may have part of the entry: %s" % (str( e ),) )
+        finally :
+            self._end()
+
+    #
+    #
+    def _end( self ) :
+        self._savepoints = None
+        if self._held is not None :
+            (held, places) = self._held
+            held.uninstall( places )
+            if self._verbose :
+                sys.stdout.write( "%d starobj commits held for the transaction\n" % (held.commits,) )
+            self._held = None
+        if hasattr( self._conn, "isolation_level" ) :
+            self._conn.isolation_level = self._isolation
+
     ################################################################################################
     #
     #
@@ -273,8 +707,8 @@ class StarMaker( object ) :
         if not "authors" in table.keys() : raise Exception( "no entry authors" )
         if files is not None: assert isinstance( files, dict )
 
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "entry_information" )
+        sfid = self._insert_saveframe( name = table["name"], category = "entry_information",
+                localid = self._id )
 
         today = datetime.date.today().isoformat()
         cols = { "Sf_category"                 : "'entry_information'",
@@ -306,13 +740,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Entry" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
 
 # entry authors
 #FIXME: there's never ORCID or Family_title in this list. As of 20180911
@@ -338,13 +766,7 @@ class StarMaker( object ) :
                 params["mini"] = author["middle_initials"]
             else :
                 params["mini"] = None
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
 # experimental methods
 #  we can live without them. probbly
@@ -364,13 +786,7 @@ class StarMaker( object ) :
                 params["id"] = meth["id"]
                 params["met"] = meth["type"]
                 params["sub"] = meth["subtype"]
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 # entry source -- there's only one
 #
@@ -393,13 +809,7 @@ class StarMaker( object ) :
                 params["prj"] = src["project"]
                 params["org"] = src["orgname_full"]
                 params["oa"] = src["orgname_abbrev"]
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 # entry files
 #
@@ -430,13 +840,9 @@ class StarMaker( object ) :
                         params["kind"] = "molecule image"
                     elif f in ("MOL","SDF") :
                         params["kind"] = "molecule structure file"
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
+
+        self._flush()
 
 # Data_set, Datum, and Release are inserted by release script
 #
@@ -449,8 +855,8 @@ class StarMaker( object ) :
         assert isinstance( table, dict )
         if not "authors" in table.keys() : raise Exception( "no citation authors (%s)" % (params["title"],) )
 
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "citations" )
+        sfid = self._insert_saveframe( name = table["name"], category = "citations",
+                localid = citid )
 
         cols = { "Sf_category"        : "'citations'",
                  "Sf_framecode"       : ":name",
@@ -517,13 +923,7 @@ class StarMaker( object ) :
         else :
             raise Exception( "don't know how to make citation of type %s" % (table["type"],) )
 
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
 
 # authors: like entry authors except Larry has family title
 #
@@ -554,13 +954,9 @@ class StarMaker( object ) :
                 params["moe"] = author["family_title"]
             else :
                 params["moe"] = None
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     #
@@ -571,8 +967,8 @@ class StarMaker( object ) :
         if not "natural_source" in table.keys() : raise Exception( "no natural_source table" )
 
         lclid = 1
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "natural_source" )
+        sfid = self._insert_saveframe( name = table["name"], category = "natural_source",
+                localid = lclid )
 
         cols = { "Sf_category"  : "'natural_source'",
                  "Sf_framecode" : ":name",
@@ -583,12 +979,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Entity_natural_src_list" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, params = { "name" : table["name"] }, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, { "name" : table["name"] } )
 
 # TODO: post-cook: insert entity name for entity by id. it's always 1/entity_1 but why not DIR.
 #
@@ -620,13 +1011,9 @@ class StarMaker( object ) :
             params["type"] = row["type"]
             params["id"] = cnt
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     # as above only with diffierent names
@@ -637,8 +1024,8 @@ class StarMaker( object ) :
         if not "experimental_source" in table.keys() : raise Exception( "no experimental_source table" )
 
         lclid = 1
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "experimental_source" )
+        sfid = self._insert_saveframe( name = table["name"], category = "experimental_source",
+                localid = lclid )
 
         cols = { "Sf_category"  : "'experimental_source'",
                  "Sf_framecode" : ":name",
@@ -649,12 +1036,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Entity_experimental_src_list" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, params = { "name" : table["name"] }, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, { "name" : table["name"] } )
 
 # TODO: post-cook: insert entity name for entity by id. it's always 1/entity_1 but why not DIR.
 #
@@ -679,13 +1061,9 @@ class StarMaker( object ) :
             params["meth"] = row["production_method"]
             params["id"] = cnt
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     # software
@@ -699,7 +1077,8 @@ class StarMaker( object ) :
         else :
             sfname = table["name"]
 
-        sfid = self._star.insert_saveframe( name = sfname, entryid = self._id, category = "software" )
+        sfid = self._insert_saveframe( name = sfname, category = "software",
+                localid = softid )
 
         cols = { "Sf_category"  : "'software'",
                  "Sf_framecode" : ":sfname",
@@ -717,13 +1096,7 @@ class StarMaker( object ) :
             params["vers"] = table["software_version"]
         else :
             params["vers"] = None
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
 
 # vendor
 #  there's usually only one
@@ -747,13 +1120,7 @@ class StarMaker( object ) :
                 else :
                     params["url"] = None
 
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 # task
 #  there's usually many
@@ -772,13 +1139,7 @@ class StarMaker( object ) :
                 params.clear()
                 params["name"] = row["task"]
 
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 # citation
 #  need sfid & label
@@ -794,33 +1155,22 @@ class StarMaker( object ) :
             valstr = ",".join( str( v ) for v in cols.values() )
             sql = 'insert into "Software_citation" ("%s") values (%s)' % (colstr,valstr,)
 
-            qry = 'select "ID" from "Citation" where "Sf_framecode"=:name'
             for row in table["citation"] :
-                citid = None
-                rs = self._star.query( qry, params = { "name" : row["name"] } )
-
-# there can be only one
-#
-                for r in rs : citid = r[0]
-
+                citid = self._label_id( "citations", row["name"] )
                 if citid is not None :
                     params.clear()
                     params["citid"] = citid
                     params["citlab"] = row["name"]
-                    if self._verbose :
-                        sys.stdout.write( sql )
-                        sys.stdout.write( "\n" )
-                        pprint.pprint( params )
-                    rc = self._star.execute( sql, params = params, commit = True )
-                    if self._verbose :
-                        sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                    self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     #
     def _make_spectrometer( self, table, localid = 1 ) :
         assert isinstance( table, dict )
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "NMR_spectrometer" )
+        sfid = self._insert_saveframe( name = table["name"], category = "NMR_spectrometer",
+                localid = localid )
         cols = { "Sf_category"    : "'NMR_spectrometer'",
                  "Sf_framecode"   : "'%s'" % (table["name"],),
                  "Sf_ID"          : sfid,
@@ -839,13 +1189,9 @@ class StarMaker( object ) :
             params["dtl"] = table["details"]
         else :
             params["dtl"] = None
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     #
@@ -863,8 +1209,8 @@ class StarMaker( object ) :
 
         compid = "BMET%s" % (m.group( 1 ),)
         saveframe_name = re.sub( r"_+", "_", re.sub( r"[^A-Za-z0-9_]", "_", table["name"] ) )
-        sfid = self._star.insert_saveframe( name = saveframe_name, entryid = self._id,
-                category = "chem_comp" )
+        sfid = self._insert_saveframe( name = saveframe_name, category = "chem_comp",
+                localid = compid )
 
         molformat = "MOL"
         molfile = files[molformat]
@@ -914,13 +1260,7 @@ class StarMaker( object ) :
         sql = 'insert into "Chem_comp" ("%s") values (%s)' % (colstr,valstr,)
 
         params = { "sfname" : saveframe_name, "molname" : self._title, "formula" : table["formula"] }
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
 
 # synonyms
 #
@@ -945,13 +1285,7 @@ class StarMaker( object ) :
                 else :
                     params["name"] = row
                     params["type"] = "name"
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 # circa 2017 entries have alatis inchi string in the index but not in sdf
 # from mid-2018 on alatis adds trhe <alatis_inchi{ tag to sdf,
@@ -993,13 +1327,7 @@ class StarMaker( object ) :
                     params["vers"] = row["version"]
                 else :
                     params["vers"] = "na"
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 # identifiers: exactly like above
 # except for the exceptions
@@ -1046,13 +1374,7 @@ class StarMaker( object ) :
                     params["vers"] = row["version"]
                 else :
                     params["vers"] = "na"
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 
 # atoms
@@ -1084,13 +1406,7 @@ class StarMaker( object ) :
             else :
                 params["arom"] = "no"
             params["num"] = row["ordinal"]
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
 # bonds
 #
@@ -1123,13 +1439,7 @@ class StarMaker( object ) :
             if row["arom"] == "yes" :
                 aromatic = True
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
 # aromatic fix
 #
@@ -1140,7 +1450,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
+        rc = self._execute( sql )
         if self._verbose :
             sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
 
@@ -1162,13 +1472,7 @@ class StarMaker( object ) :
                 params["atm"] = row["atom_id"]
                 params["alt"] = row["atom_name"]
                 params["sys"] = row["naming_system"]
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 # DB links
 #
@@ -1190,13 +1494,9 @@ class StarMaker( object ) :
                 params["db"] = row["db_code"]
                 params["acc"] = row["acc_code"]
                 params["actype"] = row["acc_type"]
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     # entity is copied from chem comp
@@ -1206,14 +1506,15 @@ class StarMaker( object ) :
 
         sfname = "entity_%d" % (entityid,)
 
-        sfid = self._star.insert_saveframe( name = sfname, entryid = self._id, category = "entity" )
+        sfid = self._insert_saveframe( name = sfname, category = "entity",
+                localid = entityid )
 
         params = {}
 
 # there's only one chem comp
 #
         sql = 'select "Name","ID","Sf_framecode","Paramagnetic","Formula_weight" from "Chem_comp"'
-        rc = self._star.query( sql )
+        rc = self._query( sql )
         for row in rc :
             params["compname"] = row[0]
             params["compid"] = row[1]
@@ -1248,13 +1549,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Entity" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
 
 #
 #
@@ -1273,13 +1568,9 @@ class StarMaker( object ) :
 # there's only one
 #
 
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     # assembly is copied from chem comp & entity
@@ -1290,14 +1581,15 @@ class StarMaker( object ) :
 
         sfname = "assembly_%d" % (assemblyid,)
 
-        sfid = self._star.insert_saveframe( name = sfname, entryid = self._id, category = "assembly" )
+        sfid = self._insert_saveframe( name = sfname, category = "assembly",
+                localid = assemblyid )
 
         params = {}
 
 # there's only one entity
 #
         sql = 'select "Name","ID","Sf_framecode","Paramagnetic","Thiol_state" from "Entity"'
-        rs = self._star.query( sql )
+        rs = self._query( sql )
         for row in rs :
             params["compname"] = row[0]
             params["eid"] = row[1]
@@ -1318,13 +1610,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Assembly" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
 
 #
 #
@@ -1347,13 +1633,7 @@ class StarMaker( object ) :
 # there's only one
 #
 
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-            pprint.pprint( params )
-        rc = self._star.execute( sql, params = params, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, params )
 
 # atoms are copied from chem comp
 #  comp_index_id = seq_num is always 1, hard-coded instead of doing a join on comp_index table
@@ -1379,7 +1659,7 @@ class StarMaker( object ) :
 #
         atoms = set()
         qry = 'select "Comp_ID","Atom_ID","Type_symbol","PDBX_ordinal" from "Chem_comp_atom" order by "PDBX_ordinal"'
-        rs = self._star.query( qry, newcursor = True )
+        rs = self._query( qry, newcursor = True )
         for row in rs :
             if row[1] in atoms : continue
             else : atoms.add( row[1] )
@@ -1390,13 +1670,9 @@ class StarMaker( object ) :
             params["nuc"] = row[2]
             params["num"] = row[3]
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     #
@@ -1404,9 +1680,9 @@ class StarMaker( object ) :
         assert isinstance( table, dict )
         if not "experiment" in table.keys() : raise Exception( "no experiments" )
         if not "experiment_file" in table.keys() : raise Exception( "no experiment files" )
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "experiment_list" )
         localid = 1
+        sfid = self._insert_saveframe( name = table["name"], category = "experiment_list",
+                localid = localid )
         cols = { "Sf_category"    : "'experiment_list'",
                  "Sf_framecode"   : "'%s'" % (table["name"],),
                  "Sf_ID"          : sfid,
@@ -1416,12 +1692,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Experiment_list" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql )
 
 # experiments
 #
@@ -1429,8 +1700,11 @@ class StarMaker( object ) :
                  "Experiment_list_ID"          : localid,
                  "Entry_ID"                    : "'%s'" % (self._id,),
                  "Sample_state"                : "'isotropic'",
+                 "NMR_spectrometer_ID"         : ":spect_id",
                  "NMR_spectrometer_label"      : ":spect_lbl",
+                 "Sample_ID"                   : ":smpl_id",
                  "Sample_label"                : ":smpl_lbl",
+                 "Sample_condition_list_ID"    : ":cond_id",
                  "Sample_condition_list_label" : ":cond_lbl",
                  "ID"                          : ":id",
                  "Name"                        : ":name",
@@ -1446,43 +1720,13 @@ class StarMaker( object ) :
             params["id"] = row["id"]
             params["flg"] = row["raw_data_flag"]
             params["spect_lbl"] = row["nmr_spectrometer_label"]
+            params["spect_id"] = self._label_id( "NMR_spectrometer", row["nmr_spectrometer_label"] )
             params["smpl_lbl"] = row["sample_label"]
+            params["smpl_id"] = self._label_id( "sample", row["sample_label"] )
             params["cond_lbl"] = row["sample_condition_list_label"]
+            params["cond_id"] = self._label_id( "sample_conditions", row["sample_condition_list_label"] )
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
-
-        sql = 'update "Experiment" set "Sample_ID"=' \
-            + '(select "ID" from "Sample" where "Sf_framecode"="Experiment"."Sample_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
-
-        sql = 'update "Experiment" set "Sample_condition_list_ID"=(select "ID" from ' \
-            + '"Sample_condition_list" where "Sf_framecode"="Experiment"."Sample_condition_list_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
-
-        sql = 'update "Experiment" set "NMR_spectrometer_ID"=(select "ID" from ' \
-            + '"NMR_spectrometer" where "Sf_framecode"="Experiment"."NMR_spectrometer_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
 # files
 #
@@ -1545,13 +1789,9 @@ class StarMaker( object ) :
                 if not found :
                             raise Exception( "Can't fiind experiment for %s" % (row["name"],) )
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     #
@@ -1570,8 +1810,8 @@ class StarMaker( object ) :
         if "name" in table.keys() : name = table["name"]
         else :  name = table["sf_framecode"]
 
-        sfid = self._star.insert_saveframe( name = name, entryid = self._id,
-                category = "sample" )
+        sfid = self._insert_saveframe( name = name, category = "sample",
+                localid = lclid )
 
         cols = { "Sf_category"  : "'sample'",
                  "Sf_framecode" : ":name",
@@ -1583,12 +1823,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Sample" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, params = { "name" : name }, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, { "name" : name } )
 
 # components
 # POST-COOK: resolve entity and assembly labels from IDs
@@ -1634,13 +1869,9 @@ class StarMaker( object ) :
                 params["vname"] = None
                 params["isolab"] = None
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
+
+        self._flush()
 
         return (vendor, vcode)
 
@@ -1661,8 +1892,8 @@ class StarMaker( object ) :
         if "name" in table.keys() : name = table["name"]
         else :  name = table["sf_framecode"]
 
-        sfid = self._star.insert_saveframe( name = name, entryid = self._id,
-                category = "sample_conditions" )
+        sfid = self._insert_saveframe( name = name, category = "sample_conditions",
+                localid = lclid )
 
         cols = { "Sf_category"  : "'sample_conditions'",
                  "Sf_framecode" : ":name",
@@ -1673,12 +1904,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Sample_condition_list" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, params = { "name" : name }, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql, { "name" : name } )
 
 # data
 #
@@ -1703,13 +1929,9 @@ class StarMaker( object ) :
             else :
                 params["error"] = None
             params["units"] = row["val_units"]
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
+
+        self._flush()
 
 
     ################################################################################################
@@ -1723,8 +1945,8 @@ class StarMaker( object ) :
             localid = 1
 
         if not "chem_shift_ref" in table.keys() : raise Exception( "no CS reference loop" )
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "chem_shift_reference" )
+        sfid = self._insert_saveframe( name = table["name"], category = "chem_shift_reference",
+                localid = localid )
         cols = { "Sf_category"  : "'chem_shift_reference'",
                  "Sf_framecode" : "'%s'" % (table["name"],),
                  "Sf_ID"        : sfid,
@@ -1734,12 +1956,7 @@ class StarMaker( object ) :
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Chem_shift_reference" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+        self._add_row( sql )
 
         cols = { "Sf_ID"                   : sfid,
                  "Chem_shift_reference_ID" : localid,
@@ -1770,13 +1987,9 @@ class StarMaker( object ) :
             params["type"] = row["type"]
             params["rat"] = row["ratio"]
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
+
+        self._flush()
 
     ################################################################################################
     #
@@ -1793,51 +2006,35 @@ class StarMaker( object ) :
         if not "chem_shift_reference_label" in table.keys() : raise Exception( "no CS ref label" )
         if not "sample_condition_list_label" in table.keys() : raise Exception( "no conds label" )
 
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "assigned_chemical_shifts" )
+        sfid = self._insert_saveframe( name = table["name"], category = "assigned_chemical_shifts",
+                localid = localid )
         cols = { "Sf_category"              : "'assigned_chemical_shifts'",
                  "Sf_framecode"             : "'%s'" % (table["name"],),
                  "Sf_ID"                    : sfid,
                  "ID"                       : localid,
                  "Entry_ID"                 : "'%s'" % (self._id,),
+                 "Chem_shift_reference_ID"     : ":refid",
                  "Chem_shift_reference_label"  : "'%s'" % (table["chem_shift_reference_label"],),
+                 "Sample_condition_list_ID"    : ":condid",
                  "Sample_condition_list_label" : "'%s'" % (table["sample_condition_list_label"],) }
 
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Assigned_chem_shift_list" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
-
-        sql = 'update "Assigned_chem_shift_list" set "Sample_condition_list_ID"=' \
-            + '(select "ID" from "Sample_condition_list" where "Sf_framecode"=' \
-            + '"Assigned_chem_shift_list"."Sample_condition_list_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
+        params = { "refid" : self._label_id( "chem_shift_reference", table["chem_shift_reference_label"] ),
+                "condid" : self._label_id( "sample_conditions", table["sample_condition_list_label"] ) }
+        self._add_row( sql, params )
 
-        sql = 'update "Assigned_chem_shift_list" set "Chem_shift_reference_ID"=' \
-            + '(select "ID" from "Chem_shift_reference" where "Sf_framecode"=' \
-            + '"Assigned_chem_shift_list"."Chem_shift_reference_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
+# peak lists need this
+#
+        self._shift_refs[table["name"]] = table["chem_shift_reference_label"]
 
 # expts
 #
         cols = { "Sf_ID"                       : sfid,
                  "Assigned_chem_shift_list_ID" : localid,
                  "Entry_ID"                    : "'%s'" % (self._id,),
+                 "Sample_ID"                   : ":smplid",
                  "Sample_label"                : ":sampleid",
                  "Experiment_ID"               : ":expid",
                  "Experiment_name"             : ":expname" }
@@ -1853,23 +2050,9 @@ class StarMaker( object ) :
             params["expname"] = row["experiment_name"]
             if "sample_label" in row.keys() :
                 params["sampleid"] = row["sample_label"]
+                params["smplid"] = self._label_id( "sample", row["sample_label"] )
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
-
-        sql = 'update "Chem_shift_experiment" set "Sample_ID"=' \
-            + '(select "ID" from "Sample" where "Sf_framecode"="Chem_shift_experiment"."Sample_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
 # shifts
 #  assume the input is sorted already.
@@ -1906,13 +2089,7 @@ class StarMaker( object ) :
             else :
                 params["rid"] = None
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
             num += 1
 
@@ -1920,7 +2097,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
+        rc = self._execute( sql )
         if self._verbose :
             sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
 
@@ -1939,7 +2116,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
+        rc = self._execute( sql )
         if self._verbose :
             sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
 
@@ -1951,7 +2128,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
+        rc = self._execute( sql )
         if self._verbose :
             sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
 
@@ -1960,7 +2137,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
+        rc = self._execute( sql )
         if self._verbose :
             sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
 
@@ -1969,7 +2146,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
+        rc = self._execute( sql )
         if self._verbose :
             sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
 
@@ -1992,13 +2169,7 @@ class StarMaker( object ) :
                 params["set"] = row["set_id"]
                 params["shift"] = shift_numbers[int( row["shift_id"] )]
 
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
             sql = 'update "Atom_chem_shift" set "Ambiguity_set_ID"=' \
                 + '(select "Ambiguous_shift_set_ID" from "Ambiguous_atom_chem_shift" ' \
@@ -2009,7 +2180,7 @@ class StarMaker( object ) :
             if self._verbose :
                 sys.stdout.write( sql )
                 sys.stdout.write( "\n" )
-            rc = self._star.execute( sql, commit = True )
+            rc = self._execute( sql )
             if self._verbose :
                 sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
 
@@ -2024,10 +2195,12 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
+        rc = self._execute( sql )
         if self._verbose :
             sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
 
+        self._flush()
+
     ################################################################################################
     #
 
@@ -2043,79 +2216,42 @@ class StarMaker( object ) :
         if not "spectral_transition_char" in table.keys() : raise Exception( "no transition shifts" )
         if not "spectral_transition_general_char" in table.keys() : raise Exception( "no transition intensities" )
 
-        sfid = self._star.insert_saveframe( name = table["name"], entryid = self._id,
-                category = "spectral_peak_list" )
+        sfid = self._insert_saveframe( name = table["name"], category = "spectral_peak_list",
+                localid = localid )
         cols = { "Sf_category"                   : "'spectral_peak_list'",
                  "Sf_framecode"                  : "'%s'" % (table["name"],),
                  "Sf_ID"                         : sfid,
                  "ID"                            : localid,
                  "Entry_ID"                      : "'%s'" % (self._id,),
+                 "Sample_ID"                        : ":smplid",
                  "Sample_label"                     : "'%s'" % (table["sample_label"],),
+                 "Sample_condition_list_ID"         : ":condid",
                  "Sample_condition_list_label"      : "'%s'" % (table["sample_condition_list_label"],),
+                 "Assigned_chem_shift_list_ID"      : ":csid",
                  "Assigned_chem_shift_list_label"   : "'%s'" % (table["assigned_chem_shift_list_label"],),
+                 "Chem_shift_reference_ID"          : ":refid",
+                 "Chem_shift_reference_label"       : ":reflbl",
                  "Number_of_spectral_dimensions" : "'%s'" % (table["number_of_spectral_dimensions"],),
                  "Experiment_ID"                 : "'%s'" % (table["experiment_id"],),
                  "Experiment_name"               : "'%s'" % (table["experiment_name"],),
                  "Details"                       : ":dtl" }
 
+# CS reference is whatever the assigned chem shift list has
+#
+        reflabel = None
+        if table["assigned_chem_shift_list_label"] in self._shift_refs :
+            reflabel = self._shift_refs[table["assigned_chem_shift_list_label"]]
+
         colstr = '","'.join( str( k ) for k in cols.keys() )
         valstr = ",".join( str( v ) for v in cols.values() )
         sql = 'insert into "Spectral_peak_list" ("%s") values (%s)' % (colstr,valstr,)
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, params = { "dtl" : table["details"] }, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
-
-        sql = 'update "Spectral_peak_list" set "Sample_ID"=' \
-            + '(select "ID" from "Sample" where "Sf_framecode"="Spectral_peak_list"."Sample_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
-
-        sql = 'update "Spectral_peak_list" set "Sample_condition_list_ID"=' \
-            + '(select "ID" from "Sample_condition_list" where "Sf_framecode"=' \
-            + '"Spectral_peak_list"."Sample_condition_list_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
-
-        sql = 'update "Spectral_peak_list" set "Assigned_chem_shift_list_ID"=' \
-            + '(select "ID" from "Assigned_chem_shift_list" where "Sf_framecode"=' \
-            + '"Spectral_peak_list"."Assigned_chem_shift_list_label")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
-
-        sql = 'update "Spectral_peak_list" set "Chem_shift_reference_ID"=' \
-            + '(select "Chem_shift_reference_ID" from "Assigned_chem_shift_list"' \
-            +  'where "ID"="Spectral_peak_list"."Assigned_chem_shift_list_ID")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
-
-        sql = 'update "Spectral_peak_list" set "Chem_shift_reference_label"=' \
-            + '(select "Chem_shift_reference_label" from "Assigned_chem_shift_list"' \
-            +  'where "ID"="Spectral_peak_list"."Assigned_chem_shift_list_ID")'
-        if self._verbose :
-            sys.stdout.write( sql )
-            sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
-        if self._verbose :
-            sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
+        params = { "dtl" : table["details"],
+                "smplid" : self._label_id( "sample", table["sample_label"] ),
+                "condid" : self._label_id( "sample_conditions", table["sample_condition_list_label"] ),
+                "csid" : self._label_id( "assigned_chemical_shifts", table["assigned_chem_shift_list_label"] ),
+                "refid" : self._label_id( "chem_shift_reference", reflabel ),
+                "reflbl" : reflabel }
+        self._add_row( sql, params )
 
 # as with chem shifts except here there is exact 'peak picking' task
 #
@@ -2127,7 +2263,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rc = self._star.execute( sql, commit = True )
+        rc = self._execute( sql )
         if self._verbose :
             sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
 
@@ -2158,13 +2294,7 @@ class StarMaker( object ) :
             params["sw"] = row["sweep_width"]
             params["units"] = row["sweep_width_units"]
 
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
 # and transitions
 #
@@ -2178,13 +2308,7 @@ class StarMaker( object ) :
         sql = 'insert into "Spectral_transition" ("%s") values (%s)' % (colstr,valstr,)
 
         for row in table["spectral_transition"] :
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = { "num" : row["id"] }, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, { "num" : row["id"] } )
 
         cols = { "Sf_ID"                  : sfid,
                  "Spectral_peak_list_ID"  : localid,
@@ -2202,13 +2326,7 @@ class StarMaker( object ) :
             params["num"] = row["spectral_transition_id"]
             params["val"] = row["intensity_val"]
             params["meth"] = row["measurement_method"]
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
         cols = { "Sf_ID"                  : sfid,
                  "Spectral_peak_list_ID"  : localid,
@@ -2226,13 +2344,7 @@ class StarMaker( object ) :
             params["num"] = row["spectral_transition_id"]
             params["val"] = row["chem_shift_val"]
             params["dim"] = row["spectral_dim_id"]
-            if self._verbose :
-                sys.stdout.write( sql )
-                sys.stdout.write( "\n" )
-                pprint.pprint( params )
-            rc = self._star.execute( sql, params = params, commit = True )
-            if self._verbose :
-                sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+            self._add_row( sql, params )
 
 # some atoms may be labeled
 #
@@ -2255,13 +2367,7 @@ class StarMaker( object ) :
                 params["val"] = row["val"]
                 params["dim"] = row["spectral_dim_id"]
                 params["atm"] = row["atom_id"]
-                if self._verbose :
-                    sys.stdout.write( sql )
-                    sys.stdout.write( "\n" )
-                    pprint.pprint( params )
-                rc = self._star.execute( sql, params = params, commit = True )
-                if self._verbose :
-                    sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
+                self._add_row( sql, params )
 
 # missing pieces
 #
@@ -2270,7 +2376,7 @@ class StarMaker( object ) :
             if self._verbose :
                 sys.stdout.write( sql )
                 sys.stdout.write( "\n" )
-            rc = self._star.execute( sql, commit = True )
+            rc = self._execute( sql )
             if self._verbose :
                 sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
 
@@ -2278,7 +2384,7 @@ class StarMaker( object ) :
             if self._verbose :
                 sys.stdout.write( sql )
                 sys.stdout.write( "\n" )
-            rc = self._star.execute( sql, commit = True )
+            rc = self._execute( sql )
             if self._verbose :
                 sys.stdout.write( "%d rows updated\n" % (rc.rowcount,) )
 
@@ -2288,10 +2394,12 @@ class StarMaker( object ) :
             if self._verbose :
                 sys.stdout.write( sql )
                 sys.stdout.write( "\n" )
-            rc = self._star.execute( sql, commit = True )
+            rc = self._execute( sql )
             if self._verbose :
                 sys.stdout.write( "%d rows inserted\n" % (rc.rowcount,) )
 
+        self._flush()
+
     # sanity checks
     #
     def _is_sane( self ) :
@@ -2302,7 +2410,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rs = self._star.query( sql )
+        rs = self._query( sql )
         inchi = None
         formula = None
         for row in rs :
@@ -2344,7 +2452,7 @@ class StarMaker( object ) :
         if self._verbose :
             sys.stdout.write( sql )
             sys.stdout.write( "\n" )
-        rs = self._star.query( sql )
+        rs = self._query( sql )
         inchis = {}
         for row in rs :
             inchis[row[1]] = row[0]
@@ -2368,7 +2476,7 @@ class StarMaker( object ) :
 
                 if self._verbose :
                     sys.stdout.write( "%s %s %S\n" % (sql,prog,inchis[prog],) )
-                rc = self._star.execute( sql, params = { "prog" : prog, "inc" : inchis[prog] }, commit = True )
+                rc = self._execute( sql, params = { "prog" : prog, "inc" : inchis[prog] } )
                 if self._verbose :
                     sys.stdout.write( "%d rows deleted\n" % (rc.rowcount,) )
 
@@ -2380,7 +2488,7 @@ class StarMaker( object ) :
                 sys.stderr.write( "ERR: %s InChI does not match pattern, deleting\n" % (prog,) )
                 if self._verbose :
                     sys.stdout.write( "%s %s %S\n" % (sql,prog,inchis[prog],) )
-                rc = self._star.execute( sql, params = { "prog" : prog, "inc" : inchis[prog] }, commit = True )
+                rc = self._execute( sql, params = { "prog" : prog, "inc" : inchis[prog] } )
                 if self._verbose :
                     sys.stdout.write( "%d rows deleted\n" % (rc.rowcount,) )
 
@@ -2392,8 +2500,60 @@ class StarMaker( object ) :
 #                if self._verbose :
 #                    sys.stdout.write( "%d rows deleted\n" % (rc.rowcount,) )
 
+        self._flush()
         return True
 
+################################################################################################
+# connecting to the dictionary and creating the entry tables takes longer than making
+# a small entry. Do it once and make as many entries as you like:
+#
+#   sess = StarMakerSession( config = cp )
+#   for (id, data) in entries :
+#       e = sess.make_entry( data = data, id = id )
+#       e.to_star( out = ... )
+#
+# there is one entry DB per session: each make_entry() wipes the previous entry.
+#
+class StarMakerSession( object ) :
+
+    #
+    #
+    def __init__( self, config, timer = None, profiler = None, verbose = False ) :
+        self._verbose = bool( verbose )
+        self._timer = timer
+        self._profiler = profiler
+
+        self._wrp = starobj.DbWrapper( config = config, verbose = self._verbose )
+        self._wrp.connect()
+
+        self._dict = starobj.StarDictionary( self._wrp, verbose = self._verbose )
+        self._dict.printable_tags_only = True
+        self._dict.public_tags_only = True
+
+        self._star = starobj.NMRSTAREntry( self._wrp, verbose = self._verbose )
+        self._template = template_path( config )
+        self._maker = None
+
+    #
+    #
+    @property
+    def dictionary( self ) :
+        return self._dict
+
+    #
+    #
+    def make_entry( self, data, id = "temp123", molname = None, transaction = True ) :
+        if self._maker is None :
+            self._maker = StarMaker( stardict = self._dict, entrydb = self._star, entrydata = data,
+                    entryid = id, molname = molname, timer = self._timer,
+                    profiler = self._profiler, verbose = self._verbose )
+            self._maker._create_tables( template = self._template )
+        else :
+            self._maker.reset( entrydata = data, entryid = id, molname = molname )
+
+        self._maker.build( transaction = transaction )
+        return self._maker
+
 #
 #
 #
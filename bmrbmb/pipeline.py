@@ -0,0 +1,236 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  pipeline.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# NMRFAM index file -> BMRB entry directory:
+#   Precheck -> FAMtoJSN -> StarMaker -> EntryDir -> EntryExtras
+#
+# this is what __main__.py does for one entry and batch.py does for many.
+# With incremental on, stages whose inputs haven't changed are skipped, see Manifest.
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import shutil
+import json
+import hashlib
+import tempfile
+
+from .nmrfam2incoming import Precheck
+from .incoming2json import FAMtoJSN
+from .stopwatch import Stopwatch
+from .manifest import Manifest
+from .scheduler import Scheduler
+from . import nmrstar
+from . import chemcomp
+from . import staging
+from . import www
+
+# sha1 of config settings: the STAR file depends on them (dictionary, entry template, ...)
+#
+def config_hash( config ) :
+    items = []
+    for i in sorted( config.sections() ) :
+        items.append( (i, sorted( config.items( i ) )) )
+    return hashlib.sha1( repr( items ) ).hexdigest()
+
+# add stage func() unless manifest has it with the same inputs and untouched outputs.
+# The manifest is updated when it's done, after done() if there's one.
+#
+def _add_stage( sched, manifest, stage, inputs, func, outputs, exclude = (), deps = (), kind = "thread",
+        done = None, verbose = False ) :
+    if manifest.is_current( stage, inputs ) :
+        if verbose : sys.stdout.write( "%s: up to date\n" % (stage,) )
+        sched.add( stage, None, deps = deps )
+        return
+    manifest.start( stage )
+    def finish() :
+        if done is not None : done()
+        manifest.done( stage, inputs, outputs, exclude )
+    sched.add( stage, func, deps = deps, kind = kind, done = finish )
+
+# Returns entry directory.
+#
+# session: nmrstar.StarMakerSession to reuse, else a new StarMaker is made.
+# stopwatch: Stopwatch for the stages, it is also passed to StarMaker to time the saveframe builders.
+# profiler: nmrstar.SQLProfiler for the entry DB (ignored if there's a session: it has its own)
+# incremental: only redo the stages whose inputs changed since last time (see Manifest).
+#   If the index file changed, or there's no manifest, everything is rebuilt.
+# parallel: run independent stages at the same time (see Scheduler): file copying and untar
+#   in threads. STAR is made in a forked child either way: with a session it's made in a thread
+#   instead, so that the session keeps its entry DB. Images are made by extras.py in a new
+#   python process (PyMOL exits the process it runs in).
+#
+def make_entry_dir( config, bmrbid, indexfile, outdir, keep_json = False, session = None,
+        stopwatch = None, profiler = None, incremental = False, parallel = False, verbose = False ) :
+
+    sw = stopwatch
+    if sw is None : sw = Stopwatch()
+
+# SDF is parsed once per entry, see chemcomp.cache
+#
+    chemcomp.cache.clear()
+    if config.has_option( "chemcomp", "cachedir" ) :
+        chemcomp.cache.set_cache_dir( config.get( "chemcomp", "cachedir" ) )
+
+# web lookups cache, offline mode, local chem comp InChI index
+#
+    www.cache.configure( config )
+    www.inchiindex.configure( config )
+
+# hardlink or copy input files
+#
+    staging.configure( config )
+
+    indexfile = os.path.realpath( indexfile )
+    if not os.path.exists( indexfile ) : raise IOError( "ERR: index file not found: %s" % (indexfile,) )
+    idx = None
+    with open( indexfile, "rU" ) as f :
+        idx = json.load( f )
+    assert( idx is not None )
+
+    incoming = os.path.split( indexfile )[0]
+
+    out = os.path.realpath( outdir )
+    if not os.path.isdir( out ) : raise IOError( "ERR: not a directory: %s" % (out,) )
+
+    tgtdir = os.path.join( out, bmrbid )
+    os.umask( 0o002 )
+
+# input files by stage. Index file goes into the "index" stage: if that changed, start over.
+#
+    peaks = []
+    pngs = []
+    timedomain = []
+    other = []
+    for i in idx["data"].keys() :
+        timedomain.append( idx["data"][i]["timedomain"] )
+        other.append( idx["data"][i]["botlog"] )
+        other.append( idx["data"][i]["shifts"] )
+        if "PEAKFILES" in idx["data"][i].keys() : peaks.extend( idx["data"][i]["PEAKFILES"].keys() )
+        if "PNGFILES" in idx["data"][i].keys() : pngs.extend( idx["data"][i]["PNGFILES"].keys() )
+
+    mf = None
+    full = True
+    if incremental :
+        mf = Manifest.read( tgtdir, verbose = verbose )
+        index = mf.inputs( incoming, [os.path.basename( indexfile )] )
+        full = not mf.is_current( "index", index )
+    if full :
+        if os.path.exists( tgtdir ) : shutil.rmtree( tgtdir )
+        os.makedirs( tgtdir )
+        mf = Manifest( tgtdir, verbose = verbose )
+        index = mf.inputs( incoming, [os.path.basename( indexfile )] )
+    elif verbose :
+        sys.stdout.write( "%s: incremental rebuild\n" % (tgtdir,) )
+    mf.done( "index", index )
+
+    def inputs( names, **extra ) :
+        rc = mf.inputs( incoming, names )
+        rc.update( extra )
+        return rc
+
+    sched = Scheduler( parallel = parallel, collect = [sw, profiler], verbose = verbose )
+
+    allfiles = [idx["sdf"], idx["molpic"]] + timedomain + other + peaks + pngs
+    inc = { "indexfile" : os.path.join( tgtdir, "incoming", Precheck.INDEXNAME ) }
+    def make_incoming() :
+        with sw.stage( "Precheck.make_incoming" ) :
+            inc["indexfile"] = Precheck.make_incoming( indexfile = indexfile, outdir = tgtdir,
+                    verbose = verbose )._indexfile
+    _add_stage( sched, mf, "incoming", inputs( allfiles ), make_incoming, ["incoming"], verbose = verbose )
+
+# time domain data goes first: untarring it lists the experiments for FAMtoJSN in the same pass
+# (unless they run in parallel: then it's two passes at the same time)
+#
+    d = nmrstar.EntryDir( srcdir = incoming, outdir = tgtdir, bmrbid = bmrbid,
+            index = idx, verbose = verbose )
+    with sw.stage( "EntryDir.makedirs" ) :
+        d.makedirs( clean = full )
+
+    def untar() :
+        with sw.stage( "EntryDir.untartimedomain" ) :
+            d.untartimedomain()
+    sets = [nmrstar.DATASET_DIR % (int( i ),) for i in idx["data"].keys()]
+    subdirs = [(j % (int( i ),)) for i in idx["data"].keys() for j in (nmrstar.PEAKFILE_DIR, nmrstar.SPECTRA_DIR)]
+    _add_stage( sched, mf, "timedomain", inputs( timedomain ), untar, sets, exclude = subdirs, verbose = verbose )
+
+    def make_star() :
+        with sw.stage( "FAMtoJSN.make_entry" ) :
+            dat = FAMtoJSN.make_entry( indexfile = inc["indexfile"], verbose = verbose )
+
+        if keep_json :
+            outfile = os.path.join( tgtdir, ("%s.json" % (bmrbid,) ) )
+            with open( outfile, "wb" ) as f :
+                f.write( json.dumps( dat.data, indent = 4, sort_keys = True ) )
+
+        with sw.stage( "StarMaker.from_nmrfam" ) :
+            if session is not None :
+                star = session.make_entry( data = dat.data, id = bmrbid )
+            else :
+                star = nmrstar.StarMaker.from_nmrfam( config = config, data = dat.data, id = bmrbid,
+                        timer = stopwatch, profiler = profiler, verbose = verbose )
+
+        outfile = os.path.join( tgtdir, ("%s.str" % (bmrbid,) ) )
+        with sw.stage( "StarMaker.to_star" ) :
+            with open( outfile, "wb" ) as f :
+                star.to_star( out = f )
+
+    starfiles = ["%s.str" % (bmrbid,)]
+    if keep_json : starfiles.append( "%s.json" % (bmrbid,) )
+    starkind = "process"
+    if session is not None : starkind = "thread"
+    _add_stage( sched, mf, "star", inputs( [idx["sdf"]] + timedomain + other + peaks, config = config_hash( config ),
+            keep_json = bool( keep_json ) ), make_star, starfiles, deps = ["incoming"], kind = starkind,
+            verbose = verbose )
+
+# other files
+#
+    def copymeta() :
+        with sw.stage( "EntryDir.copymeta" ) :
+            d.copymeta()
+    _add_stage( sched, mf, "meta", inputs( [idx["sdf"], idx["molpic"]] ), copymeta,
+            [os.path.basename( d._sdf ), os.path.basename( d._molpic ), "README"], verbose = verbose )
+
+    def copypeaks() :
+        with sw.stage( "EntryDir.copypeaks" ) :
+            d.copypeaks()
+    _add_stage( sched, mf, "peaks", inputs( peaks ), copypeaks,
+            [nmrstar.PEAKFILE_DIR % (int( i ),) for i in idx["data"].keys()], verbose = verbose )
+
+    def copyspectra() :
+        with sw.stage( "EntryDir.copyspectra" ) :
+            d.copyspectra()
+    _add_stage( sched, mf, "spectra", inputs( pngs ), copyspectra,
+            [nmrstar.SPECTRA_DIR % (int( i ),) for i in idx["data"].keys()], verbose = verbose )
+
+# extras.py times itself, its stats are added to ours
+#
+    (fd, timejson) = tempfile.mkstemp( prefix = "extras-", suffix = ".json" )
+    os.close( fd )
+    def extras_times() :
+        with open( timejson, "rU" ) as f :
+            sw.merge( json.load( f ) )
+    base = os.path.splitext( os.path.basename( d._sdf ) )[0]
+    _add_stage( sched, mf, "extras", inputs( [idx["sdf"]] ),
+            nmrstar.EntryExtras.command( sdf = d._sdf, timejson = timejson, verbose = verbose ),
+            ["%s%s" % (base, i,) for i in (".mol", ".svg", ".png")], deps = ["meta"], kind = "exec",
+            done = extras_times, verbose = verbose )
+
+    try :
+        sched.run()
+    finally :
+        os.unlink( timejson )
+
+    return tgtdir
+
+#
+#
@@ -0,0 +1,278 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  scheduler.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# run pipeline stages as soon as the ones they depend on are done.
+#
+#   s = Scheduler( parallel = True, collect = [stopwatch] )
+#   s.add( "meta", copymeta )
+#   s.add( "star", makestar, deps = ["incoming"], kind = "process" )
+#   s.add( "extras", ["python", "extras.py", "x.sdf"], deps = ["meta"], kind = "exec" )
+#   s.run()
+#
+# "thread" stages are for I/O: copying and untarring files.
+# "process" stages are for CPU-bound stuff that holds the GIL (building STAR): the function runs
+# in a forked child, so it sees everything the parent had, but nothing it changes makes it back
+# to the parent. Do the bookkeeping in done(): it's called in the calling thread when the stage
+# has finished OK.
+# "exec" stages are commands (argv list) run in a new process, for things that can't live in
+# a fork of this one (PyMOL).
+#
+# "process" and "exec" stages run in a child process in all modes, including multiprocessing.Pool
+# workers (os.fork(), not multiprocessing.Process). A "process" stage isn't forked while
+# "thread" stages are running: a lock held by another thread at fork time stays locked
+# in the child forever. New thread stages wait until it's forked.
+#
+# collect: objects with stats, clear() and merge( stats ) (Stopwatch, SQLProfiler): these are
+# cleared in the forked child and what it's collected is merged back into the parent's.
+#
+# If a stage fails, nothing new is started, the ones already running are waited for,
+# and run() raises an Exception with the stage name and traceback.
+#
+# Not parallel: stages run one at a time, in the order they were added.
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import traceback
+import threading
+import subprocess
+import cPickle
+import Queue
+
+KINDS = ("thread", "process", "exec")
+
+#
+#
+#
+class Scheduler( object ) :
+
+    #
+    #
+    def __init__( self, parallel = True, collect = (), verbose = False ) :
+        self._parallel = bool( parallel )
+        self._collect = [i for i in collect if i is not None]
+        self._verbose = bool( verbose )
+        self._stages = []
+        self._names = set()
+
+    # deps must be added before this
+    #
+    def add( self, name, func, deps = (), kind = "thread", done = None ) :
+        if name in self._names :
+            raise Exception( "duplicate stage %s" % (name,) )
+        if not kind in KINDS :
+            raise Exception( "invalid stage kind: %s, must be one of %s" % (kind, ", ".join( KINDS ),) )
+        for i in deps :
+            if not i in self._names :
+                raise Exception( "stage %s depends on %s that isn't there" % (name, i,) )
+        self._names.add( name )
+        self._stages.append( { "name" : name, "func" : func, "deps" : set( deps ), "kind" : kind,
+                "done" : done } )
+
+    #
+    #
+    def run( self ) :
+        if not self._parallel :
+            for s in self._stages :
+                if s["func"] is not None :
+                    if s["kind"] == "process" : err = self._wait_process( s, *self._fork( s ) )
+                    elif s["kind"] == "exec" : err = self._wait_exec( s, self._exec( s ) )
+                    else : err = self._call( s )
+                    if err is not None :
+                        raise Exception( "stage %s failed:\n%s" % (s["name"], err,) )
+                if s["done"] is not None : s["done"]()
+            return
+
+        results = Queue.Queue()
+        waiting = list( self._stages )
+        finished = set()
+        running = 0
+        threads = 0
+        error = None
+        while True :
+
+# fork first, then start the threads
+#
+            if error is None :
+                ready = [i for i in waiting if i["deps"] <= finished]
+                ready.sort( key = lambda i : i["kind"] != "process" )
+                for s in ready :
+
+# don't fork with threads running, and don't start any until it's forked
+#
+                    if (s["kind"] == "process") and (s["func"] is not None) and (threads > 0) :
+                        break
+                    waiting.remove( s )
+                    if self._verbose :
+                        sys.stdout.write( "start %s (%s)\n" % (s["name"], s["kind"],) )
+                    if s["func"] is None :
+                        results.put( (s, None, None) )
+                    elif s["kind"] == "process" :
+                        self._start_process( s, results )
+                    elif s["kind"] == "exec" :
+                        self._start_exec( s, results )
+                    else :
+                        self._start_thread( s, results )
+                        threads += 1
+                    running += 1
+
+            if running < 1 : break
+
+            (s, err, stats) = results.get()
+            running -= 1
+            if (s["kind"] == "thread") and (s["func"] is not None) : threads -= 1
+            if err is not None :
+                if error is None : error = (s["name"], err)
+                continue
+            if stats is not None :
+                for (obj, st) in zip( self._collect, stats ) :
+                    obj.merge( st )
+            if s["done"] is not None : s["done"]()
+            finished.add( s["name"] )
+            if self._verbose :
+                sys.stdout.write( "done %s\n" % (s["name"],) )
+
+        if error is not None :
+            raise Exception( "stage %s failed:\n%s" % error )
+        if len( waiting ) > 0 :
+            raise Exception( "stages never started: %s" % (", ".join( i["name"] for i in waiting ),) )
+
+    # returns error (traceback) or None
+    #
+    @staticmethod
+    def _call( stage ) :
+        try :
+            stage["func"]()
+            return None
+        except Exception :
+            return traceback.format_exc()
+
+    #
+    #
+    def _start_thread( self, stage, results ) :
+        def run() :
+            results.put( (stage, self._call( stage ), None) )
+        t = threading.Thread( target = run, name = stage["name"] )
+        t.daemon = True
+        t.start()
+
+    # child sends back (error, stats) through a pipe and exits without running any atexit
+    # handlers or finalizers that belong to the parent. Returns (pid, read end of the pipe)
+    #
+    def _fork( self, stage ) :
+        (r, w) = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid != 0 :
+            os.close( w )
+            return (pid, r)
+
+        code = 1
+        try :
+            os.close( r )
+            for i in self._collect : i.clear()
+            err = self._call( stage )
+            stats = None
+            if err is None : stats = [i.stats for i in self._collect]
+            with os.fdopen( w, "wb" ) as f :
+                cPickle.dump( (err, stats), f, cPickle.HIGHEST_PROTOCOL )
+            code = 0
+        finally :
+            try :
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally :
+                os._exit( code )
+
+    # error or None. Stats, if any, go into self._collect
+    #
+    def _wait_process( self, stage, pid, r, results = None ) :
+        with os.fdopen( r, "rb" ) as f :
+            try :
+                (err, stats) = cPickle.load( f )
+            except EOFError :
+                (err, stats) = (None, None)
+        (pid, status) = os.waitpid( pid, 0 )
+        if os.WIFSIGNALED( status ) :
+            err = "%s killed by signal %s\n" % (stage["name"], os.WTERMSIG( status ),)
+        elif (os.WEXITSTATUS( status ) != 0) and (err is None) :
+            err = "%s exited with code %s\n" % (stage["name"], os.WEXITSTATUS( status ),)
+        elif (err is None) and (stats is None) :
+            err = "%s exited without a result\n" % (stage["name"],)
+        if results is not None :
+            results.put( (stage, err, stats) )
+            return err
+        if (err is None) and (stats is not None) :
+            for (obj, st) in zip( self._collect, stats ) :
+                obj.merge( st )
+        return err
+
+    # a thread here waits for the child
+    #
+    def _start_process( self, stage, results ) :
+        (pid, r) = self._fork( stage )
+        t = threading.Thread( target = self._wait_process, args = (stage, pid, r, results),
+                name = "wait-%s" % (stage["name"],) )
+        t.daemon = True
+        t.start()
+
+    #
+    #
+    def _exec( self, stage ) :
+        if self._verbose : sys.stdout.write( "%s\n" % (" ".join( stage["func"] ),) )
+        sys.stdout.flush()
+        sys.stderr.flush()
+        return subprocess.Popen( stage["func"], close_fds = True )
+
+    #
+    #
+    @staticmethod
+    def _wait_exec( stage, proc ) :
+        code = proc.wait()
+        if code == 0 : return None
+        if code < 0 : return "%s killed by signal %s\n" % (stage["name"], -code,)
+        return "%s exited with code %s\n" % (stage["name"], code,)
+
+    #
+    #
+    def _start_exec( self, stage, results ) :
+        proc = self._exec( stage )
+        def wait() :
+            results.put( (stage, self._wait_exec( stage, proc ), None) )
+        t = threading.Thread( target = wait, name = "wait-%s" % (stage["name"],) )
+        t.daemon = True
+        t.start()
+
+#
+#
+#
+if __name__ == '__main__':
+
+    import time
+    def sleep( secs ) :
+        return lambda : time.sleep( secs )
+    def spin() :
+        sum( range( 10000000 ) )
+
+    start = time.time()
+    s = Scheduler( parallel = True, verbose = True )
+    s.add( "a", sleep( 1 ) )
+    s.add( "b", spin, kind = "process" )
+    s.add( "c", spin, deps = ["a"], kind = "process" )
+    s.add( "d", sleep( 1 ), deps = ["b", "c"] )
+    s.add( "e", [sys.executable, "-c", "import time; time.sleep( 1 )"], deps = ["a"], kind = "exec" )
+    s.run()
+    sys.stdout.write( "%.1f s\n" % (time.time() - start,) )
+
+#
+#
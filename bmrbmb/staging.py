@@ -0,0 +1,123 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  staging.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# put input files in place: source dir -> incoming -> entry directory.
+#
+# mode is "link" (hardlink, copy if it can't: different filesystem, no permission, ...)
+# or "copy" (what we always did). Linked files share the inode with the source: nothing
+# down the line may change them in place, write new files instead.
+#
+# verify is how copies are checked against the source: "size" (the default), "sha1" (size, then
+# read both files: slow on big tarballs over NFS), or "no". Links are checked with samefile().
+# yes is the same as size.
+#
+#   [staging]
+#   mode = link
+#   verify = size
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import shutil
+import hashlib
+
+MODES = ("link", "copy")
+CHECKS = ("no", "size", "sha1")
+
+_MODE = "copy"
+_VERIFY = "size"
+
+# verify can also be True (size) or False (no)
+#
+def set_mode( mode = "copy", verify = "size" ) :
+    global _MODE, _VERIFY
+    if not mode in MODES :
+        raise Exception( "invalid staging mode: %s, must be one of %s" % (mode, ", ".join( MODES ),) )
+    if verify is True : verify = "size"
+    elif verify is False : verify = "no"
+    if not verify in CHECKS :
+        raise Exception( "invalid staging verify: %s, must be one of %s" % (verify, ", ".join( CHECKS ),) )
+    _MODE = mode
+    _VERIFY = verify
+
+# [staging] section if there's one, defaults otherwise
+#
+def configure( config ) :
+    mode = "copy"
+    verify = "size"
+    if config.has_section( "staging" ) :
+        if config.has_option( "staging", "mode" ) :
+            mode = config.get( "staging", "mode" ).strip().lower()
+        if config.has_option( "staging", "verify" ) :
+            verify = config.get( "staging", "verify" ).strip().lower()
+            if verify in ("yes", "true", "on", "1") : verify = "size"
+            elif verify in ("false", "off", "0") : verify = "no"
+    set_mode( mode, verify )
+
+#
+#
+def sha1sum( filename ) :
+    h = hashlib.sha1()
+    with open( filename, "rb" ) as f :
+        for chunk in iter( lambda : f.read( 1048576 ), b"" ) :
+            h.update( chunk )
+    return h.hexdigest()
+
+# sha1 only if asked for
+#
+def verify( src, dst, sha1 = False ) :
+    if os.path.samefile( src, dst ) : return
+    ssize = os.path.getsize( src )
+    dsize = os.path.getsize( dst )
+    if ssize != dsize :
+        raise IOError( "%s is %d bytes, %s is %d bytes" % (src, ssize, dst, dsize,) )
+    if not sha1 : return
+    if sha1sum( src ) != sha1sum( dst ) :
+        raise IOError( "%s and %s differ" % (src, dst,) )
+
+# like shutil.copy(): dst can be a directory. Returns the file name.
+#
+def stage( src, dst, verbose = False ) :
+    if os.path.isdir( dst ) :
+        dst = os.path.join( dst, os.path.basename( src ) )
+    if os.path.lexists( dst ) :
+        os.unlink( dst )
+
+    linked = False
+    if _MODE == "link" :
+        try :
+            os.link( src, dst )
+            linked = True
+        except OSError, e :
+            if verbose :
+                sys.stdout.write( "can't link %s to %s (%s), copying\n" % (src, dst, str( e ),) )
+
+    if linked :
+        if verbose : sys.stdout.write( "link %s to %s\n" % (src, dst,) )
+    else :
+        if verbose : sys.stdout.write( "copy %s to %s\n" % (src, dst,) )
+        shutil.copy( src, dst )
+
+    if _VERIFY != "no" :
+        verify( src, dst, sha1 = (_VERIFY == "sha1") )
+    return dst
+
+#
+#
+#
+if __name__ == '__main__':
+
+    if len( sys.argv ) > 3 : set_mode( sys.argv[3] )
+    stage( sys.argv[1], sys.argv[2], verbose = True )
+
+#
+#
@@ -0,0 +1,149 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  stopwatch.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# time pipeline stages: wall clock, CPU (user + system), and peak RSS of this process
+# when the stage finished.
+#
+#   sw = Stopwatch()
+#   with sw.stage( "FAMtoJSN.make_entry" ) :
+#       ...
+#   sw.report( sys.stderr )
+#
+# Stages can nest, a stage that runs more than once is reported once, with the count.
+# Nesting is per thread. CPU and RSS are for the whole process, so with stages running
+# in parallel threads they add up to more than what the stage itself took.
+#
+
+from __future__ import absolute_import
+
+import sys
+import time
+import resource
+import json
+import threading
+import collections
+import contextlib
+
+#
+#
+#
+class Stopwatch( object ) :
+
+    #
+    #
+    def __init__( self ) :
+        self._stages = collections.OrderedDict()
+        self._local = threading.local()
+
+    #
+    #
+    @property
+    def __json__( self ) :
+        return json.dumps( self._stages.values(), indent = 4 )
+
+    #
+    #
+    @property
+    def stats( self ) :
+        return self._stages.values()
+
+    #
+    #
+    def clear( self ) :
+        self._stages.clear()
+
+    # add stats from another stopwatch, e.g. one in a child process
+    #
+    def merge( self, stats ) :
+        for s in stats :
+            if not s["stage"] in self._stages :
+                self._stages[s["stage"]] = dict( s )
+                continue
+            rec = self._stages[s["stage"]]
+            for i in ("count", "wall", "cpu") :
+                rec[i] += s[i]
+            if s["maxrss_kb"] > rec["maxrss_kb"] : rec["maxrss_kb"] = s["maxrss_kb"]
+
+    #
+    #
+    def _get_depth( self ) :
+        return getattr( self._local, "depth", 0 )
+    def _set_depth( self, depth ) :
+        self._local.depth = depth
+    _depth = property( _get_depth, _set_depth )
+
+    # getrusage() returns maxrss in kilobytes on linux
+    #
+    @staticmethod
+    def _cpu_rss() :
+        ru = resource.getrusage( resource.RUSAGE_SELF )
+        return (ru.ru_utime + ru.ru_stime, ru.ru_maxrss)
+
+    #
+    #
+    @contextlib.contextmanager
+    def stage( self, name ) :
+        if not name in self._stages :
+            self._stages[name] = { "stage" : name, "depth" : self._depth, "count" : 0,
+                "wall" : 0.0, "cpu" : 0.0, "maxrss_kb" : 0 }
+        rec = self._stages[name]
+
+        self._depth += 1
+        (cpu, rss) = self._cpu_rss()
+        wall = time.time()
+        try :
+            yield rec
+        finally :
+            wall = time.time() - wall
+            (cpu2, rss) = self._cpu_rss()
+            self._depth -= 1
+            rec["count"] += 1
+            rec["wall"] += wall
+            rec["cpu"] += cpu2 - cpu
+            if rss > rec["maxrss_kb"] : rec["maxrss_kb"] = rss
+
+    # time every call to func as stage name
+    #
+    def wrap( self, func, name ) :
+        def timed( *args, **kwargs ) :
+            with self.stage( name ) :
+                return func( *args, **kwargs )
+        return timed
+
+    #
+    #
+    def report( self, out = sys.stderr ) :
+        if len( self._stages ) < 1 : return
+        width = max( len( s["stage"] ) + 2 * s["depth"] for s in self._stages.values() )
+        out.write( "%s   %5s   %10s   %10s   %12s\n" % ("stage".ljust( width ), "count", "wall, s", "CPU, s",
+                "max RSS, kB") )
+        for s in self._stages.values() :
+            name = "%s%s" % ("  " * s["depth"], s["stage"])
+            out.write( "%s   %5d   %10.3f   %10.3f   %12d\n" % (name.ljust( width ), s["count"], s["wall"],
+                    s["cpu"], s["maxrss_kb"]) )
+
+#
+#
+#
+if __name__ == '__main__':
+
+    sw = Stopwatch()
+    with sw.stage( "outer" ) :
+        with sw.stage( "sleep" ) :
+            time.sleep( 0.1 )
+        for i in range( 3 ) :
+            with sw.stage( "spin" ) :
+                sum( range( 100000 ) )
+    sw.report( sys.stdout )
+    sys.stdout.write( sw.__json__ )
+    sys.stdout.write( "\n" )
+
+#
+#
@@ -19,6 +19,8 @@ import pprint
 import json
 import re
 import glob
+import copy
+import hashlib
 
 # untar/zip topspin exeriment directory, make a list of files in there
 # these are text/directory, type "timedomain data", and named 1, 2, ...
@@ -30,6 +32,26 @@ import glob
 # this will be matched to NMRBotLog's list by expt.num to fill in experiment_file table
 #
 
+# tarball -> list of files in it.
+#
+_LISTINGS = {}
+
+# gunzipping multi-gigabyte tarballs takes minutes, and they get copied around (so no file names).
+# gzip trailer is CRC and length of uncompressed data, so size + first and last 64K is as good
+# as hashing the whole thing.
+#
+def tarball_key( filename, chunk = 65536 ) :
+    size = os.path.getsize( filename )
+    h = hashlib.sha1()
+    with open( filename, "rb" ) as f :
+        h.update( f.read( chunk ) )
+        if size > chunk :
+            f.seek( max( chunk, size - chunk ) )
+            h.update( f.read( chunk ) )
+    return "%d:%s" % (size, h.hexdigest(),)
+
+#
+#
 class ExperimentFiles( object ) :
 
     UMASK = 002
@@ -73,26 +95,65 @@ class ExperimentFiles( object ) :
     #
     def _listfiles( self ) :
         if self._verbose : sys.stdout.write( "%s._listfiles()\n" % (self.__class__.__name__,) )
+        self._scan( outdir = None )
+
+    # one pass through the tarball in stream mode: list the files, strip off the top directory,
+    # and extract them if there's outdir.
+    # The list is cached (see tarball_key()) so if you need both, extract first.
+    #
+    def _scan( self, outdir = None ) :
 
-        with tarfile.open( self._tarfile, "r" ) as tar :
+        key = tarball_key( self._tarfile )
+        if (outdir is None) and (key in _LISTINGS) :
+            if self._verbose : sys.stdout.write( "using cached file list for %s\n" % (self._tarfile,) )
+            self._filelist = list( _LISTINGS[key] )
+            return
+
+        self._filelist = []
+        dirs = []
+        root = None
+        with tarfile.open( self._tarfile, "r|*" ) as tar :
+            for i in tar :
 
 # grrr...
 # try to strip off the top directory
 #
-            (car, cdr) = os.path.split( tar.getmembers()[0].name )
-            while car != "" :
-                (car, cdr) = os.path.split( car )
-            root = "%s/" % (cdr,)
+                if root is None :
+                    (car, cdr) = os.path.split( i.name )
+                    while car != "" :
+                        (car, cdr) = os.path.split( car )
+                    root = "%s/" % (cdr,)
 
-            for i in tar.getmembers() :
                 if self._verbose :
                     sys.stdout.write( "root = %s, replace with '' in %s if startswith\n" % (root,i.name) )
-                if i.name.startswith( root ) :
-                    i.name = i.name.replace( root, "" )
-                    self._filelist.append( i )
-            if self._verbose :
-                sys.stdout.write( "%d files in tarball\n" % (len( self._filelist ),) )
-                pprint.pprint( self._filelist )
+                if not i.name.startswith( root ) :
+                    continue
+                i.name = i.name.replace( root, "" )
+                self._filelist.append( i )
+                if outdir is None :
+                    continue
+
+# same as extractall(): directories are made writable and get their attributes at the end
+#
+                if i.isdir() :
+                    dirs.append( i )
+                    d = copy.copy( i )
+                    d.mode = 0700
+                    tar.extract( d, path = outdir )
+                else :
+                    tar.extract( i, path = outdir )
+
+            dirs.sort( key = lambda x : x.name, reverse = True )
+            for d in dirs :
+                path = os.path.join( outdir, d.name )
+                tar.chown( d, path )
+                tar.utime( d, path )
+                tar.chmod( d, path )
+
+        _LISTINGS[key] = list( self._filelist )
+        if self._verbose :
+            sys.stdout.write( "%d files in tarball\n" % (len( self._filelist ),) )
+            pprint.pprint( self._filelist )
 
     # fill in self.data with { "name" : N, "experiment_id" : N, "content" : "NMR experiment directory",
     #   "type" : "text/directory" }
@@ -132,8 +193,9 @@ class ExperimentFiles( object ) :
 
     # extract to a directory
     # if none is specified here, or in c'tor, make a temporary one in the cwd
+    # clean: remove the directory first, else extract into what's there
     #
-    def extract( self, outdir = None ) :
+    def extract( self, outdir = None, clean = True ) :
         if self._verbose : sys.stdout.write( "%s.extract()\n" % (self.__class__.__name__,) )
 
         os.umask( self.UMASK )
@@ -143,16 +205,12 @@ class ExperimentFiles( object ) :
 
         if self._outdir is None :
             self._outdir = tempfile.mkdtemp( dir = os.path.realpath( "." ) )
-        else :
+        elif clean or not os.path.isdir( self._outdir ) :
             if os.path.isdir( self._outdir ) :
                 shutil.rmtree( self._outdir )
             os.makedirs( self._outdir )
 
-        if len( self._filelist ) < 1 :
-            self._listfiles()
-
-        with tarfile.open( self._tarfile, "r" ) as tar :
-            tar.extractall( members = self._filelist, path = self._outdir )
+        self._scan( outdir = self._outdir )
 
 ##############################################
 #
@@ -16,69 +16,134 @@ import sys
 import urllib2
 import traceback
 import json
+import time
+import threading
+
+from . import cache
+from . import client
+from . import inchiindex
+
+# seconds, for each read (connect timeout is in client.py). Not the total time: see lookup_all()
+#
+TIMEOUT = 30
+
+# keep-alive connections, retries, per-host limits
+#
+CLIENT = client.HTTPClient()
+
+# (status, content type, body) from the cache (see cache.py) or the web (client.py).
+# "Not found" (400, 404) is cached too, body is None then. Other HTTP errors are raised.
+# Offline and not in the cache is "not found".
+# data is POSTed, it's cached as URL?data
+#
+def _fetch( url, verbose = False, timeout = None, data = None ) :
+    key = url
+    if data is not None : key = "%s?%s" % (url, data,)
+    rc = cache.get( key, verbose = verbose )
+    if rc is not None : return rc
+    if cache.is_offline() :
+        sys.stderr.write( "WARN: offline, not in cache: %s\n" % (key,) )
+        return (404, None, None)
+
+    if timeout is None : timeout = TIMEOUT
+    rc = CLIENT.get( url, timeout = timeout, verbose = verbose, data = data )
+    if rc[0] >= 400 :
+        if rc[0] not in cache.NEGATIVE :
+            raise urllib2.HTTPError( url, rc[0], "HTTP error %s" % (rc[0],), None, None )
+        rc = (rc[0], None, None)
+
+    if (rc[0] < 300) or (rc[0] in cache.NEGATIVE) :
+        cache.put( key, rc[0], rc[1], rc[2], verbose = verbose )
+    return rc
 
 # url fetch wrapper
 #
-def fetch_json( url, verbose = False ) :
+def fetch_json( url, verbose = False, timeout = None, data = None ) :
     if url is None : return None
+    (code, ctype, body) = _fetch( url, timeout = timeout, verbose = verbose, data = data )
+    if code in cache.NEGATIVE :
+        sys.stderr.write( "Error: %s at %s\n" %(code, url,) )
+        return None
     rc = None
-    try :
-        f = urllib2.urlopen( url )
-        if (f.getcode() is not None) and (int( f.getcode() ) < 300) :
-            try :
-                rc = json.load( f )
-            except Exception, e :
-                for i in f : sys.stderr.write( "* " + i + "\n" )
-                traceback.print_exc()
-                rc = None
-        f.close()
-    except urllib2.HTTPError, e :
-        sys.stderr.write( "Error: %s at %s\n" %(e.code, url,) )
-        if e.code not in (400, 404,) :
-            raise
+    if (code < 300) and (body is not None) :
+        try :
+            rc = json.loads( body )
+        except Exception, e :
+            for i in body.splitlines() : sys.stderr.write( "* " + i + "\n" )
+            traceback.print_exc()
+            if data is None : cache.drop( url )
+            else : cache.drop( "%s?%s" % (url, data,) )
+            rc = None
     if (rc is None) or (len( rc ) < 1) : return None
     return rc
 #
 
 # returns lines of text/plain response in an array
 #
-def fetch_text( url, verbose = False ) :
+def fetch_text( url, verbose = False, timeout = None ) :
     if url is None : return None
+    (code, ctype, body) = _fetch( url, timeout = timeout, verbose = verbose )
     rc = []
-    try :
-        f = urllib2.urlopen( url )
-        if (f.getcode() is not None) and (int( f.getcode() ) < 300) :
-            if f.info().gettype() != "text/plain" :
-                sys.stderr.write( "Not text/plain from %s\n" % (f.geturl(),) )
-            try :
-                for i in f :
-                    s = str( i ).strip()
-                    if s != "" :
-                        rc.append( s )
-            except Exception, e :
-                for i in f : sys.stderr.write( "* " + i + "\n" )
-                traceback.print_exc()
-                rc = []
-        f.close()
-    except urllib2.HTTPError, e :
-        if e.code != 404 :
-            raise
+    if (code < 300) and (body is not None) :
+        if ctype != "text/plain" :
+            sys.stderr.write( "Not text/plain from %s\n" % (url,) )
+        for i in body.splitlines() :
+            s = str( i ).strip()
+            if s != "" :
+                rc.append( s )
     if len( rc ) < 1 : return None
     return rc
 
+# run lookups at the same time, each in its own thread, so it takes as long as the slowest one.
+# jobs is { name : (func, args, timeout) }, func is called as func( *args, timeout = timeout, verbose = verbose )
+# and has timeout seconds to finish.
+# Returns { name : whatever func returned }, that is None if it failed or ran out of time.
+#
+def lookup_all( jobs, verbose = False ) :
+    results = {}
+
+    def run( name, func, args, timeout ) :
+        try :
+            results[name] = func( *args, timeout = timeout, verbose = verbose )
+        except Exception, e :
+            sys.stderr.write( "WARN: %s lookup failed: %s\n" % (name, str( e ),) )
+            if verbose : traceback.print_exc()
+
+# threads that are still waiting on the network when we give up on them shouldn't keep us from exiting
+#
+    threads = {}
+    for (name, (func, args, timeout)) in jobs.items() :
+        t = threading.Thread( target = run, args = (name, func, args, timeout), name = name )
+        t.daemon = True
+        t.start()
+        threads[name] = (t, time.time() + timeout)
+
+    rc = {}
+    for (name, (t, deadline)) in threads.items() :
+        t.join( max( 0.0, deadline - time.time() ) )
+        if t.is_alive() :
+            sys.stderr.write( "WARN: %s lookup: no answer in %s seconds\n" % (name, jobs[name][2],) )
+            rc[name] = None
+        else :
+            rc[name] = results.get( name )
+        if verbose :
+            sys.stdout.write( "%s lookup: %s\n" % (name, rc[name],) )
+    return rc
+
 #
 
-from .bmrb import as_json as bmrbid_json, id_from_inchi as bmrbid
+from .bmrb import as_json as bmrbid_json, id_from_inchi as bmrbid, key_for_inchi
 from .cactvs import as_json as cactus_iupac_name_json, get_iupac_name as cactus_iupac_name
-from .pubchem import as_json as pubchem_json, get_pubchem_data
+from .pubchem import as_json as pubchem_json, get_pubchem_data, get_pubchem_data_bulk, \
+        prefetch as pubchem_prefetch
 
 #
 #
 #
-__all__ = [ "fetch_json", "fetch_text",
-    "bmrbid", "bmrbid_json",
+__all__ = [ "TIMEOUT", "CLIENT", "cache", "client", "inchiindex", "fetch_json", "fetch_text", "lookup_all",
+    "bmrbid", "bmrbid_json", "key_for_inchi",
     "cactus_iupac_name", "cactus_iupac_name_json",
-    "get_pubchem_data", "pubchem_json",
+    "get_pubchem_data", "get_pubchem_data_bulk", "pubchem_prefetch", "pubchem_json",
     ]
 
 #
@@ -20,6 +20,7 @@ import collections
 _HERE = os.path.split( __file__ )[0]
 sys.path.append( os.path.realpath( os.path.join( os.path.join( _HERE, ".." ), ".." ) ) )
 import bmrbmb.www
+import bmrbmb.www.inchiindex
 
 # as of 2018-07-29 public chem comp database has Comp IDs as Entry IDs.
 # so we can just use "get id" API
@@ -30,14 +31,36 @@ QRYURL = "http://webapi.bmrb.wisc.edu/current/search/get_id_by_tag_value/" \
         + "?database=chemcomps" # metabolomics, macromolecules
 INCHITAG = "_Chem_comp.InChI_code"
 
+# InChIKey for this InChI from chem comp descriptors: toolkits add InChI and InChIKey, ALATIS only
+# the InChI. Only a toolkit whose InChI is the same one will do. None if there isn't one.
+#
+def key_for_inchi( inchi, descriptors ) :
+    if (inchi is None) or (descriptors is None) : return None
+    inchis = {}
+    keys = {}
+    for i in descriptors :
+        if i["type"] == "InChI" : inchis[i["program"]] = i["descriptor"]
+        elif i["type"] == "InChI_KEY" : keys[i["program"]] = i["descriptor"]
+    for (prog, key) in sorted( keys.items() ) :
+        if inchis.get( prog ) == inchi : return key
+    return None
+
 # chem comps are supposed to be unique, there can be only one (or 0)
+# local index first (see inchiindex.py): by InChI, then by InChIKey if there is one.
+# webapi if it's not there
 #
-def id_from_inchi( inchi, verbose = False ) :
+def id_from_inchi( inchi, inchi_key = None, verbose = False, timeout = None ) :
     global QRYURL
     global INCHITAG
 
+    compid = bmrbmb.www.inchiindex.lookup( inchi = inchi, inchi_key = inchi_key, verbose = verbose )
+    if compid is not None :
+        return { "db_code" : "BMRB Ligand Expo",
+                "acc_code" : str( compid ),
+                "acc_type" : "comp id" }
+
     addr = QRYURL % { "tag" : INCHITAG, "value" : inchi }
-    dat = bmrbmb.www.fetch_json( url = addr, verbose = verbose )
+    dat = bmrbmb.www.fetch_json( url = addr, timeout = timeout, verbose = verbose )
     if dat is None :
         return None
     if not isinstance( dat, collections.Iterable ) :
@@ -57,7 +80,7 @@ def id_from_inchi( inchi, verbose = False ) :
 #
 #
 def as_json( inchi, verbose = False ) :
-    dat = id_from_inchi( inchi, verbose )
+    dat = id_from_inchi( inchi, verbose = verbose )
     if dat is None : return None
     rc = { "chem_comp_db_link" : dat }
     return json.dumps( rc )
@@ -0,0 +1,204 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  cache.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# web responses, kept in sqlite3 database so rebuilding an entry doesn't download the same
+# PubChem record again. Keyed on URL.
+#
+# Responses expire after TTL seconds for the host (DEFAULT_TTL if the host isn't in TTL),
+# "not found" (400 and 404) -- after NEGATIVE_TTL. When the bodies add up to more than maxsize
+# bytes, least recently used ones are dropped. "Used" is to within TOUCH seconds: hits only write
+# to the database when the last access time is older than that, otherwise reads are read-only.
+#
+# offline: only answer from the cache, expired or not. Nothing cached is the same as "not found".
+#
+# All off until set_cache() is called. Config (see configure()):
+#
+#   [www]
+#   cache = /tmp/bmrbmb-www.sqlt3
+#   maxsize = 200
+#   offline = no
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import sqlite3
+import urlparse
+
+# seconds
+#
+DAY = 86400
+DEFAULT_TTL = 7 * DAY
+NEGATIVE_TTL = DAY
+TOUCH = 3600
+TTL = {
+    "pubchem.ncbi.nlm.nih.gov" : 30 * DAY,
+    "cactus.nci.nih.gov" : 30 * DAY,
+    "webapi.bmrb.wisc.edu" : DAY
+}
+
+# responses with these codes are cached
+#
+NEGATIVE = (400, 404)
+
+_DBFILE = None
+_MAXSIZE = 200 * 1048576
+_OFFLINE = False
+
+DDL = """create table if not exists responses (url text primary key, host text, status integer,
+content_type text, body blob, size integer, fetched real, accessed real)"""
+
+#
+#
+def set_cache( dbfile, maxsize = None ) :
+    global _DBFILE, _MAXSIZE
+    if dbfile is None :
+        _DBFILE = None
+        return
+    _DBFILE = os.path.realpath( dbfile )
+    if maxsize is not None : _MAXSIZE = int( maxsize )
+    d = os.path.split( _DBFILE )[0]
+    if not os.path.isdir( d ) : os.makedirs( d )
+    conn = _connect()
+    try :
+        conn.execute( DDL )
+        conn.execute( "create index if not exists responses_accessed on responses (accessed)" )
+        conn.commit()
+    finally :
+        conn.close()
+
+#
+#
+def set_offline( offline = True ) :
+    global _OFFLINE
+    _OFFLINE = bool( offline )
+
+#
+#
+def is_offline() :
+    return _OFFLINE
+
+# [www] section if there's one. maxsize is in megabytes
+#
+def configure( config ) :
+    if not config.has_section( "www" ) : return
+    maxsize = None
+    if config.has_option( "www", "maxsize" ) :
+        maxsize = config.getint( "www", "maxsize" ) * 1048576
+    if config.has_option( "www", "cache" ) :
+        set_cache( config.get( "www", "cache" ), maxsize )
+    if config.has_option( "www", "offline" ) :
+        set_offline( config.getboolean( "www", "offline" ) )
+
+#
+#
+def _connect() :
+    return sqlite3.connect( _DBFILE, timeout = 60 )
+
+#
+#
+def ttl( url, status = 200 ) :
+    if status in NEGATIVE : return NEGATIVE_TTL
+    return TTL.get( urlparse.urlsplit( url ).hostname, DEFAULT_TTL )
+
+# (status, content type, body) or None if not there or expired (unless offline)
+#
+def get( url, verbose = False ) :
+    if _DBFILE is None : return None
+    conn = _connect()
+    try :
+        curs = conn.execute( "select status, content_type, body, fetched, accessed from responses where url=?",
+                (url,) )
+        row = curs.fetchone()
+        if row is None : return None
+        (status, ctype, body, fetched, accessed) = row
+        now = time.time()
+        if (not _OFFLINE) and (now - fetched > ttl( url, status )) :
+            if verbose : sys.stdout.write( "cache: expired %s\n" % (url,) )
+            return None
+        if body is not None : body = str( body )
+        if (accessed is None) or (now - accessed > TOUCH) :
+            conn.execute( "update responses set accessed=? where url=?", (now, url,) )
+            conn.commit()
+        if verbose : sys.stdout.write( "cache: %s %s\n" % (status, url,) )
+        return (status, ctype, body)
+    finally :
+        conn.close()
+
+#
+#
+def put( url, status, content_type, body, verbose = False ) :
+    if _DBFILE is None : return
+    size = 0
+    blob = None
+    if body is not None :
+        size = len( body )
+        blob = buffer( body )
+    now = time.time()
+    conn = _connect()
+    try :
+        conn.execute( "insert or replace into responses (url, host, status, content_type, body, size, " \
+                + "fetched, accessed) values (?,?,?,?,?,?,?,?)",
+                (url, urlparse.urlsplit( url ).hostname, status, content_type, blob, size, now, now,) )
+        _evict( conn, verbose )
+        conn.commit()
+    finally :
+        conn.close()
+
+# least recently used first
+#
+def _evict( conn, verbose = False ) :
+    total = conn.execute( "select coalesce(sum(size),0) from responses" ).fetchone()[0]
+    if total <= _MAXSIZE : return
+    drop = []
+    for (url, size) in conn.execute( "select url, size from responses order by accessed" ) :
+        if total <= _MAXSIZE : break
+        drop.append( (url,) )
+        total -= size
+    if verbose : sys.stdout.write( "cache: dropping %d responses\n" % (len( drop ),) )
+    conn.executemany( "delete from responses where url=?", drop )
+
+# e.g. it's cached but it's garbage
+#
+def drop( url ) :
+    if _DBFILE is None : return
+    conn = _connect()
+    try :
+        conn.execute( "delete from responses where url=?", (url,) )
+        conn.commit()
+    finally :
+        conn.close()
+
+#
+#
+def clear() :
+    if _DBFILE is None : return
+    conn = _connect()
+    try :
+        conn.execute( "delete from responses" )
+        conn.commit()
+    finally :
+        conn.close()
+
+#
+#
+#
+if __name__ == '__main__':
+
+    set_cache( sys.argv[1] )
+    conn = _connect()
+    for (host, n, size) in conn.execute( "select host, count(*), sum(size) from responses group by host" ) :
+        sys.stdout.write( "%-30s %6d %12d\n" % (host, n, size,) )
+    conn.close()
+
+#
+#
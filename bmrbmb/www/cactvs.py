@@ -32,10 +32,10 @@ NAMEURL = "http://cactus.nci.nih.gov/chemical/structure/%s/iupac_name"
 
 #
 #
-def get_iupac_name( inchi, verbose = False ) :
+def get_iupac_name( inchi, verbose = False, timeout = None ) :
     global NAMEURL
     addr = NAMEURL % (inchi,)
-    dat = bmrbmb.www.fetch_text( url = addr, verbose = verbose )
+    dat = bmrbmb.www.fetch_text( url = addr, timeout = timeout, verbose = verbose )
     if dat is None :
         return None
     if not isinstance( dat, collections.Iterable ) :
@@ -0,0 +1,279 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  client.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# HTTP GET for www: keep-alive connections are kept per host and reused, at most MAX_PER_HOST
+# requests to one host at a time (PubChem throttles and then blocks you if you don't behave).
+#
+# Timeouts: CONNECT_TIMEOUT to connect, then timeout for each read.
+# 429 and 5xx are retried RETRIES times, waiting a random time up to BACKOFF * 2^n seconds
+# (but no more than BACKOFF_MAX), or what the server says in Retry-After. So are network
+# errors. Redirects are followed.
+#
+# Limits are per process: batch.py workers don't know about each other.
+#
+# Proxy is from http_proxy/https_proxy environment variables, same as urllib, and no_proxy
+# is honoured. http goes to the proxy with the whole URL, https is tunneled with CONNECT.
+# user:password in the proxy URL is sent as basic Proxy-Authorization.
+#
+
+from __future__ import absolute_import
+
+import sys
+import time
+import errno
+import base64
+import urllib
+import random
+import socket
+import threading
+import httplib
+import urlparse
+
+CONNECT_TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 1.0
+BACKOFF_MAX = 30.0
+MAX_REDIRECTS = 5
+
+MAX_PER_HOST = 4
+HOST_LIMITS = {
+    "pubchem.ncbi.nlm.nih.gov" : 2
+}
+
+RETRY_CODES = (429, 500, 502, 503, 504)
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+USER_AGENT = "bmrbmb (BMRB metabolomics entry builder)"
+
+#
+#
+#
+class HTTPClient( object ) :
+
+    #
+    #
+    # proxies: { scheme : proxy URL, "no" : no_proxy list } like urllib.getproxies(), from environment
+    # if None
+    #
+    def __init__( self, proxies = None, verbose = False ) :
+        self._verbose = bool( verbose )
+        if proxies is None : proxies = urllib.getproxies_environment()
+        self._proxies = dict( proxies )
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._slots = {}
+
+    # (scheme, host, port) is the key
+    #
+    @staticmethod
+    def _key( url ) :
+        parts = urlparse.urlsplit( url )
+        port = parts.port
+        if port is None :
+            if parts.scheme == "https" : port = 443
+            else : port = 80
+        return (parts.scheme, parts.hostname, port)
+
+    # (host, port, Proxy-Authorization header or None) for this (scheme, host, port), or None
+    #
+    def _proxy( self, key ) :
+        (scheme, host, port) = key
+        proxy = self._proxies.get( scheme )
+        if (proxy is None) or (str( proxy ).strip() == "") : return None
+        if urllib.proxy_bypass_environment( "%s:%s" % (host, port,), self._proxies ) : return None
+
+        parts = urlparse.urlsplit( proxy )
+        if parts.hostname is None :
+            parts = urlparse.urlsplit( "http://%s" % (proxy,) )
+        if not parts.scheme in ("http", "") :
+            raise IOError( "unsupported proxy: %s" % (proxy,) )
+        auth = None
+        if parts.username is not None :
+            creds = "%s:%s" % (urllib.unquote( parts.username ), urllib.unquote( parts.password or "" ),)
+            auth = "Basic %s" % (base64.b64encode( creds ),)
+        return (parts.hostname, parts.port or 80, auth)
+
+    #
+    #
+    def _slot( self, key ) :
+        with self._lock :
+            if not key in self._slots :
+                self._slots[key] = threading.BoundedSemaphore( HOST_LIMITS.get( key[1], MAX_PER_HOST ) )
+            return self._slots[key]
+
+    # (connection, reused)
+    #
+    def _connection( self, key ) :
+        with self._lock :
+            idle = self._idle.get( key )
+            if idle :
+                return (idle.pop(), True)
+        (scheme, host, port) = key
+        proxy = self._proxy( key )
+        if proxy is None :
+            if scheme == "https" :
+                conn = httplib.HTTPSConnection( host, port, timeout = CONNECT_TIMEOUT )
+            elif scheme == "http" :
+                conn = httplib.HTTPConnection( host, port, timeout = CONNECT_TIMEOUT )
+            else :
+                raise IOError( "unsupported URL scheme: %s" % (scheme,) )
+            return (conn, False)
+
+        (phost, pport, auth) = proxy
+        if self._verbose : sys.stdout.write( "%s via proxy %s:%s\n" % (host, phost, pport,) )
+        if scheme == "https" :
+            conn = httplib.HTTPSConnection( phost, pport, timeout = CONNECT_TIMEOUT )
+            headers = None
+            if auth is not None : headers = { "Proxy-Authorization" : auth }
+            conn.set_tunnel( host, port, headers )
+        elif scheme == "http" :
+            conn = httplib.HTTPConnection( phost, pport, timeout = CONNECT_TIMEOUT )
+        else :
+            raise IOError( "unsupported URL scheme: %s" % (scheme,) )
+        return (conn, False)
+
+    #
+    #
+    def _release( self, key, conn ) :
+        with self._lock :
+            self._idle.setdefault( key, [] ).append( conn )
+
+    #
+    #
+    def close( self ) :
+        with self._lock :
+            for conns in self._idle.values() :
+                for c in conns : c.close()
+            self._idle.clear()
+
+    #
+    #
+    @staticmethod
+    def backoff( attempt, retry_after = None ) :
+        if retry_after is not None :
+            try :
+                return min( BACKOFF_MAX, max( 0.0, float( retry_after ) ) )
+            except ValueError :
+                pass
+        return random.uniform( 0, min( BACKOFF_MAX, BACKOFF * (2 ** attempt) ) )
+
+    # what a keep-alive connection the server has closed looks like
+    #
+    @staticmethod
+    def _stale( e ) :
+        if isinstance( e, httplib.BadStatusLine ) : return True
+        if isinstance( e, socket.timeout ) : return False
+        if isinstance( e, socket.error ) :
+            return getattr( e, "errno", None ) in (errno.ECONNRESET, errno.EPIPE)
+        return False
+
+    # one request on a pooled connection: (status, headers, body)
+    #
+    def _request( self, key, url, timeout, data = None ) :
+        parts = urlparse.urlsplit( url )
+        path = parts.path or "/"
+        if parts.query : path = "%s?%s" % (path, parts.query,)
+        headers = { "User-Agent" : USER_AGENT, "Connection" : "keep-alive" }
+        method = "GET"
+        if data is not None :
+            method = "POST"
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+# plain http proxy wants the whole URL
+#
+        if key[0] == "http" :
+            proxy = self._proxy( key )
+            if proxy is not None :
+                path = urlparse.urlunsplit( (parts.scheme, parts.netloc, path, "", "") )
+                if proxy[2] is not None : headers["Proxy-Authorization"] = proxy[2]
+
+        (conn, reused) = self._connection( key )
+        try :
+            if conn.sock is None :
+                conn.connect()
+            conn.sock.settimeout( timeout )
+            conn.request( method, path, body = data, headers = headers )
+            resp = conn.getresponse()
+            body = resp.read()
+        except (socket.error, httplib.HTTPException), e :
+            conn.close()
+
+# server closed idle keep-alive connection: that's not an error, try again on a new one.
+# Timeouts aren't that, get() retries those.
+#
+            if reused and self._stale( e ) :
+                if self._verbose : sys.stdout.write( "stale connection to %s, reconnecting\n" % (key[1],) )
+                return self._request( key, url, timeout, data )
+            raise
+
+        if resp.will_close :
+            conn.close()
+        else :
+            self._release( key, conn )
+        return (resp.status, resp.msg, body)
+
+    # returns (status, content type, body), body of error responses included.
+    # Raises IOError if it can't get an answer from the server.
+    # data: POST this (form-encoded) instead of GET. Redirects other than 307 and 308 turn it into GET.
+    #
+    def get( self, url, timeout = 30, verbose = False, data = None ) :
+        for redirect in range( MAX_REDIRECTS + 1 ) :
+            key = self._key( url )
+            slot = self._slot( key )
+            attempt = 0
+            while True :
+                err = None
+                slot.acquire()
+                try :
+                    (status, headers, body) = self._request( key, url, timeout, data )
+                except (socket.error, httplib.HTTPException), e :
+                    err = e
+                finally :
+                    slot.release()
+
+                if (err is None) and (status not in RETRY_CODES) : break
+                if attempt >= RETRIES :
+                    if err is not None :
+                        raise IOError( "%s: %s" % (url, str( err ),) )
+                    break
+
+                retry_after = None
+                if err is None : retry_after = headers.getheader( "Retry-After" )
+                wait = self.backoff( attempt, retry_after )
+                if verbose or self._verbose :
+                    if err is None : why = "HTTP %s" % (status,)
+                    else : why = str( err )
+                    sys.stdout.write( "%s: %s, retry in %.1f s\n" % (url, why, wait,) )
+                time.sleep( wait )
+                attempt += 1
+
+            if status in REDIRECT_CODES :
+                location = headers.getheader( "Location" )
+                if location is not None :
+                    url = urlparse.urljoin( url, location )
+                    if not status in (307, 308) : data = None
+                    continue
+            return (status, headers.gettype(), body)
+
+        raise IOError( "%s: too many redirects" % (url,) )
+
+#
+#
+#
+if __name__ == '__main__':
+
+    c = HTTPClient( verbose = True )
+    for url in sys.argv[1:] :
+        (status, ctype, body) = c.get( url )
+        sys.stdout.write( "%s %s %s %d bytes\n" % (url, status, ctype, len( body ),) )
+    c.close()
+
+#
+#
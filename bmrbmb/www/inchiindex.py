@@ -0,0 +1,187 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  inchiindex.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+#
+# local copy of BMRB chem comp InChI codes: InChI and InChIKey to chem comp ID in sqlite3 database,
+# so id_from_inchi() doesn't have to ask webapi for every entry (and works offline).
+#
+# Made from bulk export: webapi's get_all_values_for_tag JSON ({ comp id : [ InChI ] }) or
+# a tab-separated file: comp id, InChI, and optionally InChIKey. refresh() only changes rows
+# that changed and does nothing if the export is the same as last time. Without InChIKeys in the
+# export they're made by RDKit if it's there.
+#
+#   python inchiindex.py /bmrb/lib/chemcomp-inchi.sqlt3 [export file]
+#
+#   [www]
+#   inchiindex = /bmrb/lib/chemcomp-inchi.sqlt3
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+
+EXPORTURL = "http://webapi.bmrb.wisc.edu/current/search/get_all_values_for_tag/_Chem_comp.InChI_code" \
+        + "?database=chemcomps"
+
+_DBFILE = None
+
+DDL = [
+    "create table if not exists chem_comps (comp_id text primary key, inchi text not null, inchi_key text)",
+    "create index if not exists chem_comps_inchi on chem_comps (inchi)",
+    "create index if not exists chem_comps_inchi_key on chem_comps (inchi_key)",
+    "create table if not exists meta (key text primary key, value text)"
+]
+
+#
+#
+def set_index( dbfile ) :
+    global _DBFILE
+    if dbfile is None :
+        _DBFILE = None
+        return
+    _DBFILE = os.path.realpath( dbfile )
+
+#
+#
+def configure( config ) :
+    if config.has_option( "www", "inchiindex" ) :
+        set_index( config.get( "www", "inchiindex" ) )
+
+#
+#
+def _connect( dbfile ) :
+    conn = sqlite3.connect( dbfile, timeout = 60 )
+    for sql in DDL :
+        conn.execute( sql )
+    return conn
+
+# comp id or None. None also if there's no index
+#
+def lookup( inchi = None, inchi_key = None, verbose = False ) :
+    if _DBFILE is None : return None
+    if not os.path.exists( _DBFILE ) :
+        if verbose : sys.stdout.write( "no InChI index %s\n" % (_DBFILE,) )
+        return None
+    conn = sqlite3.connect( _DBFILE, timeout = 60 )
+    try :
+        for (col, val) in (("inchi", inchi), ("inchi_key", inchi_key)) :
+            if val is None : continue
+            row = conn.execute( "select comp_id from chem_comps where %s=? order by comp_id limit 1" % (col,),
+                    (val,) ).fetchone()
+            if row is not None :
+                if verbose : sys.stdout.write( "InChI index: %s is %s\n" % (val, row[0],) )
+                return row[0]
+        return None
+    finally :
+        conn.close()
+
+# RDKit is optional here
+#
+def inchi_key( inchi ) :
+    try :
+        from rdkit.Chem import inchi as rdinchi
+    except ImportError :
+        return None
+    try :
+        key = rdinchi.InchiToInchiKey( str( inchi ) )
+    except Exception :
+        return None
+    if (key is None) or (str( key ).strip() == "") : return None
+    return str( key ).strip()
+
+# [(comp id, InChI, InChIKey or None)] from export file contents
+#
+def parse_export( text ) :
+    rc = []
+    if text.lstrip().startswith( "{" ) :
+        dat = json.loads( text )
+        for (compid, vals) in dat.items() :
+            if isinstance( vals, list ) :
+                if len( vals ) < 1 : continue
+                vals = vals[0]
+            if vals is None : continue
+            val = unicode( vals ).strip()
+            if val in ("", ".", "?") : continue
+            rc.append( (unicode( compid ).strip(), val, None) )
+        return rc
+
+    for line in text.splitlines() :
+        if (line.strip() == "") or line.startswith( "#" ) : continue
+        fields = line.rstrip( "\r\n" ).split( "\t" )
+        if len( fields ) < 2 :
+            raise Exception( "bad line in export: %s" % (line,) )
+        key = None
+        if (len( fields ) > 2) and (fields[2].strip() != "") : key = fields[2].strip()
+        rc.append( (fields[0].strip().decode( "utf-8" ), fields[1].strip().decode( "utf-8" ), key) )
+    return rc
+
+# load export text into dbfile: add new, change changed, delete the ones that aren't there anymore.
+# Returns (added, changed, deleted), or None if it's the same export as last time.
+#
+def refresh( dbfile, text, verbose = False ) :
+    digest = hashlib.sha1( text ).hexdigest()
+    conn = _connect( os.path.realpath( dbfile ) )
+    try :
+        row = conn.execute( "select value from meta where key='source_sha1'" ).fetchone()
+        if (row is not None) and (row[0] == digest) :
+            if verbose : sys.stdout.write( "InChI index is up to date\n" )
+            return None
+
+        old = {}
+        for (compid, inchi, key) in conn.execute( "select comp_id, inchi, inchi_key from chem_comps" ) :
+            old[compid] = (inchi, key)
+
+        added = []
+        changed = []
+        seen = set()
+        for (compid, inchi, key) in parse_export( text ) :
+            seen.add( compid )
+            if (compid in old) and (old[compid][0] == inchi) and ((key is None) or (old[compid][1] == key)) :
+                continue
+            if key is None : key = inchi_key( inchi )
+            if compid in old : changed.append( (inchi, key, compid) )
+            else : added.append( (compid, inchi, key) )
+        deleted = [(i,) for i in old.keys() if not i in seen]
+
+        conn.execute( "begin immediate" )
+        conn.executemany( "insert into chem_comps (comp_id, inchi, inchi_key) values (?,?,?)", added )
+        conn.executemany( "update chem_comps set inchi=?, inchi_key=? where comp_id=?", changed )
+        conn.executemany( "delete from chem_comps where comp_id=?", deleted )
+        conn.execute( "insert or replace into meta (key, value) values ('source_sha1',?)", (digest,) )
+        conn.execute( "insert or replace into meta (key, value) values ('refreshed',?)", (str( time.time() ),) )
+        conn.commit()
+        if verbose :
+            sys.stdout.write( "InChI index: %d added, %d changed, %d deleted\n" % (len( added ), len( changed ),
+                    len( deleted ),) )
+        return (len( added ), len( changed ), len( deleted ))
+    finally :
+        conn.close()
+
+#
+#
+#
+if __name__ == '__main__':
+
+    if len( sys.argv ) > 2 :
+        with open( sys.argv[2], "rb" ) as f :
+            text = f.read()
+    else :
+        import urllib2
+        f = urllib2.urlopen( EXPORTURL, timeout = 300 )
+        text = f.read()
+        f.close()
+    refresh( sys.argv[1], text, verbose = True )
+
+#
+#
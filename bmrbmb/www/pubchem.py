@@ -17,6 +17,11 @@ from __future__ import absolute_import
 import os
 import sys
 import json
+import urllib
+import re
+import copy
+import traceback
+import multiprocessing.pool
 import pprint
 
 _HERE = os.path.split( __file__ )[0]
@@ -27,6 +32,30 @@ import bmrbmb.www
 #
 PUGVURL = "http://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/%s/JSON/?response_type=display"
 
+# same, only the sections under one TOCHeading
+#
+PUGHURL = "http://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/%s/JSON/?heading=%s"
+HEADINGS = ("CAS", "NSC Number", "MeSH Entry Terms")
+
+# PUG REST for a list of CIDs: comma-separated in the URL, or POSTed as cid=... if the URL
+# gets longer than MAX_URL. BULK_CHUNK CIDs per request.
+# CAS is the (first) registry number xref, NSC is from synonyms.
+#
+PUGRBULK = "http://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/%s/%s/JSON"
+PUGRPOST = "http://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/%s/JSON"
+BULK_CHUNK = 100
+MAX_URL = 1000
+NSCPAT = re.compile( r"^NSC[\s-]?\d+$" )
+
+# MeSH terms aren't in PUG REST: one PUG View heading request per CID, BULK_THREADS at a time
+#
+MESH_HEADING = "MeSH Entry Terms"
+BULK_THREADS = 4
+
+# CID : get_pubchem_data() return
+#
+_PREFETCHED = {}
+
 # PUG REST needs one query per "stuff": its "full" record has names that are also in SDF but no
 # synonyms, synonyms have no mesh synonyms, etc.
 #
@@ -37,18 +66,13 @@ PUGVURL = "http://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/%s/JSON/?
 # this basically drills down through layers of headings and sub-headings. you'll have to look at
 # the retrun from pug view and walk through it to make sense of this.
 # it'll break if pubchem improves anything.
+# dat is PUG View record, whole or just some headings (same layers), what's found goes into rc
 #
-def pug_fetch( cid, url = None, verbose = False ) :
+def pug_walk( dat, rc ) :
 
-    global PUGVURL
-    if url is None : addr = PUGVURL % (cid,)
-    else : addr = str( url ).strip() % (cid,)
-
-    dat = bmrbmb.www.fetch_json( url = addr, verbose = verbose )
-    if dat is None : return None
-    if not "Record" in dat.keys() : return None
-    if not "Section" in dat["Record"].keys() : return None
-    rc = {}
+    if dat is None : return rc
+    if not "Record" in dat.keys() : return rc
+    if not "Section" in dat["Record"].keys() : return rc
 
 # each section is a dict with "TOCHeading" -- the name, and "Information" array that has values
 #
@@ -103,17 +127,58 @@ def pug_fetch( cid, url = None, verbose = False ) :
                                     if all( ord( c ) < 128 for c in syn ) :
                                         rc["mesh_terms"].append( str( syn ).strip() )
 
+    return rc
+
+# one heading: {} if PubChem doesn't have it, so that "not there" isn't the same as "failed"
+#
+def _pug_heading( addr, verbose = False, timeout = None ) :
+    dat = bmrbmb.www.fetch_json( url = addr, timeout = timeout, verbose = verbose )
+    if dat is None : return {}
+    return dat
+
+# The whole record can be tens of megabytes for well-studied compounds, so ask for the headings
+# we want. They're fetched at the same time (lookup_all(), at most client.HOST_LIMITS requests to
+# PubChem at once), so it takes about as long as one. If PubChem has none of them, try the whole
+# record in case the headings got renamed. If any of them fails, so does this: same as the whole record.
+# url: fetch this instead, the old way.
+#
+def pug_fetch( cid, url = None, verbose = False, timeout = None ) :
+
+    global PUGVURL
+    global PUGHURL
+    global HEADINGS
+
+    rc = {}
+    if url is None :
+        if timeout is None : timeout = bmrbmb.www.TIMEOUT
+        jobs = {}
+        for heading in HEADINGS :
+            addr = PUGHURL % (cid, urllib.quote_plus( heading ),)
+            jobs[heading] = (_pug_heading, (addr,), timeout)
+        found = False
+        for (heading, dat) in bmrbmb.www.lookup_all( jobs, verbose = verbose ).items() :
+            if dat is None :
+                raise IOError( "PubChem %s for CID %s: no answer" % (heading, cid,) )
+            if len( dat ) < 1 : continue
+            found = True
+            pug_walk( dat, rc )
+        if not found :
+            addr = PUGVURL % (cid,)
+            pug_walk( bmrbmb.www.fetch_json( url = addr, timeout = timeout, verbose = verbose ), rc )
+    else :
+        addr = str( url ).strip() % (cid,)
+        pug_walk( bmrbmb.www.fetch_json( url = addr, timeout = timeout, verbose = verbose ), rc )
+
     if verbose :
         sys.stdout.write( json.dumps( rc, indent = 4, sort_keys = True ) )
         sys.stdout.write( "\n" )
 
     return rc
 
-# what we can get from PUG
+# pug_fetch() output to NMR-STAR-ish struct, or None
 #
-def get_pubchem_data( cid, verbose = False ) :
-    dat = pug_fetch( cid, verbose = verbose )
-    if len( dat ) < 1 : return None
+def _repackage( dat ) :
+    if (dat is None) or (len( dat ) < 1) : return None
 
 # CAS and NSC numbers, if any, go into identifiers
 #
@@ -136,6 +201,126 @@ def get_pubchem_data( cid, verbose = False ) :
     if len( rc ) < 1 : return None
     return rc
 
+# what we can get from PUG: same as get_pubchem_data_bulk() for one CID, so it's the same numbers
+# either way. prefetch()ed data if it's there.
+#
+def get_pubchem_data( cid, verbose = False, timeout = None ) :
+    global _PREFETCHED
+    cid = str( cid ).strip()
+    if cid in _PREFETCHED :
+        if verbose : sys.stdout.write( "PubChem data for %s: prefetched\n" % (cid,) )
+        return copy.deepcopy( _PREFETCHED[cid] )
+
+    rc = get_pubchem_data_bulk( [cid], verbose = verbose, timeout = timeout )
+    if not cid in rc :
+        raise IOError( "PubChem lookup failed for CID %s" % (cid,) )
+    return rc[cid]
+
+# { CID : PUG REST "Information" } for a list of CIDs
+#
+def _rest_info( cids, what, verbose = False, timeout = None ) :
+    global PUGRBULK
+    global PUGRPOST
+    global MAX_URL
+    rc = {}
+    addr = PUGRBULK % (",".join( cids ), what,)
+    if len( addr ) > MAX_URL :
+        dat = bmrbmb.www.fetch_json( url = PUGRPOST % (what,), data = "cid=%s" % (",".join( cids ),),
+                timeout = timeout, verbose = verbose )
+    else :
+        dat = bmrbmb.www.fetch_json( url = addr, timeout = timeout, verbose = verbose )
+    if dat is None : return rc
+    if not "InformationList" in dat.keys() : return rc
+    if not "Information" in dat["InformationList"].keys() : return rc
+    for info in dat["InformationList"]["Information"] :
+        if "CID" in info.keys() :
+            rc[str( info["CID"] )] = info
+    return rc
+
+# { "mesh_terms" : [...] } or {}
+#
+def _mesh( cid, verbose = False, timeout = None ) :
+    global PUGHURL
+    global MESH_HEADING
+    addr = PUGHURL % (cid, urllib.quote_plus( MESH_HEADING ),)
+    return pug_walk( bmrbmb.www.fetch_json( url = addr, timeout = timeout, verbose = verbose ), {} )
+
+# get_pubchem_data() for many CIDs: { CID : same thing get_pubchem_data() returns }
+# CAS and NSC numbers come from PUG REST, two requests per BULK_CHUNK CIDs, MeSH terms from
+# PUG View, one per CID. All of them go BULK_THREADS at a time, client.py has its own limit too.
+# CIDs whose requests failed aren't in the return: get_pubchem_data() will look them up itself.
+#
+def get_pubchem_data_bulk( cids, verbose = False, timeout = None ) :
+    global BULK_CHUNK
+    global NSCPAT
+
+    cids = sorted( set( str( c ).strip() for c in cids if c is not None ) )
+    rc = {}
+    if len( cids ) < 1 : return rc
+
+    tasks = []
+    for i in range( 0, len( cids ), BULK_CHUNK ) :
+        tasks.append( ("synonyms", cids[i:i + BULK_CHUNK]) )
+        tasks.append( ("xrefs/RN", cids[i:i + BULK_CHUNK]) )
+    for cid in cids :
+        tasks.append( ("mesh", [cid]) )
+
+    def fetch( task ) :
+        (what, chunk) = task
+        try :
+            if what == "mesh" : return (task, { chunk[0] : _mesh( chunk[0], verbose = verbose, timeout = timeout ) }, None)
+            return (task, _rest_info( chunk, what, verbose = verbose, timeout = timeout ), None)
+        except Exception, e :
+            if verbose : traceback.print_exc()
+            return (task, None, str( e ))
+
+    found = { "synonyms" : {}, "xrefs/RN" : {}, "mesh" : {} }
+    failed = set()
+    pool = multiprocessing.pool.ThreadPool( processes = min( BULK_THREADS, len( tasks ) ) )
+    try :
+        for ((what, chunk), dat, err) in pool.imap_unordered( fetch, tasks ) :
+            if err is not None :
+                sys.stderr.write( "WARN: PubChem %s for %s: %s\n" % (what, ",".join( chunk ), err,) )
+                failed.update( chunk )
+                continue
+            found[what].update( dat )
+    finally :
+        pool.close()
+        pool.join()
+
+    for cid in cids :
+        if cid in failed : continue
+        dat = {}
+        xrefs = found["xrefs/RN"].get( cid, {} )
+        if ("RN" in xrefs.keys()) and (len( xrefs["RN"] ) > 0) :
+            dat["cas_num"] = str( xrefs["RN"][0] ).strip()
+        syns = found["synonyms"].get( cid, {} )
+        if "Synonym" in syns.keys() :
+            for syn in syns["Synonym"] :
+                if NSCPAT.search( syn ) :
+                    dat["nsc_num"] = str( syn ).strip()
+                    break
+        dat.update( found["mesh"].get( cid, {} ) )
+        rc[cid] = _repackage( dat )
+
+    return rc
+
+# fetch data for all these CIDs now, get_pubchem_data() will return it.
+# batch.py does this before starting the workers, they get a copy.
+# Failures aren't fatal: entries that weren't prefetched look PubChem up themselves.
+# Returns the number of CIDs prefetched.
+#
+def prefetch( cids, verbose = False, timeout = None ) :
+    global _PREFETCHED
+    try :
+        dat = get_pubchem_data_bulk( cids, verbose = verbose, timeout = timeout )
+    except Exception, e :
+        sys.stderr.write( "WARN: PubChem prefetch failed: %s\n" % (str( e ),) )
+        if verbose : traceback.print_exc()
+        return 0
+    _PREFETCHED.update( dat )
+    return len( dat )
+
 # re-package into NMR-STAR-ish JSON struct, or None
 #
 def as_json( cid, verbose = False ) :
@@ -0,0 +1,156 @@
+#!/usr/bin/python -u
+# -*- coding: utf-8 -*-
+#
+#  coldstart.py
+#
+#  Copyright 2018 Board of Regents university of Wisconsin - Madison
+#    Dimitri Maziuk <dmaziuk@bmrb.wisc.edu>
+#
+#  This code is free: reuse what you like but give credit
+
+# cold start benchmark: time "import bmrbmb" and the first use of its parts, each in a new python
+# process, and see which toolkits got dragged in.
+#
+#   ./coldstart.py -n 10 -o coldstart.tsv
+#
+# prints min and median seconds: "total" is the whole process (interpreter startup included),
+# "import" is the statement alone. History file gets one tab-separated line per scenario:
+# date, git commit, scenario, median total, median import, toolkits loaded.
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+_HERE = os.path.split( os.path.realpath( __file__ ) )[0]
+
+# name, statement
+#
+SCENARIOS = [
+    ("import", "import bmrbmb"),
+    ("idlist", "import bmrbmb; bmrbmb.nmrstar.idlist"),
+    ("chemshifts", "import bmrbmb; bmrbmb.chemshifts.AtomChemShift"),
+    ("www", "import bmrbmb; bmrbmb.www.fetch_json"),
+    ("chemcomp.cache", "import bmrbmb; bmrbmb.chemcomp.cache.chem_comp"),
+    ("Molecule", "import bmrbmb; bmrbmb.chemcomp.OBmolecule; bmrbmb.chemcomp.RDmolecule"),
+    ("StarMaker", "import bmrbmb; bmrbmb.nmrstar.StarMaker"),
+    ("pipeline", "import bmrbmb; bmrbmb.pipeline.make_entry_dir")
+]
+
+# these shouldn't show up unless they're needed
+#
+HEAVY = ("pybel", "openbabel", "rdkit", "pymol", "starobj", "urllib2")
+
+CHILD = """import sys, time
+sys.path.insert( 0, %r )
+t = time.time()
+%s
+t = time.time() - t
+sys.stdout.write( "%%f\\t%%s\\n" %% (t, ",".join( i for i in %r if sys.modules.get( i ) is not None ),) )
+"""
+
+# ((total secs, import secs, loaded), None) or (None, error message)
+#
+def run_once( stmt, python = sys.executable ) :
+    code = CHILD % (_HERE, stmt, HEAVY,)
+    start = time.time()
+    p = subprocess.Popen( [python, "-c", code], stdout = subprocess.PIPE, stderr = subprocess.PIPE )
+    (out, err) = p.communicate()
+    total = time.time() - start
+    if p.returncode != 0 :
+        lines = err.strip().splitlines()
+        if len( lines ) > 0 : return (None, lines[-1])
+        return (None, "exit code %s" % (p.returncode,))
+    fields = out.rstrip( "\n" ).split( "\t" )
+    return ((total, float( fields[0] ), fields[1]), None)
+
+#
+#
+def median( vals ) :
+    vals = sorted( vals )
+    n = len( vals )
+    if n % 2 == 1 : return vals[n // 2]
+    return (vals[n // 2 - 1] + vals[n // 2]) / 2.0
+
+#
+#
+def git_commit() :
+    try :
+        p = subprocess.Popen( ["git", "rev-parse", "--short", "HEAD"], cwd = _HERE, stdout = subprocess.PIPE,
+                stderr = subprocess.PIPE )
+        (out, err) = p.communicate()
+        if p.returncode == 0 : return out.strip()
+    except OSError :
+        pass
+    return "."
+
+# [(scenario, median total, median import, min total, min import, loaded, error)]
+#
+def bench( scenarios, runs = 5, python = sys.executable, verbose = False ) :
+    rc = []
+    for (name, stmt) in scenarios :
+        totals = []
+        imports = []
+        loaded = ""
+        error = None
+        for i in range( runs ) :
+            (res, error) = run_once( stmt, python )
+            if res is None : break
+            totals.append( res[0] )
+            imports.append( res[1] )
+            loaded = res[2]
+        if verbose and (error is not None) :
+            sys.stdout.write( "%s: %s\n" % (name, error,) )
+        if len( totals ) < 1 :
+            rc.append( (name, None, None, None, None, loaded, error) )
+            continue
+        rc.append( (name, median( totals ), median( imports ), min( totals ), min( imports ), loaded, None) )
+    return rc
+
+#
+#
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser( description = "Time bmrbmb imports in new python processes" )
+    ap.add_argument( "-v", "--verbose", default = False, action = "store_true",
+        help = "print lots of messages to stdout", dest = "verbose" )
+    ap.add_argument( "-n", "--runs", help = "runs per scenario (default: 5)", dest = "runs", type = int,
+        default = 5 )
+    ap.add_argument( "-o", "--history", help = "append results to this file", dest = "history", default = None )
+    ap.add_argument( "--python", help = "python interpreter (default: this one)", dest = "python",
+        default = sys.executable )
+    ap.add_argument( "scenarios", nargs = "*", metavar = "SCENARIO",
+        help = "scenarios to run (default: all): %s" % (", ".join( i[0] for i in SCENARIOS ),) )
+
+    args = ap.parse_args()
+
+    scenarios = SCENARIOS
+    if len( args.scenarios ) > 0 :
+        names = [i[0] for i in SCENARIOS]
+        for i in args.scenarios :
+            if not i in names : ap.error( "no scenario %s" % (i,) )
+        scenarios = [i for i in SCENARIOS if i[0] in args.scenarios]
+
+    results = bench( scenarios, runs = max( 1, args.runs ), python = args.python, verbose = args.verbose )
+
+    sys.stdout.write( "%-16s %8s %8s %8s %8s  %s\n" % ("scenario", "total", "min", "import", "min", "loaded",) )
+    for (name, total, imp, mintotal, minimp, loaded, error) in results :
+        if total is None :
+            sys.stdout.write( "%-16s %8s %8s %8s %8s  %s\n" % (name, "-", "-", "-", "-", "FAILED: %s" % (error,),) )
+            continue
+        sys.stdout.write( "%-16s %8.3f %8.3f %8.3f %8.3f  %s\n" % (name, total, mintotal, imp, minimp, loaded,) )
+
+    if args.history is not None :
+        now = time.strftime( "%Y-%m-%d %H:%M:%S" )
+        commit = git_commit()
+        with open( args.history, "a" ) as out :
+            for (name, total, imp, mintotal, minimp, loaded, error) in results :
+                if total is None : continue
+                out.write( "%s\t%s\t%s\t%.4f\t%.4f\t%s\n" % (now, commit, name, total, imp, loaded,) )
+
+#
+#